@@ -1,8 +1,11 @@
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Generator
 
 import pyjson5 as json5
 
-from cora.llms.base import LLMBase, ChatMessage
+from cora.config import CoraConfig
+from cora.llms import usage
+from cora.llms.base import LLMBase, Conversation, UnrecoverableQueryError
+from cora.llms.stream import JSONStop
 
 SYSTEM_PROMPT_JSON_INSTRUCTION = """\
 ## Response Format ##
@@ -48,16 +51,36 @@ Please fix the above shown issues (shown above) and respond again.
 """
 
 
+SKIPPED_REASON = "(The reason is skipped as the response is cut after the decision)"
+
+# Sent to chat rounds in place of the response when querying the model fails
+_FAILED_QUERY = object()
+
+
 class ReachChatRoundLimitException(Exception):
     def __init__(self, limit: int):
         super().__init__(f"The maximum allowed chat-round limit is {limit}")
 
 
 class AgentBase:
-    def __init__(self, llm: LLMBase, json_schema: Optional[str], *, max_chat_round=10):
+    def __init__(
+        self,
+        llm: LLMBase,
+        json_schema: Optional[str],
+        *,
+        max_chat_round=10,
+        decision_fields: Optional[List[str]] = None,
+        response_schema: Optional[dict] = None,
+    ):
         self.llm = llm
         self.json_schema = json_schema
         self.max_chat_round = max_chat_round
+        # Fields of the JSON schema carrying the decision, which should come first in the
+        # schema such that the response can be cut right after them (if configured so)
+        self.decision_fields = decision_fields
+        # The JSON schema (as a machine-readable counterpart of json_schema) that providers
+        # constrain responses to, sparing rounds of repairing malformed responses
+        self.response_schema = response_schema
 
     def is_debugging(self) -> bool:
         return self.llm.is_debug_mode()
@@ -68,26 +91,91 @@ class AgentBase:
     def disable_debugging(self):
         self.llm.disable_debug_mode()
 
-    def get_history(self) -> List[ChatMessage]:
-        return self.llm.get_history()
-
     def run(self, system_prompt: str, *args, **kwargs):
+        # Usage of the model is accounted to the running agent, not to the (shared) model
+        with usage.accounting_to(type(self).__name__):
+            return self._run(system_prompt, *args, **kwargs)
+
+    async def arun(self, system_prompt: str, *args, **kwargs):
+        with usage.accounting_to(type(self).__name__):
+            return await self._arun(system_prompt, *args, **kwargs)
+
+    def _run(self, system_prompt: str, *args, **kwargs):
+        # Each run chats in its own conversation, so an agent can be run by many threads
+        conv = self.llm.new_conversation()
+        rounds = self._chat_rounds(conv, system_prompt, *args, **kwargs)
+        try:
+            next(rounds)
+            while True:
+                try:
+                    response = self.llm.query(
+                        conv,
+                        json_stop=self._json_stop(),
+                        response_schema=self._response_schema(),
+                    )
+                except UnrecoverableQueryError:
+                    raise
+                except Exception:
+                    response = _FAILED_QUERY
+                rounds.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _arun(self, system_prompt: str, *args, **kwargs):
+        conv = self.llm.new_conversation()
+        rounds = self._chat_rounds(conv, system_prompt, *args, **kwargs)
+        try:
+            next(rounds)
+            while True:
+                try:
+                    response = await self.llm.aquery(
+                        conv,
+                        json_stop=self._json_stop(),
+                        response_schema=self._response_schema(),
+                    )
+                except UnrecoverableQueryError:
+                    raise
+                except Exception:
+                    response = _FAILED_QUERY
+                rounds.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    def _json_stop(self) -> Optional[JSONStop]:
+        if not self.json_schema or not CoraConfig.llm_stream_json_responses():
+            return None
+        if CoraConfig.llm_stop_at_decisions() and self.decision_fields:
+            return JSONStop(decision_fields=self.decision_fields)
+        return JSONStop()
+
+    def _response_schema(self) -> Optional[dict]:
+        if not self.json_schema or not CoraConfig.llm_constrain_json_responses():
+            return None
+        return self.response_schema
+
+    def _chat_rounds(
+        self, conv: Conversation, system_prompt: str, *args, **kwargs
+    ) -> Generator[None, any, any]:
+        """
+        Chat with the model in the conversation round by round, where each round yields to let
+        the caller query the model (synchronously or asynchronously) and receives its response,
+        or _FAILED_QUERY if querying fails. Return the results of run() once finished.
+        """
         if self.json_schema:
-            return self._run_with_json_schema(system_prompt, *args, **kwargs)
+            run_rounds = self._run_with_json_schema
         else:
-            return self._run_without_json_schema(system_prompt, *args, **kwargs)
-
-    def _run_without_json_schema(self, system_prompt: str, *args, **kwargs):
-        # We're a clean run, so clear all prior chats
-        self.llm.clear_history()
+            run_rounds = self._run_without_json_schema
+        return (yield from run_rounds(conv, system_prompt, *args, **kwargs))
 
+    def _run_without_json_schema(
+        self, conv: Conversation, system_prompt: str, *args, **kwargs
+    ):
         # TODO: Use append_system_message()?
-        self.llm.append_user_message(system_prompt)
+        conv.append_user_message(system_prompt)
 
         for _ in range(self.max_chat_round):
-            try:
-                response = self.llm.query()
-            except Exception:
+            response = yield
+            if response is _FAILED_QUERY:
                 continue
 
             # Parse the response and return results
@@ -95,31 +183,39 @@ class AgentBase:
 
         return self._default_result_when_reaching_max_chat_round()
 
-    def _run_with_json_schema(self, system_prompt: str, *args, **kwargs):
+    def _run_with_json_schema(
+        self, conv: Conversation, system_prompt: str, *args, **kwargs
+    ):
         assert self.json_schema, "No JSON schema is given"
 
-        # We're a clean run, so clear all prior chats
-        self.llm.clear_history()
-
         # TODO: Use append_system_message()?
-        self.llm.append_user_message(
+        conv.append_user_message(
             system_prompt
             + SYSTEM_PROMPT_JSON_INSTRUCTION.format(json_schema=self.json_schema)
         )
 
         for _ in range(self.max_chat_round):
-            try:
-                response = self.llm.query()
-            except Exception:
+            response = yield
+            if response is _FAILED_QUERY:
                 continue
 
             response, err_msg = self.parse_json_response(response)
 
+            # The response was cut right after the decision, skipping the reason
+            if (
+                response is not None
+                and CoraConfig.llm_stop_at_decisions()
+                and self.decision_fields
+                and "reason" not in response
+            ):
+                response["reason"] = SKIPPED_REASON
+
             # TODO We need to cleanup all trial-error messages and keep our history clean
 
             # Not a JSON object, let's try again
             if response is None:
-                self.llm.append_user_message(
+                usage.record_repair_round()
+                conv.append_user_message(
                     INVALID_JSON_OBJECT_MESSAGE.format(
                         error_message=err_msg, json_schema=self.json_schema
                     )
@@ -130,7 +226,8 @@ class AgentBase:
 
             # Violates JSON format, let's try again
             if not formatted:
-                self.llm.append_user_message(
+                usage.record_repair_round()
+                conv.append_user_message(
                     VIOLATED_JSON_FORMAT_MESSAGE.format(
                         error_message=err_msg, json_schema=self.json_schema
                     )
@@ -143,7 +240,8 @@ class AgentBase:
 
             # Invalid response, let's try again
             if not valid:
-                self.llm.append_user_message(err_prompt)
+                usage.record_repair_round()
+                conv.append_user_message(err_prompt)
                 continue
 
             # Parse the response and return results
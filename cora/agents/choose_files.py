@@ -41,6 +41,15 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "choose_list": {"type": "array", "items": {"type": "string"}},
+        "reason": {"type": "string"},
+    },
+    "required": ["choose_list", "reason"],
+}
+
 NOT_FILE_LIST_MESSAGE = """\
 **FAILURE**: The chosen file list you gave is NOT a list.
 
@@ -89,7 +98,13 @@ class FileChooser(AgentBase):
         *args,
         **kwargs,
     ):
-        super().__init__(llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        super().__init__(
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            *args,
+            **kwargs,
+        )
         self.query = query
         self.repo = repo
 
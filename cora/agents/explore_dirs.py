@@ -0,0 +1,178 @@
+from typing import Tuple, Optional, List
+
+from cora.agents.base import AgentBase
+from cora.base.ftree import FileTree
+from cora.llms.base import LLMBase
+from cora.repo.repo import Repository
+
+SYSTEM_PROMPT = """\
+You are a Directory Finder, tasked to narrow down the directories of the repository: {repo_name} to look for files. \
+The files to look for must be relevant to a "User Query" that I give you. \
+Since the repository is too large to be shown at once, we explore it from top to bottom: you choose directories, and I show you what is inside them.
+
+For this task, I will give you the "User Query" and a "Repository Tree". \
+The repository tree shows the directories that you have chosen so far, along with their direct children (files and subdirectories). \
+{budgeted_tree_note}You determine if a directory is relevant to the user query merely by analyzing the relevance between the user query and:
+1. the repository's directory structure (because the structure may imply the repository's architecture)
+2. each directory's name and its position in the repository tree (because the directory name somewhat indicates what its files are for)
+3. the names of the files that are shown in the tree
+You do not have any access to any file's content.
+
+Note,
+1. Choose at most {dir_limit} directories that are MOST likely to contain the relevant files, each must be a directory shown in the repository tree.
+2. Choose a subdirectory rather than its parent if you are certain that the relevant files are inside the subdirectory; \
+choose a directory again if the relevant files are its direct children, or the root directory "/" if they are at the top level of the repository.
+3. If you find no directories that are likely to contain relevant files, set the field "directories" to an empty list and give a clear "reason" to let me know.
+
+## User Query ##
+
+```
+{user_query}
+```
+
+## Repository Tree ##
+
+```
+{repository_tree}
+```
+
+"""
+
+# Only trees rendered within a token budget show file counts and summaries
+BUDGETED_TREE_NOTE = """\
+As the tree is too large, some directories are not expanded but shown with the number of files within them, \
+and some entries may be summarized like "(+N more files)". \
+"""
+
+JSON_SCHEMA = """\
+{{
+    "directories": ["<directory_path_1>", "<directory_path_2>", ...], // must be paths of directories like "{example_directory}", or an empty list if no directories are likely to contain relevant files
+    "reason": "the reason why you think these directories contain files relevant to the user query" // explain in detail, e.g., their names are reflected in the query, their files seem to implement the functionality the query is about, or any other reasonable explanation.
+}}\
+"""
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "directories": {"type": "array", "items": {"type": "string"}},
+        "reason": {"type": "string"},
+    },
+    "required": ["directories", "reason"],
+}
+
+DIRS_NOT_A_LIST_MESSAGE = """\
+**FAILURE**: The field "directories" you gave is NOT a list.
+
+## Your Response (JSON format) ##
+
+"""
+
+DIR_NOT_SHOWN_MESSAGE = """\
+**FAILURE**: Directory {dir_path} is not shown in the repository tree.
+
+Please choose only directories that are shown in the repository tree, with their full paths ending with "/".
+
+## Your Response (JSON format) ##
+
+"""
+
+TOO_MANY_DIRS_MESSAGE = """\
+**FAILURE**: You chose {num_dirs} directories, but at most {dir_limit} directories are allowed.
+
+Please choose only the directories that are MOST likely to contain the relevant files.
+
+## Your Response (JSON format) ##
+
+"""
+
+
+class DirFinder(AgentBase):
+    def __init__(
+        self,
+        query: str,
+        repo: Repository,
+        tree: FileTree,
+        llm: LLMBase,
+        dir_limit: int = 3,
+        tree_token_budget: Optional[int] = None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(
+            llm=llm,
+            json_schema=JSON_SCHEMA.format(
+                example_directory=(tree.find_files("*", is_dir=True) or ["src/"])[0]
+            ),
+            response_schema=RESPONSE_SCHEMA,
+            *args,
+            **kwargs,
+        )
+        self.query = query
+        self.repo = repo
+        self.tree = tree
+        self.dir_limit = dir_limit
+        self.tree_token_budget = tree_token_budget
+
+    def find(self) -> Tuple[List[str], str]:
+        repository_tree = str(self.tree)
+        budgeted_tree_note = ""
+        if self.tree_token_budget is not None:
+            budgeted_tree = self.tree.to_budgeted_str(self.tree_token_budget)
+            if budgeted_tree != repository_tree:
+                repository_tree, budgeted_tree_note = budgeted_tree, BUDGETED_TREE_NOTE
+        return self.run(
+            SYSTEM_PROMPT.format(
+                repo_name=self.repo.full_name,
+                user_query=self.query,
+                dir_limit=self.dir_limit,
+                budgeted_tree_note=budgeted_tree_note,
+                repository_tree=repository_tree,
+            )
+        )
+
+    def _check_response_format(
+        self, response: dict, *args, **kwargs
+    ) -> Tuple[bool, Optional[str]]:
+        for field in ["directories", "reason"]:
+            if field not in response:
+                return False, f"'{field}' is missing in the JSON object"
+        return True, None
+
+    def _check_response_semantics(
+        self, response: dict, *args, **kwargs
+    ) -> Tuple[bool, Optional[str]]:
+        dirs = response["directories"]
+
+        if type(dirs) is not list:
+            return False, DIRS_NOT_A_LIST_MESSAGE
+
+        if len(dirs) > self.dir_limit:
+            return False, TOO_MANY_DIRS_MESSAGE.format(
+                num_dirs=len(dirs), dir_limit=self.dir_limit
+            )
+
+        for dir_path in dirs:
+            dir_path = self._normalize(dir_path)
+            if dir_path == FileTree.DIRECTORY_LINE_ENDINGS:
+                continue  # The root directory is never shown, but is always valid
+            if not self.tree.include_directory(dir_path):
+                return False, DIR_NOT_SHOWN_MESSAGE.format(dir_path=dir_path)
+
+        return True, None
+
+    def _parse_response(self, response: dict, *args, **kwargs) -> any:
+        dirs = [self._normalize(d) for d in response["directories"]]
+        return list(dict.fromkeys(dirs)), response["reason"]
+
+    def _default_result_when_reaching_max_chat_round(self):
+        return (
+            [],
+            "The model have reached the max number of chat round and is unable to find any directories.",
+        )
+
+    @staticmethod
+    def _normalize(dir_path) -> str:
+        dir_path = str(dir_path)
+        if not dir_path.endswith(FileTree.DIRECTORY_LINE_ENDINGS):
+            dir_path += FileTree.DIRECTORY_LINE_ENDINGS
+        return dir_path
@@ -1,16 +1,18 @@
-from typing import Tuple, Optional, List
+from functools import cached_property
+from typing import Tuple, Optional, List, Set
 
 from cora.agents.base import AgentBase
 from cora.base.ftree import FileTree
-from cora.llms.base import LLMBase
+from cora.llms.base import LLMBase, PROMPT_CACHE_BREAKPOINT
 from cora.repo.repo import Repository
 
-SYSTEM_PROMPT = """\
+SYSTEM_PROMPT = (
+    """\
 You are a File Finder, tasked to collect a list of files from the repository: {repo_name}. \
 Your found files must be relevant to a "User Query" that I give you. \
 Since the found files will be used by others to solve the user query, it is very important that you do not miss any relevant files.
 
-For this task, I will give you the "User Query" and a "Repository Tree". \
+For this task, I will give you a "Repository Tree" and the "User Query". \
 The repository tree lists all the repository's files in a tree structure. \
 I will also provide you with a "File List" listing all files that you are CERTAIN relevant in the past and stored. \
 You initially start with files in the file list (it might also be an empty list) and will explore the tree to find further files that you are CERTAIN relevant to the user query. \
@@ -25,16 +27,20 @@ Note,
 1. There might be multiple relevant files, you respond only one file each time I query you; so please respond the file that is MOST relevant.
 2. If you find all files you are CERTAIN relevant to the user query are all in the file list, set the field "file" to null and give a clear "reason" to let me know.
 
-## User Query ##
+## Repository Tree ##
 
 ```
-{user_query}
+{repository_tree}
 ```
 
-## Repository Tree ##
+"""
+    # Above is shared by all queries to the same tree; keep what varies with queries last
+    + PROMPT_CACHE_BREAKPOINT
+    + """\
+## User Query ##
 
 ```
-{repository_tree}
+{user_query}
 ```
 
 ## File List ##
@@ -44,6 +50,7 @@ Note,
 ```
 
 """
+)
 
 JSON_SCHEMA = """\
 {{
@@ -52,6 +59,15 @@ JSON_SCHEMA = """\
 }}\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "file": {"type": ["string", "null"]},
+        "reason": {"type": "string"},
+    },
+    "required": ["file", "reason"],
+}
+
 FILE_NOT_EXISTS_MESSAGE = """\
 **FAILURE**: File {file_path} does not exist in the repository.
 
@@ -82,12 +98,15 @@ class FileFinder(AgentBase):
         tree: FileTree,
         llm: LLMBase,
         includes: Optional[List[str]] = None,
+        tree_token_budget: Optional[int] = None,
+        focus_files: Optional[Set[str]] = None,
         *args,
         **kwargs,
     ):
         super().__init__(
             llm=llm,
             json_schema=JSON_SCHEMA.format(example_file=repo.get_rand_file()),
+            response_schema=RESPONSE_SCHEMA,
             *args,
             **kwargs,
         )
@@ -96,13 +115,24 @@ class FileFinder(AgentBase):
         self.file_list = []
         self.tree = tree
         self.includes = includes
+        self.tree_token_budget = tree_token_budget
+        self.focus_files = focus_files
+
+    @cached_property
+    def tree_str(self) -> str:
+        # The tree does not change across rounds, so render it only once
+        if self.tree_token_budget is None:
+            return str(self.tree)
+        return self.tree.to_budgeted_str(
+            self.tree_token_budget, focus_files=self.focus_files
+        )
 
     def next_file(self):
         return self.run(
             SYSTEM_PROMPT.format(
                 repo_name=self.repo.full_name,
                 user_query=self.query,
-                repository_tree=str(self.tree),
+                repository_tree=self.tree_str,
                 file_list="<empty>"
                 if len(self.file_list) == 0
                 else "\n".join(self.file_list),
@@ -35,6 +35,16 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "thoughts": {"type": "string"},
+        "files": {"type": "array", "items": {"type": "string"}},
+        "reason": {"type": "string"},
+    },
+    "required": ["thoughts", "files", "reason"],
+}
+
 
 class EntDefnFinder(AgentBase):
     def __init__(
@@ -45,7 +55,13 @@ class EntDefnFinder(AgentBase):
         *args,
         **kwargs,
     ):
-        super().__init__(llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        super().__init__(
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            *args,
+            **kwargs,
+        )
         self.query = query
         self.repo = repo
 
@@ -1,8 +1,8 @@
 import json
-from typing import List
 
 from cora.agents.base import AgentBase
-from cora.llms.base import LLMBase, ChatMessage
+from cora.llms import usage
+from cora.llms.base import LLMBase, UnrecoverableQueryError
 
 G1_SYSTEM_PROMPT = """\
 You are an expert AI assistant that creates advanced reasoning chain against a user's query. \
@@ -101,21 +101,24 @@ class R1:
     def disable_debugging(self):
         self.llm.disable_debug_mode()
 
-    def get_history(self) -> List[ChatMessage]:
-        return self.llm.get_history()
-
     def run(self, query: str, *, with_internal_thoughts: bool = False) -> str:
-        self.llm.clear_history()
+        with usage.accounting_to(type(self).__name__):
+            return self._run(query, with_internal_thoughts=with_internal_thoughts)
+
+    def _run(self, query: str, *, with_internal_thoughts: bool) -> str:
+        conv = self.llm.new_conversation()
 
-        self.llm.append_system_message(G1_SYSTEM_PROMPT)
-        self.llm.append_user_message(query)
-        self.llm.append_assistant_message(G1_ASSISTANT_START)
+        conv.append_system_message(G1_SYSTEM_PROMPT)
+        conv.append_user_message(query)
+        conv.append_assistant_message(G1_ASSISTANT_START)
 
         thoughts = []
 
         for _ in range(self.max_chat_round):
             try:
-                step_resp = self.llm.query()
+                step_resp = self.llm.query(conv)
+            except UnrecoverableQueryError:
+                raise
             except Exception:
                 continue
 
@@ -123,7 +126,7 @@ class R1:
 
             # Not a valid JSON object
             if step_data is None:
-                self.llm.append_user_message(
+                conv.append_user_message(
                     INVALID_JSON_OBJECT.format(error_message=err_msg)
                 )
                 continue
@@ -133,7 +136,7 @@ class R1:
             for key in ["title", "content", "confidence", "next_action"]:
                 if key not in step_data:
                     err_msg = f"Missing {key}."
-                    self.llm.append_user_message(
+                    conv.append_user_message(
                         INVALID_JSON_OBJECT.format(error_message=err_msg)
                     )
                     break
@@ -143,7 +146,7 @@ class R1:
             # Check if the next_action is valid
             next_action = step_data["next_action"]
             if next_action not in ["continue", "final_answer"]:
-                self.llm.append_user_message(
+                conv.append_user_message(
                     INVALID_NEXT_ACTION.format(invalid_key=next_action)
                 )
                 continue
@@ -159,16 +162,16 @@ class R1:
                 break
 
             # Rectify the assistant's response and ask it to continue
-            self.llm.get_history()[-1].content = json.dumps(step_data)
-            self.llm.append_user_message(
+            conv.messages[-1].content = json.dumps(step_data)
+            conv.append_user_message(
                 G1_USER_CONTINUE_REASONING.format(confidence=step_data["confidence"])
             )
 
-        self.llm.append_user_message(G1_USER_GET_FINAL_ANSWER)
+        conv.append_user_message(G1_USER_GET_FINAL_ANSWER)
 
         if with_internal_thoughts:
             thoughts.append("## Final Answer")
 
-        thoughts.append(self.llm.query())
+        thoughts.append(self.llm.query(conv))
 
         return "\n\n".join(thoughts)
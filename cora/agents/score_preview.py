@@ -1,18 +1,20 @@
 from typing import Tuple, Optional, List
 
 from cora.agents.base import AgentBase
-from cora.llms.base import LLMBase
+from cora.config import CoraConfig
+from cora.llms.base import LLMBase, PROMPT_CACHE_BREAKPOINT
 from cora.preview import FilePreview
 from cora.repo.repo import Repository
 
-SYSTEM_PROMPT = """\
+SYSTEM_PROMPT = (
+    """\
 ## YOUR TASK ##
 
 You are a powerful File Relevance Decider with the capability to analyze and evaluate the relevance of files to the "User Query". \
 Your task is to determine the relevance of the file to the "User Query" and give a relevance score according to your determination.
 
 For this task, I will give you the "User Query" and a preview of a file which contains function names and class names. \
-The file {file_name} is from the repository: {repo_name}.
+The file is from the repository: {repo_name}.
 Additionally, I will give you a file list which contains some filenames which maybe related to the "User Query". The filelist maybe help you decide the relevance score.
 
 A file is relevant to a user query if the file can be an important part to address the user query \
@@ -35,6 +37,15 @@ The relevance score (an integer chosen from [0, 1, 2, 3]) represents the relevan
 {user_query}
 ```
 
+## File List ##
+```
+{file_list}
+```
+
+"""
+    # Above is shared by scoring all files for the same query; keep the file to score last
+    + PROMPT_CACHE_BREAKPOINT
+    + """\
 ## File Preview ##
 
 ```
@@ -43,12 +54,8 @@ The relevance score (an integer chosen from [0, 1, 2, 3]) represents the relevan
 {file_preview}
 ```
 
-## File List ##
-```
-{file_list}
-```
-
 """
+)
 
 JSON_SCHEMA = """\
 {
@@ -57,6 +64,15 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "enum": [0, 1, 2, 3]},
+        "reason": {"type": "string"},
+    },
+    "required": ["score", "reason"],
+}
+
 NON_INTEGER_SCORE_MESSAGE = """\
 **FAILURE**: The relevance score ({score}) you gave is NOT an integer.
 
@@ -98,21 +114,34 @@ class PreviewScorer(AgentBase):
         *args,
         **kwargs,
     ):
-        super().__init__(llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        super().__init__(
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            decision_fields=["score"],
+            *args,
+            **kwargs,
+        )
         self.query = query
         self.repo = repo
 
     def score(self, file: str, other_files: List[str]) -> Tuple[int, str]:
-        return self.run(
-            SYSTEM_PROMPT.format(
-                repo_name=self.repo.repo_name,
-                user_query=self.query,
-                file_name=file,
-                file_preview=FilePreview.of(file, self.repo.get_file_content(file)),
-                file_list="<empty>"
-                if len(other_files) == 0
-                else "\n".join(other_files),
-            )
+        return self.run(self._make_prompt(file, other_files))
+
+    async def ascore(self, file: str, other_files: List[str]) -> Tuple[int, str]:
+        return await self.arun(self._make_prompt(file, other_files))
+
+    def _make_prompt(self, file: str, other_files: List[str]) -> str:
+        return SYSTEM_PROMPT.format(
+            repo_name=self.repo.repo_name,
+            user_query=self.query,
+            file_name=file,
+            file_preview=FilePreview.of(
+                file,
+                self.repo.get_file_content(file),
+                token_budget=CoraConfig.FPS_PREVIEW_TOKEN_BUDGET or None,
+            ),
+            file_list="<empty>" if len(other_files) == 0 else "\n".join(other_files),
         )
 
     def _check_response_format(
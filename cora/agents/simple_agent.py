@@ -9,6 +9,15 @@ JSON_SCHEMA = """\
 }}\
 """
 
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
 
 class SimpleAgent(AgentBase):
     def __init__(
@@ -19,6 +28,15 @@ class SimpleAgent(AgentBase):
             json_schema=JSON_SCHEMA.format(
                 props="\n".join([f'    "{prop}": {desc}' for prop, _, desc in returns])
             ),
+            response_schema={
+                "type": "object",
+                "properties": {
+                    # Leave the property unconstrained if its type is beyond JSON's
+                    prop: ({"type": _JSON_TYPES[typ]} if typ in _JSON_TYPES else {})
+                    for prop, typ, _ in returns
+                },
+                "required": [prop for prop, _, _ in returns],
+            },
             *args,
             **kwargs,
         )
@@ -44,10 +44,27 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "relevant": {"type": "boolean"},
+        "reason": {"type": "string"},
+    },
+    "required": ["relevant", "reason"],
+}
+
 
 class SnipJudge(SnipRelDetmBase, AgentBase):
     def __init__(self, llm: LLMBase, *args, **kwargs):
-        AgentBase.__init__(self, llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        AgentBase.__init__(
+            self,
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            decision_fields=["relevant"],
+            *args,
+            **kwargs,
+        )
 
     def is_debugging(self) -> bool:
         return AgentBase.is_debugging(self)
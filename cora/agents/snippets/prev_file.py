@@ -3,7 +3,7 @@ from typing import Tuple, Optional, List, Generator
 from cora.agents.base import AgentBase
 from cora.agents.snippets.base import SnipFinderBase, SnipRelDetmBase
 from cora.llms.base import LLMBase
-from cora.preview import FilePreview
+from cora.preview.doc import PreviewDoc
 from cora.repo.repo import Repository
 from cora.utils.interval import merge_overlapping_intervals
 
@@ -52,6 +52,16 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "start_line": {"type": "integer"},
+        "end_line": {"type": "integer"},
+        "reason": {"type": "string"},
+    },
+    "required": ["start_line", "end_line", "reason"],
+}
+
 NEGATIVE_START_OR_END_LINE_MESSAGE = """\
 **FAILURE**: Invalid snippet {which_line} ({line_number}).
 
@@ -135,14 +145,21 @@ class PrevSnipFinder(SnipFinderBase, AgentBase):
         **kwargs,
     ):
         SnipFinderBase.__init__(self, repo=repo, determ=determ)
-        AgentBase.__init__(self, llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        AgentBase.__init__(
+            self,
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            *args,
+            **kwargs,
+        )
 
     def find(
         self, query: str, file_path: str, *args, **kwargs
     ) -> Generator[Tuple[str, str], None, None]:
         file_content = self.repo.get_file_content(file_path)
         file_lines = file_content.splitlines()
-        file_preview = FilePreview.of(file_path, file_content)
+        file_preview = PreviewDoc.of(file_path, file_content)
 
         snippet_list = []
 
@@ -291,63 +308,11 @@ class PrevSnipFinder(SnipFinderBase, AgentBase):
         )
 
     @staticmethod
-    def reduced_file_preview(preview: str, existing_snippets: List[Tuple[int, int]]):
+    def reduced_file_preview(
+        preview: PreviewDoc, existing_snippets: List[Tuple[int, int]]
+    ) -> str:
         # Reduce the preview by replacing saved snippets with dots
-        if len(existing_snippets) == 0:
-            return preview
-
-        max_line_number = -1
-        cached_preview_lines = []
-        # Find the preceding line numbers
-        for line in preview.splitlines():
-            line_number, line_content = FilePreview.parse_preview_line(line)
-            cached_preview_lines.append(
-                (line_number, (line, line_content))
-            )  # line_number might be None
-            if line_number is not None and line_number > max_line_number:
-                max_line_number = line_number
-
-        # Put preview lines in an array
-        preview_lines = [None for _ in range(max_line_number + 1)]
-        for index, (line_number, line_tuple) in enumerate(cached_preview_lines):
-            if line_number is not None:
-                preview_lines[line_number] = line_tuple
-
-        # Hide all lines in one of our snippet
-        for sa, sb in existing_snippets:
-            for line_number in range(sa, sb, 1):
-                line_tuple = preview_lines[line_number]
-                if line_tuple is not None:
-                    preview_lines[line_number] = None
-
-        reduced_preview = []
-        hidden_start_number = -1
-        last_line_number = 0
-        last_line_content = ""
-        for line_number, line in enumerate(preview_lines):
-            if line is not None:
-                if hidden_start_number == -1:
-                    reduced_preview.append(line[0])
-                    last_line_number = line_number
-                    last_line_content = line[1]
-                else:
-                    spacing = FilePreview.spacing_for_line_number(last_line_number)
-                    indentation = FilePreview.indentation_of_line(last_line_content)
-                    reduced_preview.extend(
-                        [
-                            spacing + indentation + "...",
-                            spacing
-                            + indentation
-                            + f"(lines {hidden_start_number}-{line_number - 1} are hidden in preview)",
-                            spacing + indentation + "...\n",
-                            line[0],
-                        ]
-                    )
-                    hidden_start_number = -1
-            elif hidden_start_number == -1:
-                hidden_start_number = line_number
-
-        return "\n".join(reduced_preview)
+        return preview.render(existing_snippets)
 
     @staticmethod
     def file_snippet(file_lines, start_line, end_line, surroundings=0):
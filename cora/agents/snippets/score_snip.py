@@ -51,6 +51,15 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "enum": [0, 1, 2, 3]},
+        "reason": {"type": "string"},
+    },
+    "required": ["score", "reason"],
+}
+
 NON_INTEGER_SCORE_MESSAGE = """\
 **FAILURE**: The relevance score ({score}) you gave is NOT an integer.
 
@@ -91,7 +100,15 @@ class SnipScorer(SnipRelDetmBase, AgentBase):
         *args,
         **kwargs,
     ):
-        AgentBase.__init__(self, llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        AgentBase.__init__(
+            self,
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            decision_fields=["score"],
+            *args,
+            **kwargs,
+        )
         self.threshold = threshold
 
     def is_debugging(self) -> bool:
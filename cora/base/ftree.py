@@ -1,67 +1,135 @@
+import copy
 import fnmatch
-from typing import List, Optional
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from itertools import compress
+from typing import List, Optional, Dict, Iterable, Tuple
+from weakref import WeakKeyDictionary
 
 from cora.base.repos import RepoBase
+from cora.utils.misc import estimate_num_tokens
+from cora.utils.pattern import match_any_pattern
 from cora.utils.tree import TreeNode
 
 """
 This script is adapted from Sweep's tree_utils.py
 """
 
+_PATTERN_WILDCARDS = re.compile(r"[*?\[]")
+_PATTERN_FILE_NAME_PREFIX = re.compile(r"^[A-Za-z][a-z]*[_\-.]?")
+
+# Fold similar sibling files into a summary line when budgeting the rendered tree,
+# if their directory has more than this many files ...
+_FOLD_MIN_SIBLING_FILES = 10
+# ... and if there are at least this many of them
+_FOLD_MIN_SIMILAR_FILES = 3
+
 
 class FileLine:
-    def __init__(self, num_indent, text, parent=None, is_dir=False):
+    __slots__ = (
+        "index",
+        "num_indent",
+        "text",
+        "parent",
+        "is_dir",
+        "children",
+        "_full_path",
+    )
+
+    def __init__(self, num_indent, text, parent=None, is_dir=False, index=-1):
+        self.index = index  # The line number in its file tree; -1 if out of any tree
         self.num_indent = num_indent
         # TODO: Use name only and update full_path()
         self.text = text
         self.parent = parent
         self.is_dir = is_dir
-        self.is_shown = True
+        self.children: List[FileLine] = []
+        if parent:
+            parent.children.append(self)
+        # Directories' text are their full paths; files' are their names
+        self._full_path = text if is_dir or not parent else parent.full_path() + text
 
     def full_path(self):
-        if self.is_dir:
-            return self.text
-        elif self.parent:
-            return self.parent.full_path() + self.text
-        else:
-            return self.text
+        return self._full_path
 
     def __eq__(self, other):
         if not isinstance(other, FileLine):
             return False
-        return self.full_path() == other.full_path()
+        return self._full_path == other._full_path
+
+    def __hash__(self):
+        return hash(self._full_path)
 
     def __str__(self):
-        return self.full_path()
+        return self._full_path
 
     def __repr__(self):
-        return self.full_path()
+        return self._full_path
 
 
 class FileTree:
     LINE_INDENT_NUM_SPACES = 2
     DIRECTORY_LINE_ENDINGS = "/"
 
+    # Complete trees of each repository (and includes); never handed out but their views
+    _CACHED_TREES: "WeakKeyDictionary[RepoBase, Dict[Tuple[str, ...], FileTree]]" = (
+        WeakKeyDictionary()
+    )
+    _CACHED_TREES_LOCK = threading.Lock()
+
     @staticmethod
     def from_repository(repository: RepoBase, includes: Optional[List[str]] = None):
-        file_tree = FileTree()
-        file_tree._parse_tree(repository.render_file_tree(includes=includes))
-        return file_tree
+        key = tuple(includes or [])
+        with FileTree._CACHED_TREES_LOCK:
+            cached_trees = FileTree._CACHED_TREES.setdefault(repository, {})
+            file_tree = cached_trees.get(key)
+        if file_tree is None:
+            file_tree = FileTree()
+            file_tree._build_tree(repository, includes)
+            with FileTree._CACHED_TREES_LOCK:
+                file_tree = cached_trees.setdefault(key, file_tree)
+        return file_tree.view()
+
+    def view(self) -> "FileTree":
+        """A file tree sharing all our lines and indices (never mutated) but with its own visibility"""
+        view = copy.copy(self)
+        view._shown = bytearray(self._shown)
+        return view
 
     def __init__(self):
-        # TODO: Refactor using tree, rather than list
+        # Lines are nodes of the file tree, listed in pre-order
         self._complete_lines: List[FileLine] = []
+        self._root_lines: List[FileLine] = []
+        self._lines_by_path: Dict[str, FileLine] = {}
+        # Full paths in lexicographical order (and their lines), such that lines
+        # sharing a path prefix are contiguous and can be queried like in a trie
+        self._sorted_paths: List[str] = []
+        self._sorted_lines: List[FileLine] = []
+        # Visibility of each line, indexed by the line's index
+        self._shown = bytearray()
+        self._num_shown = 0
 
     def _shown_lines(self):
-        return [line for line in self._complete_lines if line.is_shown]
+        return list(compress(self._complete_lines, self._shown))
 
-    @staticmethod
-    def _show_line(line):
-        line.is_shown = True
+    def _show_line(self, line):
+        if line.index >= 0 and not self._shown[line.index]:
+            self._shown[line.index] = 1
+            self._num_shown += 1
 
-    @staticmethod
-    def _hide_line(line):
-        line.is_shown = False
+    def _hide_line(self, line):
+        if line.index >= 0 and self._shown[line.index]:
+            self._shown[line.index] = 0
+            self._num_shown -= 1
+
+    def _is_shown(self, line):
+        return line.index >= 0 and self._shown[line.index] == 1
+
+    def _set_shown(self, shown: bytearray):
+        self._shown = shown
+        self._num_shown = shown.count(1)
 
     def _parse_tree(self, input_str: str):
         stack: List[FileLine] = []
@@ -70,61 +138,108 @@ class FileTree:
             num_spaces = len(line) - len(line.lstrip())
             num_indent = num_spaces // FileTree.LINE_INDENT_NUM_SPACES
             line = line.strip()
-
-            while stack and stack[-1].num_indent >= num_indent:
-                stack.pop()
-
             is_directory = line.endswith(FileTree.DIRECTORY_LINE_ENDINGS)
-            parent = stack[-1] if stack else None
-            # TODO: Remove such requirements
-            tree_line = FileLine(num_indent, line, parent, is_dir=is_directory)
+            self._append_line(stack, num_indent, line, is_directory)
+
+        self._build_indices()
 
-            if is_directory:
-                stack.append(tree_line)
+    def _build_tree(self, repository: RepoBase, includes: Optional[List[str]] = None):
+        # This equals to _parse_tree(repository.render_file_tree(includes)) without rendering
+        stack: List[FileLine] = []
 
-            self._complete_lines.append(tree_line)
+        for entry in repository.file_listing:
+            if (
+                entry.is_file
+                and includes
+                and not match_any_pattern(entry.path, includes)
+            ):
+                continue
+            if entry.is_dir:
+                text = entry.path + FileTree.DIRECTORY_LINE_ENDINGS
+            else:
+                text = entry.name
+            self._append_line(stack, entry.depth, text, entry.is_dir)
+
+        self._build_indices()
+
+    def _append_line(self, stack: List[FileLine], num_indent, text, is_dir):
+        while stack and stack[-1].num_indent >= num_indent:
+            stack.pop()
+
+        parent = stack[-1] if stack else None
+        # TODO: Remove such requirements
+        tree_line = FileLine(
+            num_indent, text, parent, is_dir=is_dir, index=len(self._complete_lines)
+        )
+
+        if is_dir:
+            stack.append(tree_line)
+
+        self._complete_lines.append(tree_line)
+
+    def _build_indices(self):
+        self._root_lines = [line for line in self._complete_lines if not line.parent]
+        self._lines_by_path = {line.full_path(): line for line in self._complete_lines}
+        self._sorted_lines = sorted(self._complete_lines, key=lambda l: l.full_path())
+        self._sorted_paths = [line.full_path() for line in self._sorted_lines]
+        self._set_shown(bytearray(b"\x01") * len(self._complete_lines))
+
+    def _lines_with_prefix(self, prefix: str) -> Iterable[FileLine]:
+        index = bisect_left(self._sorted_paths, prefix)
+        while index < len(self._sorted_paths) and self._sorted_paths[index].startswith(
+            prefix
+        ):
+            yield self._sorted_lines[index]
+            index += 1
 
     def current_size(self):
-        return len(self._shown_lines())
+        return self._num_shown
 
     def complete_size(self):
         return len(self._complete_lines)
 
     def find_files(self, pattern: str, is_dir: bool = False):
-        return [
-            line.full_path()
-            for line in self._shown_lines()
-            if (not is_dir or line.is_dir)
-            and fnmatch.fnmatch(line.full_path(), pattern)
-        ]
+        # Paths matching a pattern with a literal prefix must start with that prefix
+        literal_prefix = _PATTERN_WILDCARDS.split(pattern, maxsplit=1)[0]
+        if literal_prefix:
+            lines = sorted(
+                (
+                    line
+                    for line in self._lines_with_prefix(literal_prefix)
+                    if self._shown[line.index]
+                ),
+                key=lambda l: l.index,
+            )
+        else:
+            lines = self._shown_lines()
+        lines = [line for line in lines if not is_dir or line.is_dir]
+        matched_paths = set(
+            fnmatch.filter([line.full_path() for line in lines], pattern)
+        )
+        return [line.full_path() for line in lines if line.full_path() in matched_paths]
 
     def include_file(self, file):
-        for line in self._shown_lines():
-            if not line.is_dir and file == line.full_path():
-                return True
-        return False
+        line = self._lines_by_path.get(file)
+        return line is not None and not line.is_dir and self._is_shown(line)
 
     def include_directory(self, directory):
-        for line in self._shown_lines():
-            if line.is_dir and directory == line.full_path():
-                return True
-        return False
+        line = self._lines_by_path.get(directory)
+        return line is not None and line.is_dir and self._is_shown(line)
 
     def reset(self):
-        for line in self._complete_lines:
-            self._show_line(line)
+        self._set_shown(bytearray(b"\x01") * len(self._complete_lines))
 
     def _show_only(self, lines_to_show):
-        for line in self._complete_lines:
-            self._hide_line(line)
+        shown = bytearray(len(self._complete_lines))
         for line in lines_to_show:
-            self._show_line(line)
+            shown[line.index] = 1
+        self._set_shown(shown)
 
     def _hide_only(self, lines_to_hide):
-        for line in self._complete_lines:
-            self._show_line(line)
+        shown = bytearray(b"\x01") * len(self._complete_lines)
         for line in lines_to_hide:
-            self._hide_line(line)
+            shown[line.index] = 0
+        self._set_shown(shown)
 
     def keep_only(self, included_files_or_dirs):
         """
@@ -133,28 +248,26 @@ class FileTree:
         - or are (direct or indirect) children of directories in included_files_or_dirs
         """
         if FileTree.DIRECTORY_LINE_ENDINGS in included_files_or_dirs:
-            return self.reset()
-        shown_lines, new_lines = self._shown_lines(), []
-        for line in shown_lines:
-            full_path = line.full_path()
-            # The current line is a child of any directory that are to be included
-            if any(
-                full_path.startswith(included_path)
-                for included_path in included_files_or_dirs
-            ):
+            return  # All shown lines are children of the root directory
+        shown, kept = self._shown, bytearray(len(self._complete_lines))
+        for included_path in set(included_files_or_dirs):
+            # The shown line is a child of any directory that are to be included
+            for line in self._lines_with_prefix(included_path):
+                if not shown[line.index]:
+                    continue
                 # Include the current line and all its parents
-                parent_list = []
+                kept[line.index] = 1
                 curr_parent = line.parent
-                while curr_parent and curr_parent not in new_lines:
-                    parent_list.append(curr_parent)
+                while curr_parent and not kept[curr_parent.index]:
+                    kept[curr_parent.index] = 1
                     curr_parent = curr_parent.parent
-                new_lines.extend(parent_list[::-1])
-                new_lines.append(line)
-            # The current line's direct parent is to be included
-            elif line.parent and line.parent.full_path() in included_files_or_dirs:
-                # Include the current line
-                new_lines.append(line)
-        self._show_only(new_lines)
+            # The shown line's direct parent is to be included
+            included_line = self._lines_by_path.get(included_path)
+            if included_line and included_line.is_dir:
+                for child in included_line.children:
+                    if shown[child.index]:
+                        kept[child.index] = 1
+        self._set_shown(kept)
 
     def expand_directory(self, directory):
         """
@@ -170,35 +283,62 @@ class FileTree:
         def parent_dirs(path):
             return [path[: i + 1] for i in range(len(path)) if path[i] == "/"]
 
-        dir_parents = []
+        dir_parents = set()
         for dir_ in dirs_to_expand:
             # If it's not an extension and it doesn't end in /, add /
             if not dir_.endswith(FileTree.DIRECTORY_LINE_ENDINGS):
                 dir_ += FileTree.DIRECTORY_LINE_ENDINGS
-            dir_parents.extend(parent_dirs(dir_))
-        dirs_to_expand = list(set(dirs_to_expand))
-        expanded_lines = []
-        for line in self._complete_lines:
-            # The line is in the root directory, and we are expanding the root directory
-            if not line.parent and FileTree.DIRECTORY_LINE_ENDINGS in dirs_to_expand:
-                expanded_lines.append(line)
-            # The line is included by one of the directory in dirs_to_expand
-            elif line.parent and any(
-                line.parent.full_path().startswith(dir_) for dir_ in dirs_to_expand
-            ):
-                expanded_lines.append(line)
-            # The line is a parent of one of the directory in dirs_to_expand
-            elif line.full_path() in dir_parents:
-                expanded_lines.append(line)
-            # The line is one of the directory in dirs_to_expand
-            elif line.full_path() in dirs_to_expand:
+            dir_parents.update(parent_dirs(dir_))
+        dirs_to_expand = set(dirs_to_expand)
+
+        # By default, the line keeps shown if it is shown currently
+        expanded = bytearray(self._shown)
+        # The line is one of the directory in dirs_to_expand
+        for dir_ in dirs_to_expand:
+            line = self._lines_by_path.get(dir_)
+            if line:
                 # We must ensure that our parents are to be expanded
-                if not line.parent or line.parent.full_path() in dirs_to_expand:
-                    expanded_lines.append(line)
-            # The line is shown currently
-            elif line.is_shown:
-                expanded_lines.append(line)
-        self._show_only(expanded_lines)
+                expanded[line.index] = (
+                    not line.parent or line.parent.full_path() in dirs_to_expand
+                )
+        # The line is in the root directory, and we are expanding the root directory
+        if FileTree.DIRECTORY_LINE_ENDINGS in dirs_to_expand:
+            for line in self._root_lines:
+                expanded[line.index] = 1
+        # The line is included by one of the directory in dirs_to_expand
+        for dir_ in dirs_to_expand:
+            for line in self._lines_with_prefix(dir_):
+                if line.is_dir:
+                    for child in line.children:
+                        expanded[child.index] = 1
+        # The line is a parent of one of the directory in dirs_to_expand
+        for dir_ in dir_parents:
+            line = self._lines_by_path.get(dir_)
+            if line:
+                expanded[line.index] = 1
+        self._set_shown(expanded)
+
+    def show_only_children_of(self, dirs):
+        """
+        Show only the *direct* children of directories in dirs (along with these directories and
+        their parents) such that subdirectories of these directories are shown collapsed;
+        lines that are currently hidden are kept hidden
+        """
+        lines_to_show = set()
+        for dir_ in dirs:
+            if not dir_.endswith(FileTree.DIRECTORY_LINE_ENDINGS):
+                dir_ += FileTree.DIRECTORY_LINE_ENDINGS
+            if dir_ == FileTree.DIRECTORY_LINE_ENDINGS:
+                lines_to_show.update(self._root_lines)
+                continue
+            line = self._lines_by_path.get(dir_)
+            if not line or not line.is_dir:
+                continue
+            lines_to_show.update(line.children)
+            while line and line not in lines_to_show:
+                lines_to_show.add(line)
+                line = line.parent
+        self._show_only(line for line in lines_to_show if self._is_shown(line))
 
     def collapse_directory(self, directory):
         return self.collapse_directories([directory])
@@ -244,43 +384,50 @@ class FileTree:
         def hide_node(n):
             self._hide_line(n.data)
 
+        def push(n, generation):
+            # The number of indentations prioritizes the number of children; ties are
+            # broken by collapsing the lower line first
+            priority = n.data.num_indent * 1000000 - len(n.children)
+            heapq.heappush(im_dir_heap, (generation, -priority, -n.data.index, n))
+
+        # Innermost directories are those directories which are leaves or contain files. Let's
+        # collapse them generation by generation: once a generation is all collapsed, the
+        # next is those directories which are left without any children.
         tree_root = self._as_tree(self._shown_lines())
-        im_dir_nodes = []
-        while self.current_size() > size:
-            if len(im_dir_nodes) == 0:
-                # Let's collapse the innermost directory with the least number of children
-                im_dir_nodes = set()
-                for node in tree_root.leaves():
-                    if node.data.is_dir:  # It's a directory, add it
-                        im_dir_nodes.add(node)
-                    elif node.parent:  # It's a file, add its parent
-                        im_dir_nodes.add(node.parent)
-                im_dir_nodes = [n for n in im_dir_nodes]
-                # The number of indentations prioritizes the number of children
-                im_dir_nodes.sort(
-                    key=lambda n: n.data.num_indent * 1000000 - len(n.children)
-                )
-            chosen_node = im_dir_nodes.pop()
+        im_dir_heap: List[Tuple[int, int, int, TreeNode]] = []
+        for node in self._tree_nodes(tree_root):
+            if node.data.is_dir and (
+                not node.children or any(not c.data.is_dir for c in node.children)
+            ):
+                push(node, generation=0)
+        while self.current_size() > size and im_dir_heap:
+            generation, _, _, chosen_node = heapq.heappop(im_dir_heap)
+            # The node was collapsed together with its parent
+            if chosen_node is not tree_root and not self._is_shown(chosen_node.data):
+                continue
             chosen_node.accept(hide_node)
+            parent = chosen_node.parent
             chosen_node.detach()
+            if parent and not parent.children:
+                push(parent, generation=generation + 1)
 
     def collapse_empty_directories(self):
+        # Empty directories are those: directories without any files in their subtrees
         tree_root = self._as_tree(self._shown_lines())
-        empty_directories = []
-        while True:
-            # Empty directories are those: leaf directories without any children
-            curr_empty_dirs = [
-                node
-                for node in tree_root.leaves()
-                if node.data.is_dir and node.data not in empty_directories
-            ]
-            if len(curr_empty_dirs) == 0:
-                break
-            empty_directories.extend(node.data for node in curr_empty_dirs)
-            for node in curr_empty_dirs:
-                node.detach()
-        for line in empty_directories:
-            self._hide_line(line)
+        non_empty_nodes = set()
+        for node in reversed(self._tree_nodes(tree_root)):
+            if node.parent and (not node.data.is_dir or node in non_empty_nodes):
+                non_empty_nodes.add(node.parent)
+        for node in self._tree_nodes(tree_root):
+            if node.data.is_dir and node not in non_empty_nodes:
+                self._hide_line(node.data)
+
+    @staticmethod
+    def _tree_nodes(tree_root: TreeNode) -> List[TreeNode]:
+        # All nodes in pre-order, such that parents always come before their children
+        nodes = []
+        tree_root.accept(nodes.append)
+        return nodes
 
     @staticmethod
     def _as_tree(all_lines):
@@ -306,5 +453,178 @@ class FileTree:
             tree_str_items.append(("  " * line.num_indent) + line_text)
         return "\n".join(tree_str_items)
 
+    def to_budgeted_str(
+        self, token_budget: int, focus_files: Optional[Iterable[str]] = None
+    ) -> str:
+        """
+        Render the shown tree within token_budget tokens. Single-child directory
+        chains are merged into one line ("a/b/c/"), runs of similar sibling files are folded
+        ("(+37 test_*.py files)"), and directories closer to focus_files are expanded first.
+        Directories left unexpanded are shown with their number of files ("d/ (+12 files)"),
+        and top-level entries not fitting the budget are summarized ("(+40 more files)").
+        """
+        full_str = self.to_str()
+        if estimate_num_tokens(full_str) <= token_budget:
+            return full_str
+
+        tree_root = self._as_tree(self._shown_lines())
+        focus_files = set(focus_files or [])
+        focus_dirs = [f.split("/")[:-1] for f in focus_files]
+
+        # Number of files in each directory's subtree
+        num_files: Dict[TreeNode, int] = {}
+        for node in reversed(self._tree_nodes(tree_root)):
+            if node.parent:
+                num_files[node.parent] = num_files.get(node.parent, 0) + (
+                    num_files.get(node, 0) if node.data.is_dir else 1
+                )
+
+        def distance_to_focus(node: TreeNode) -> int:
+            dir_parts = node.data.full_path().split("/")[:-1]
+            if not focus_dirs:
+                return len(dir_parts)
+            distance = len(dir_parts) + max(len(fd) for fd in focus_dirs)
+            for fd in focus_dirs:
+                num_common = 0
+                while (
+                    num_common < min(len(dir_parts), len(fd))
+                    and dir_parts[num_common] == fd[num_common]
+                ):
+                    num_common += 1
+                distance = min(distance, len(dir_parts) + len(fd) - 2 * num_common)
+            return distance
+
+        def dir_name(node: TreeNode) -> str:
+            return node.data.text.split("/")[-2] + FileTree.DIRECTORY_LINE_ENDINGS
+
+        # Children of a directory: files, folded files, and (chains of) directories
+        children_items: Dict[TreeNode, List[tuple]] = {}
+        num_folded_files: Dict[TreeNode, int] = {}
+
+        def children_of(node: TreeNode) -> List[tuple]:
+            if node in children_items:
+                return children_items[node]
+            files = [c for c in node.children if not c.data.is_dir]
+            folded_files = {}
+            if len(files) > _FOLD_MIN_SIBLING_FILES:
+                similar_files: Dict[str, List[TreeNode]] = {}
+                for c in files:
+                    if c.data.full_path() not in focus_files:
+                        similar_files.setdefault(
+                            _file_name_pattern(c.data.text), []
+                        ).append(c)
+                for pattern, similar in similar_files.items():
+                    if len(similar) >= _FOLD_MIN_SIMILAR_FILES:
+                        for c in similar:
+                            folded_files[c] = (pattern, len(similar), c is similar[0])
+            items = []
+            for c in node.children:
+                if c.data.is_dir:
+                    chain_end, chain_name = c, dir_name(c)
+                    while (
+                        len(chain_end.children) == 1
+                        and chain_end.children[0].data.is_dir
+                    ):
+                        chain_end = chain_end.children[0]
+                        chain_name += dir_name(chain_end)
+                    items.append(("dir", chain_name, chain_end))
+                elif c not in folded_files:
+                    items.append(("file", c.data.text, c))
+                elif folded_files[c][2]:
+                    pattern, num_similar, _ = folded_files[c]
+                    items.append(("fold", f"(+{num_similar} {pattern} files)", c))
+                    num_folded_files[c] = num_similar
+            children_items[node] = items
+            return items
+
+        def item_line(item: tuple, depth: int, expanded: bool) -> str:
+            kind, text, node = item
+            if kind == "dir" and not expanded and num_files.get(node, 0) > 0:
+                text += f" (+{num_files[node]} files)"
+            return "  " * depth + text
+
+        def cost_of(line: str) -> int:
+            return estimate_num_tokens(line + "\n")
+
+        def children_cost(node: TreeNode, depth: int) -> int:
+            return sum(cost_of(item_line(i, depth, False)) for i in children_of(node))
+
+        def num_files_of(item: tuple) -> int:
+            kind, _, node = item
+            if kind == "dir":
+                return num_files.get(node, 0)
+            return num_folded_files[node] if kind == "fold" else 1
+
+        # Top-level entries alone may exceed the budget; keep those nearest to focus
+        used_tokens = children_cost(tree_root, 0)
+        if used_tokens > token_budget:
+            root_items = children_of(tree_root)
+            summary_cost = cost_of(f"(+{num_files[tree_root]} more files)")
+            kept, used_tokens = set(), 0
+            for i in sorted(
+                range(len(root_items)),
+                key=lambda j: (distance_to_focus(root_items[j][2]), j),
+            ):
+                cost = cost_of(item_line(root_items[i], 0, False))
+                if used_tokens + cost + summary_cost <= token_budget:
+                    kept.add(i)
+                    used_tokens += cost
+            items = [it for i, it in enumerate(root_items) if i in kept]
+            num_omitted = sum(
+                num_files_of(it) for i, it in enumerate(root_items) if i not in kept
+            )
+            summary = f"(+{num_omitted} more files)"
+            if cost_of(summary) + used_tokens <= token_budget:
+                items.append(("more", summary, None))
+                used_tokens += cost_of(summary)
+            children_items[tree_root] = items
+
+        # Expand directories best-first (nearest to focus, then shallowest) within the budget
+        expanded_dirs = {tree_root}
+        dir_heap = []
+
+        def push_dirs(node: TreeNode, depth: int):
+            for item in children_of(node):
+                if item[0] == "dir":
+                    heapq.heappush(
+                        dir_heap,
+                        (distance_to_focus(item[2]), depth, item[2].data.index, item),
+                    )
+
+        push_dirs(tree_root, 0)
+        while dir_heap:
+            _, depth, _, item = heapq.heappop(dir_heap)
+            delta = (
+                cost_of(item_line(item, depth, True))
+                - cost_of(item_line(item, depth, False))
+                + children_cost(item[2], depth + 1)
+            )
+            if used_tokens + delta > token_budget:
+                continue
+            used_tokens += delta
+            expanded_dirs.add(item[2])
+            push_dirs(item[2], depth + 1)
+
+        tree_str_items = []
+
+        def render(node: TreeNode, depth: int):
+            for item in children_of(node):
+                expanded = item[2] in expanded_dirs
+                tree_str_items.append(item_line(item, depth, expanded))
+                if item[0] == "dir" and expanded:
+                    render(item[2], depth + 1)
+
+        render(tree_root, 0)
+        return "\n".join(tree_str_items)
+
     def __str__(self):
         return self.to_str(skip_files=False)
+
+
+def _file_name_pattern(file_name: str) -> str:
+    # test_ftree.py -> test_*.py, FileTreeTest.java -> File*.java
+    stem, dot, ext = file_name.rpartition(".")
+    if not dot or not stem:
+        stem, ext = file_name, ""
+    prefix = _PATTERN_FILE_NAME_PREFIX.match(stem)
+    return (prefix.group(0) if prefix else "") + "*" + (f".{ext}" if ext else "")
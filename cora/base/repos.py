@@ -2,6 +2,7 @@ import glob
 import os
 import random
 from collections import namedtuple
+from functools import cached_property
 from pathlib import Path
 from typing import List, Optional, Tuple
 
@@ -13,6 +14,9 @@ from cora.utils.pattern import match_any_pattern
 from cora.utils.sanitize import sanitize_content
 
 RepoTup = namedtuple("RepoTup", ("org", "name", "path"))
+ListingEntry = namedtuple(
+    "ListingEntry", ("depth", "path", "name", "is_dir", "is_file")
+)
 
 
 class RepoBase:
@@ -33,15 +37,11 @@ class RepoBase:
     def full_name(self) -> str:
         return f"{self.repo_org}/{self.repo_name}"
 
-    def render_file_tree(self, includes: Optional[List[str]] = None) -> str:
-        from cora.base.ftree import FileTree
-
-        def should_include_file(fp: str):
-            return not includes or match_any_pattern(fp, includes)
-
-        def format_file_tree(curr_dir: FilePath, depth: int):
-            dir_tree_str = ""
+    @cached_property
+    def file_listing(self) -> List[ListingEntry]:
+        """A snapshot of the repository's (non-excluded) files and directories in pre-order"""
 
+        def list_directory(curr_dir: FilePath, depth: int):
             children_files = list(curr_dir.iterdir())
             children_files.sort()
 
@@ -50,17 +50,42 @@ class RepoBase:
                 relative_path = str(child_file)[len(self.repo_path) + 1 :]
                 if self.should_exclude(relative_path):
                     continue
-                if child_file.is_file() and not should_include_file(relative_path):
-                    continue
-                indentation = " " * FileTree.LINE_INDENT_NUM_SPACES * depth
-                if child_file.is_dir():
-                    dir_tree_str += f"{indentation}{relative_path}{FileTree.DIRECTORY_LINE_ENDINGS}\n"
-                    dir_tree_str += format_file_tree(child_file, depth=depth + 1)
-                else:
-                    dir_tree_str += f"{indentation}{child_file.name}\n"
-            return dir_tree_str
-
-        return format_file_tree(FilePath(self.repo_path), depth=0)
+                is_dir = child_file.is_dir()
+                listing.append(
+                    ListingEntry(
+                        depth,
+                        relative_path,
+                        child_file.name,
+                        is_dir=is_dir,
+                        is_file=child_file.is_file(),
+                    )
+                )
+                if is_dir:
+                    list_directory(child_file, depth=depth + 1)
+
+        listing: List[ListingEntry] = []
+        list_directory(FilePath(self.repo_path), depth=0)
+        return listing
+
+    def render_file_tree(self, includes: Optional[List[str]] = None) -> str:
+        from cora.base.ftree import FileTree
+
+        dir_tree_lines = []
+        for entry in self.file_listing:
+            if (
+                entry.is_file
+                and includes
+                and not match_any_pattern(entry.path, includes)
+            ):
+                continue
+            indentation = " " * FileTree.LINE_INDENT_NUM_SPACES * entry.depth
+            if entry.is_dir:
+                dir_tree_lines.append(
+                    f"{indentation}{entry.path}{FileTree.DIRECTORY_LINE_ENDINGS}\n"
+                )
+            else:
+                dir_tree_lines.append(f"{indentation}{entry.name}\n")
+        return "".join(dir_tree_lines)
 
     def get_all_files(self) -> List[str]:
         files = [
@@ -0,0 +1,164 @@
+"""
+Throughput of calls to EasyDeploy by concurrent agents against a local stand-in endpoint:
+fresh connections per call, versus pooled keep-alive connections, versus pooled connections
+with requests batched into single POSTs.
+
+Usage: python -m cora.benchmarks.easydeploy [--agents N ...] [--calls N] [--latency MS]
+
+The stand-in serves a limited number of POSTs at a time, like a deployment with a fixed number
+of replicas, and each POST takes the given latency plus a small cost per request it batches.
+"""
+
+import json
+import socket
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import httpx
+from rich.console import Console
+from rich.table import Table
+
+from cora.config import CoraConfig
+from cora.llms import easydeploy_
+
+_MESSAGES = [{"role": "user", "content": "Is the file relevant to the query?"}]
+_COMPLETION = {
+    "choices": [{"message": {"role": "assistant", "content": '{"score": 1}'}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+}
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Fresh connections of many agents arrive at once
+
+    def __init__(self, num_replicas: int, latency: float, latency_per_request: float):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.replicas = threading.Semaphore(num_replicas)
+        self.latency = latency
+        self.latency_per_request = latency_per_request
+        self.num_connections = 0
+        self._lock = threading.Lock()
+
+    def process_request(self, request: socket.socket, client_address):
+        with self._lock:
+            self.num_connections += 1
+        super().process_request(request, client_address)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive
+    server: _StandInServer
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        batch = req if isinstance(req, list) else [req]
+        with self.server.replicas:
+            time.sleep(
+                self.server.latency + self.server.latency_per_request * len(batch)
+            )
+        resp = [_COMPLETION] * len(batch) if isinstance(req, list) else _COMPLETION
+        data = json.dumps(resp).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _call_by_fresh_connection():
+    resp = httpx.post(
+        CoraConfig.easydeploy_endpoint_url(),
+        json={"model": "stand-in", "messages": _MESSAGES},
+    )
+    resp.raise_for_status()
+
+
+def _call_by_pool():
+    easydeploy_.call_easydeploy(
+        "stand-in", _MESSAGES, temperature=0, top_p=1, max_tokens=16
+    )
+
+
+def _run(call: Callable[[], None], num_agents: int, num_calls: int) -> float:
+    def agent():
+        for _ in range(num_calls):
+            call()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(num_agents) as executor:
+        for f in [executor.submit(agent) for _ in range(num_agents)]:
+            f.result()
+    return num_agents * num_calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--agents",
+        "-a",
+        type=int,
+        nargs="*",
+        default=[1, 8, 64],
+        help="Numbers of concurrent agents to benchmark",
+    )
+    parser.add_argument(
+        "--calls", "-c", type=int, default=20, help="Number of calls per agent"
+    )
+    parser.add_argument(
+        "--latency",
+        "-l",
+        type=float,
+        default=50,
+        help="Milliseconds the stand-in takes to serve a POST",
+    )
+    parser.add_argument(
+        "--replicas", type=int, default=8, help="Number of POSTs served at a time"
+    )
+    parser.add_argument(
+        "--batch-size",
+        "-b",
+        type=int,
+        default=16,
+        help="Maximum number of requests batched into a POST",
+    )
+    args = parser.parse_args()
+
+    table = Table(title="EasyDeploy Throughput (calls/s) and TCP Connections Opened")
+    for col in ["Agents", "Fresh", "Pooled", "Pooled+Batched"]:
+        table.add_column(col, justify="right")
+
+    results = {n: [] for n in args.agents}
+    for batch_size in [None, 1, args.batch_size]:
+        CoraConfig.EASYDEPLOY_MAX_BATCH_SIZE = batch_size or 1
+        for n in args.agents:
+            server = _StandInServer(args.replicas, args.latency / 1000, 0.002)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            CoraConfig.set(
+                "EASYDEPLOY_ENDPOINT", f"http://127.0.0.1:{server.server_port}/"
+            )
+            throughput = _run(
+                _call_by_pool if batch_size else _call_by_fresh_connection,
+                n,
+                args.calls,
+            )
+            # Pooled connections to the stopped stand-in cannot be reused by the next one
+            easydeploy_.reset_client()
+            server.shutdown()
+            server.server_close()
+            results[n].append(f"{throughput:.1f} ({server.num_connections})")
+
+    for n, row in results.items():
+        table.add_row(str(n), *row)
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
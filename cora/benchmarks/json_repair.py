@@ -0,0 +1,168 @@
+"""
+Rate of rounds repairing malformed responses when scoring files of a repository by their
+previews, with and without constraining responses to the agent's schema by the provider's
+structured outputs (LLM_CONSTRAIN_JSON_RESPONSES).
+
+Usage: python -m cora.benchmarks.json_repair --repo PATH [--model PROVIDER:MODEL] [--limit N]
+
+Without a model, a local stand-in of an OpenAI-compatible server plays a small model that
+malforms a share of its responses unless they're constrained by a JSON schema. It checks that
+schemas reach the provider and spare the repairs; measure real rates with a real model, e.g.,
+"ollama:qwen2:0.5b-instruct".
+"""
+
+import json
+import os
+import random
+import threading
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+_VALID_RESPONSE = '{"score": 1, "reason": "The stand-in never reads the file."}'
+_MALFORMED_RESPONSES = [
+    # Cut before closing
+    '{"score": 1, "reason": "The stand-in never reads',
+    # A missing field
+    '{"reason": "The stand-in never reads the file."}',
+    # Unescaped quotes
+    '{"score": 1, "reason": "The "stand-in" never reads the file."}',
+]
+
+
+class _StandInServer(ThreadingHTTPServer):
+    def __init__(self, malformed_rate: float):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.malformed_rate = malformed_rate
+        self.rand = random.Random(0)
+        self.lock = threading.Lock()
+
+    def respond(self, constrained: bool) -> str:
+        with self.lock:
+            if constrained or self.rand.random() >= self.malformed_rate:
+                return _VALID_RESPONSE
+            return self.rand.choice(_MALFORMED_RESPONSES)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: _StandInServer
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = self.server.respond("response_format" in req)
+        base = {"id": "stand-in", "created": 0, "model": req["model"]}
+        if req.get("stream"):
+            chunk = {"index": 0, "delta": {"content": content}, "finish_reason": None}
+            body = (
+                "data: "
+                + json.dumps(
+                    {**base, "object": "chat.completion.chunk", "choices": [chunk]}
+                )
+                + "\n\ndata: [DONE]\n\n"
+            )
+            self._send("text/event-stream", body)
+            return
+        choice = {
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }
+        self._send(
+            "application/json",
+            json.dumps({**base, "object": "chat.completion", "choices": [choice]}),
+        )
+
+    def _send(self, content_type: str, body: str):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--repo", "-r", required=True, help="Path to the repository to score"
+    )
+    parser.add_argument(
+        "--model",
+        "-m",
+        default=None,
+        help='The model in the format of "provider:model"; the stand-in if not given',
+    )
+    parser.add_argument(
+        "--query",
+        "-q",
+        default="Where are the responses of LLMs parsed and validated?",
+        help="The user query to score files for",
+    )
+    parser.add_argument(
+        "--limit", "-n", type=int, default=20, help="Number of files to score"
+    )
+    parser.add_argument(
+        "--malformed-rate",
+        type=float,
+        default=0.3,
+        help="Share of unconstrained responses the stand-in malforms",
+    )
+    args = parser.parse_args()
+
+    server = None
+    if args.model is None:
+        server = _StandInServer(args.malformed_rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Clients of the provider are created on import, so point them to the stand-in first
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+
+    from cora.agents.score_preview import PreviewScorer
+    from cora.base.repos import RepoTup
+    from cora.config import CoraConfig
+    from cora.llms import usage
+    from cora.llms.factory import LLMConfig, LLMFactory
+    from cora.repo.repo import Repository
+
+    provider, llm_name = (args.model or "openai:stand-in").split(":", maxsplit=1)
+    path = Path(args.repo).resolve()
+    repo = Repository(RepoTup(org="local", name=path.name, path=str(path)))
+    files = [e.path for e in repo.file_listing if e.is_file][: args.limit]
+    scorer = PreviewScorer(
+        args.query,
+        repo,
+        LLMFactory.create(LLMConfig(provider=provider, llm_name=llm_name)),
+    )
+
+    table = Table(title=f"JSON Repairs in Scoring {len(files)} Files")
+    for col in ["Constrained", "Calls", "Repair Rounds", "Repair Rate", "Seconds"]:
+        table.add_column(col, justify="right")
+    for constrained in [False, True]:
+        # Override the environment as well, which may turn it on for both runs otherwise
+        CoraConfig.set("LLM_CONSTRAIN_JSON_RESPONSES", str(int(constrained)))
+        CoraConfig.LLM_CONSTRAIN_JSON_RESPONSES = constrained
+        with usage.metering() as meter:
+            for file in files:
+                scorer.score(file, files)
+        u = meter.total
+        table.add_row(
+            str(constrained),
+            str(u.calls),
+            str(u.repair_rounds),
+            f"{u.repair_rate:.3f}",
+            f"{meter.wall_seconds:.2f}",
+        )
+    if server:
+        server.shutdown()
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Prompt tokens read from the provider's prompt cache when scoring files of a repository by
+their previews, against a local stand-in of an OpenAI-compatible server.
+
+Usage: python -m cora.benchmarks.prompt_cache --repo PATH [--query TEXT] [--limit N]
+
+Like OpenAI's automatic prefix caching, the stand-in caches prompts of at least 1024 tokens
+in blocks of 128 tokens, and reports a prompt's longest prefix shared with any earlier
+prompt as cached. Tokens are estimated the same way as elsewhere in CoRA.
+"""
+
+import json
+import os
+import threading
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List
+
+from rich.console import Console
+from rich.table import Table
+
+from cora.utils.misc import estimate_num_tokens
+
+_MIN_CACHED_TOKENS = 1024
+_CACHE_BLOCK_TOKENS = 128
+_RESPONSE = '{"score": 1, "reason": "The stand-in never reads the file."}'
+
+
+class _StandInServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.prompts: List[str] = []
+        self.lock = threading.Lock()
+
+    def num_cached_tokens(self, prompt: str) -> int:
+        with self.lock:
+            shared = max(
+                (len(os.path.commonprefix([prompt, p])) for p in self.prompts),
+                default=0,
+            )
+            self.prompts.append(prompt)
+        num_tokens = estimate_num_tokens(prompt[:shared])
+        if num_tokens < _MIN_CACHED_TOKENS:
+            return 0
+        return num_tokens // _CACHE_BLOCK_TOKENS * _CACHE_BLOCK_TOKENS
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    server: _StandInServer
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = "".join(f"{m['role']}\n{m['content']}\n" for m in req["messages"])
+        usage = {
+            "prompt_tokens": estimate_num_tokens(prompt),
+            "completion_tokens": estimate_num_tokens(_RESPONSE),
+            "total_tokens": estimate_num_tokens(prompt + _RESPONSE),
+            "prompt_tokens_details": {
+                "cached_tokens": self.server.num_cached_tokens(prompt)
+            },
+        }
+        base = {"id": "stand-in", "created": 0, "model": req["model"]}
+        if not req.get("stream"):
+            self._send(
+                "application/json",
+                json.dumps(
+                    {
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": _RESPONSE},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": usage,
+                    }
+                ),
+            )
+            return
+        chunks = [
+            {
+                "choices": [
+                    {"index": 0, "delta": {"content": _RESPONSE}, "finish_reason": None}
+                ]
+            },
+            {"choices": [], "usage": usage},
+        ]
+        self._send(
+            "text/event-stream",
+            "".join(
+                f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', **c})}\n\n"
+                for c in chunks
+            )
+            + "data: [DONE]\n\n",
+        )
+
+    def _send(self, content_type: str, body: str):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--repo", "-r", required=True, help="Path to the repository to score"
+    )
+    parser.add_argument(
+        "--query",
+        "-q",
+        default="Where are the responses of LLMs parsed and validated?",
+        help="The user query to score files for",
+    )
+    parser.add_argument(
+        "--limit", "-n", type=int, default=20, help="Number of files to score"
+    )
+    args = parser.parse_args()
+
+    server = _StandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Clients of the provider are created on import, so import after pointing them to the stand-in
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+
+    from cora.agents.score_preview import PreviewScorer
+    from cora.base.repos import RepoTup
+    from cora.config import CoraConfig
+    from cora.llms import usage
+    from cora.llms.factory import LLMConfig, LLMFactory
+    from cora.repo.repo import Repository
+
+    # OpenAI reports the usage in the last chunk of a stream, which a cut stream never reaches
+    CoraConfig.LLM_STREAM_JSON_RESPONSES = False
+
+    path = Path(args.repo).resolve()
+    repo = Repository(RepoTup(org="local", name=path.name, path=str(path)))
+    files = [e.path for e in repo.file_listing if e.is_file][: args.limit]
+    scorer = PreviewScorer(
+        args.query,
+        repo,
+        LLMFactory.create(LLMConfig(provider="openai", llm_name="stand-in")),
+    )
+
+    table = Table(title="Prompt Tokens Read from the Prompt Cache")
+    for col in ["File", "Prompt", "Cached", "Cached %"]:
+        table.add_column(col, justify="left" if col == "File" else "right")
+    with usage.metering() as total:
+        for file in files:
+            with usage.metering() as meter:
+                scorer.score(file, files)
+            u = meter.total
+            table.add_row(
+                file,
+                str(u.prompt_tokens),
+                str(u.cached_prompt_tokens),
+                f"{100 * u.cached_prompt_tokens / max(u.prompt_tokens, 1):.1f}",
+            )
+    u = total.total
+    table.add_row(
+        "(total)",
+        str(u.prompt_tokens),
+        str(u.cached_prompt_tokens),
+        f"{100 * u.cached_prompt_tokens / max(u.prompt_tokens, 1):.1f}",
+    )
+    server.shutdown()
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
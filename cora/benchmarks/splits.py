@@ -0,0 +1,302 @@
+"""
+Throughput of splitters and previewers over a corpus of files, grouped by language.
+
+Usage: python -m cora.benchmarks.splits [--corpus DIR ...] [--repeat N] [--warm]
+
+Besides files under the given directories, a few synthetic pathological files
+(huge generated code, minified code, deeply nested XML, etc.) are always benchmarked.
+Peak memory is traced by tracemalloc, thus excluding native memory (e.g., of tree-sitter).
+"""
+
+import gc
+import random
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from cora.base.paths import FilePath
+from cora.config import CoraConfig
+from cora.preview import (
+    FilePreview,
+    CodePreview,
+    XMLPreview,
+    TextPreview,
+    PythonPreview,
+)
+from cora.splits.code_ import ASTSpl
+from cora.splits.factory import SplFactory
+from cora.splits.ftypes import parse_ftype
+from cora.splits.parsed import language_of, _CACHE as _PARSED_CACHE
+from cora.splits.text_ import LineSpl
+
+# Target name -> (whether the target applies to a file type, the target)
+BenchTarget = Tuple[Callable[[str], bool], Callable[[FilePath, str, str], Any]]
+
+
+def _supported_by_ast(file_type: Optional[str]) -> bool:
+    try:
+        language_of(file_type)
+        return True
+    except Exception:
+        return False
+
+
+def _previewed_by(preview_cls):
+    def applies(file_type: Optional[str]) -> bool:
+        return FilePreview._PREVIEW_DICT.get(file_type) is preview_cls
+
+    def preview(file: FilePath, file_type: str, content: str):
+        return preview_cls(file_type, file.name, content).get_preview()
+
+    return applies, preview
+
+
+BENCH_TARGETS: Dict[str, BenchTarget] = {
+    "SplFactory": (lambda _: True, lambda f, _, __: SplFactory.create(f).split()),
+    "ASTSpl": (_supported_by_ast, lambda f, _, __: ASTSpl(f).split()),
+    "LineSpl": (lambda _: True, lambda f, _, __: LineSpl(f).split()),
+    "CodePreview": _previewed_by(CodePreview),
+    "XMLPreview": _previewed_by(XMLPreview),
+    "TextPreview": _previewed_by(TextPreview),
+    "PythonPreview": _previewed_by(PythonPreview),
+}
+
+
+def make_pathological_files(out_dir: Path, size: int) -> List[Path]:
+    """Files that are known to be slow, each roughly of the given size (in chars)"""
+    rand = random.Random(0)
+
+    def write(name: str, lines):
+        content, length = [], 0
+        for line in lines:
+            content.append(line)
+            length += len(line)
+            if length >= size:
+                break
+        (out_dir / name).write_text("".join(content), encoding="utf-8")
+        return out_dir / name
+
+    def gen_assignments():
+        # Huge generated files: lots of tiny top-level nodes
+        i = 0
+        while True:
+            yield f"CONSTANT_{i} = {rand.randint(0, 1 << 30)}\n"
+            i += 1
+
+    def gen_minified():
+        # Minified code: everything in a single line
+        i = 0
+        while True:
+            yield f"function f{i}(a,b){{return a*{i}+b}};var v{i}=f{i}({i},{i});"
+            i += 1
+
+    def gen_java_class():
+        # A giant class with many methods
+        yield "public class Generated {\n"
+        i = 0
+        while True:
+            yield f"    public int method{i}(int x) {{\n        int y = x * {i};\n"
+            yield "        if (y > 100) {\n            return y - 1;\n        }\n"
+            yield "        return y + 1;\n    }\n\n"
+            i += 1
+
+    def gen_deep_xml():
+        # Deeply nested elements, then a long flat tail of siblings
+        depth = 500
+        for d in range(depth):
+            yield " " * d + f'<node depth="{d}">\n'
+        i = 0
+        while i < size // 40:
+            yield " " * depth + f'<leaf id="{i}">v{i}</leaf>\n'
+            i += 1
+        for d in reversed(range(depth)):
+            yield " " * d + "</node>\n"
+
+    def gen_long_paragraphs():
+        # Text of long paragraphs consisting of many sentences
+        i = 0
+        while True:
+            yield " ".join(f"Sentence {i}.{j} is here." for j in range(50)) + "\n"
+            if i % 5 == 4:
+                yield "\n"
+            i += 1
+
+    def gen_python_functions():
+        i = 0
+        while True:
+            yield f"def function_{i}(a, b, c):\n    return a + b * {i} - c\n\n\n"
+            i += 1
+
+    files = [
+        write("generated.py", gen_assignments()),
+        write("minified.js", gen_minified()),
+        write("Generated.java", gen_java_class()),
+        write("many_functions.py", gen_python_functions()),
+        write("paragraphs.txt", gen_long_paragraphs()),
+    ]
+    # Deep XML should be written in full, or it would not be well-formed
+    deep_xml = out_dir / "deep.xml"
+    deep_xml.write_text("".join(gen_deep_xml()), encoding="utf-8")
+    files.append(deep_xml)
+    return files
+
+
+def collect_corpus(dirs: List[str]) -> List[Path]:
+    files = []
+    for d in dirs:
+        for path in sorted(Path(d).rglob("*")):
+            if (
+                path.is_file()
+                and not CoraConfig.should_exclude(str(path))
+                and path.stat().st_size <= CoraConfig.MAX_BYTES_PER_FILE
+            ):
+                files.append(path)
+    return files
+
+
+class BenchStat:
+    def __init__(self):
+        self.num_files = 0
+        self.num_failures = 0
+        self.num_bytes = 0
+        self.times: List[float] = []
+        self.peak_memory = 0
+
+    def files_per_sec(self) -> float:
+        return self.num_files / max(sum(self.times), 1e-9)
+
+    def mb_per_sec(self) -> float:
+        return self.num_bytes / 1024 / 1024 / max(sum(self.times), 1e-9)
+
+    def p99_millis(self) -> float:
+        times = sorted(self.times)
+        return times[min(len(times) - 1, int(len(times) * 0.99))] * 1000 if times else 0
+
+
+def _run_once(target, file: Path, file_type: str, content: str, warm: bool) -> float:
+    if not warm:
+        _PARSED_CACHE.clear()
+    start = time.perf_counter()
+    target(FilePath(file), file_type, content)
+    return time.perf_counter() - start
+
+
+def run_benchmarks(
+    files: List[Path], *, repeat: int = 3, warm: bool = False, targets: List[str]
+) -> Dict[Tuple[str, str], BenchStat]:
+    stats: Dict[Tuple[str, str], BenchStat] = defaultdict(BenchStat)
+    for file in files:
+        file_type = parse_ftype(file.name) or "unknown"
+        content = file.read_text(encoding="utf-8", errors="replace")
+        for name in targets:
+            applies, target = BENCH_TARGETS[name]
+            if not applies(file_type):
+                continue
+            stat = stats[(name, file_type)]
+            try:
+                # Time with the best of runs, then measure memory in a separate run
+                best = min(
+                    _run_once(target, file, file_type, content, warm)
+                    for _ in range(repeat)
+                )
+                gc.collect()
+                tracemalloc.start()
+                _run_once(target, file, file_type, content, warm)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            except Exception:
+                tracemalloc.stop()
+                stat.num_failures += 1
+                continue
+            stat.num_files += 1
+            stat.num_bytes += len(content.encode("utf-8"))
+            stat.times.append(best)
+            stat.peak_memory = max(stat.peak_memory, peak)
+    return stats
+
+
+def print_stats(stats: Dict[Tuple[str, str], BenchStat], console: Console):
+    table = Table(title="Splitter and Previewer Throughput")
+    for col in [
+        "Target",
+        "Language",
+        "Files",
+        "Failures",
+        "Files/s",
+        "MB/s",
+        "P99 (ms)",
+        "Peak Mem. (MB)",
+    ]:
+        table.add_column(
+            col, justify="left" if col in ("Target", "Language") else "right"
+        )
+    for (name, file_type), stat in sorted(stats.items()):
+        table.add_row(
+            name,
+            file_type,
+            str(stat.num_files),
+            str(stat.num_failures),
+            f"{stat.files_per_sec():.1f}",
+            f"{stat.mb_per_sec():.2f}",
+            f"{stat.p99_millis():.2f}",
+            f"{stat.peak_memory / 1024 / 1024:.2f}",
+        )
+    console.print(table)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--corpus",
+        "-c",
+        nargs="*",
+        default=[],
+        help="Directories of files to benchmark (recursively)",
+    )
+    parser.add_argument(
+        "--targets",
+        "-t",
+        nargs="*",
+        choices=list(BENCH_TARGETS.keys()),
+        default=list(BENCH_TARGETS.keys()),
+        help="Splitters and previewers to benchmark",
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        default=3,
+        help="Number of runs per file; the best is taken",
+    )
+    parser.add_argument(
+        "--pathological-size",
+        type=int,
+        default=CoraConfig.MAX_BYTES_PER_FILE,
+        help="Approximate size (in chars) of each synthetic pathological file",
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Keep parsed files cached across runs (by default, files are parsed per run)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = collect_corpus(args.corpus) + make_pathological_files(
+            Path(temp_dir), args.pathological_size
+        )
+        stats = run_benchmarks(
+            files, repeat=args.repeat, warm=args.warm, targets=args.targets
+        )
+    print_stats(stats, Console())
+
+
+if __name__ == "__main__":
+    main()
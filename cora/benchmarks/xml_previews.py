@@ -0,0 +1,148 @@
+"""
+Parsing and previewing time of large XML files, by SlowXMLParser versus the lean parser.
+
+Usage: python -m cora.benchmarks.xml_previews [--corpus DIR ...] [--size N] [--repeat N]
+
+Besides XML files under the given directories, a few synthetic large XML files, shaped
+like Maven POMs, Android resources, and Spring configurations, are always benchmarked.
+"""
+
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable, List
+from xml.etree import ElementTree
+
+from rich.console import Console
+from rich.table import Table
+
+from cora.benchmarks.splits import collect_corpus
+from cora.config import CoraConfig
+from cora.preview.internal.xml_lines import parse_xml_lines
+from cora.preview.internal.xml_parser import SlowXMLParser
+from cora.preview.xml_ import XMLPreview
+
+
+def make_large_xml_files(out_dir: Path, size: int) -> List[Path]:
+    rand = random.Random(0)
+
+    def write(name: str, head: str, gen_item: Callable[[int], str], tail: str):
+        content, length, i = [head], len(head), 0
+        while length < size:
+            content.append(gen_item(i))
+            length += len(content[-1])
+            i += 1
+        content.append(tail)
+        (out_dir / name).write_text("".join(content), encoding="utf-8")
+        return out_dir / name
+
+    return [
+        write(
+            "pom.xml",
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<project xmlns="http://maven.apache.org/POM/4.0.0">\n'
+            "  <modelVersion>4.0.0</modelVersion>\n  <dependencies>\n",
+            lambda i: (
+                "    <dependency>\n"
+                f"      <groupId>org.example.group{i % 97}</groupId>\n"
+                f"      <artifactId>artifact-{i}</artifactId>\n"
+                f"      <version>{rand.randint(1, 9)}.{rand.randint(0, 99)}</version>\n"
+                "      <exclusions>\n        <exclusion>\n"
+                f"          <groupId>org.excluded{i}</groupId>\n"
+                "        </exclusion>\n      </exclusions>\n"
+                "    </dependency>\n"
+            ),
+            "  </dependencies>\n</project>\n",
+        ),
+        write(
+            "strings.xml",
+            '<?xml version="1.0" encoding="utf-8"?>\n<resources>\n',
+            lambda i: f'    <string name="label_{i}">Label &amp; text number {i}</string>\n',
+            "</resources>\n",
+        ),
+        write(
+            "applicationContext.xml",
+            '<beans xmlns="http://www.springframework.org/schema/beans"\n'
+            '       xmlns:p="http://www.springframework.org/schema/p">\n',
+            lambda i: (
+                f'  <bean id="service{i}" class="org.example.Service{i}">\n'
+                f'    <property name="dao" ref="dao{i}"/>\n'
+                f'    <property name="timeout" value="{rand.randint(1, 1000)}"/>\n'
+                "  </bean>\n"
+            ),
+            "</beans>\n",
+        ),
+    ]
+
+
+def _time_of(fn: Callable[[], any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--corpus",
+        "-c",
+        nargs="*",
+        default=[],
+        help="Directories of XML files to benchmark (recursively)",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=CoraConfig.MAX_BYTES_PER_FILE,
+        help="Approximate size (in chars) of each synthetic XML file",
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        default=3,
+        help="Number of runs per file; the best is taken",
+    )
+    args = parser.parse_args()
+
+    table = Table(title="XML Parsing and Previewing Time (ms)")
+    for col in ["File", "KB", "SlowXMLParser", "Lean Parser", "Speedup", "Preview"]:
+        table.add_column(col, justify="left" if col == "File" else "right")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = [
+            f for f in collect_corpus(args.corpus) if f.suffix == ".xml"
+        ] + make_large_xml_files(Path(temp_dir), args.size)
+        for file in files:
+            content = file.read_text(encoding="utf-8", errors="replace")
+            try:
+                slow = _time_of(
+                    lambda: ElementTree.fromstring(content, parser=SlowXMLParser()),
+                    args.repeat,
+                )
+                lean = _time_of(lambda: parse_xml_lines(content), args.repeat)
+                preview = _time_of(
+                    lambda: XMLPreview("xml", file.name, content).get_preview(),
+                    args.repeat,
+                )
+            except ElementTree.ParseError:
+                continue
+            table.add_row(
+                file.name,
+                f"{len(content.encode('utf-8')) / 1024:.1f}",
+                f"{slow * 1000:.2f}",
+                f"{lean * 1000:.2f}",
+                f"{slow / max(lean, 1e-9):.1f}x",
+                f"{preview * 1000:.2f}",
+            )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
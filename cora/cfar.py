@@ -9,6 +9,7 @@ from cora.agents.rewrite.issue import IssueSummarizer
 from cora.base.console import get_boxed_console
 from cora.config import CoraConfig
 from cora.llms.factory import LLMConfig
+from cora.preview.batch import precompute_previews
 from cora.repo.repo import Repository
 from cora.retrv import retrv
 
@@ -83,6 +84,8 @@ def main():
     query, incl = options.parse_query(args)
     llm = options.parse_llms(args)
     procs, threads = options.parse_perf(args)
+    if options.parse_precompute(args):
+        precompute_previews(repo, includes=incl, num_procs=procs)
     CoraConfig.SCR_ENUM_FNDR_NUM_THREADS = threads
     log_dir, verbose = options.parse_logging(args)
 
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from dotenv import load_dotenv
 
@@ -21,13 +21,23 @@ class _RetrieverConfigMixin:
     FTE_STRATEGY_NAME_NO_FTE = "disable-fte"
     FTE_STRATEGY_NAME_FTD_GU = "files-then-dirs__give-up"
     FTE_STRATEGY_NAME_FTD_TS = "files-then-dirs__try-shrinking"
+    FTE_STRATEGY_NAME_DTF = "dirs-then-files"
     FTE_STRATEGY = FTE_STRATEGY_NAME_FTD_GU
     FTE_FTD_GOING_UPWARD = 2
     FTE_FILE_LIMIT = 2
     FTE_MAX_FILE_TREE_SIZE = 1500
+    FTE_DTF_DIR_LIMIT = 3  # Directories to choose per round of hierarchical exploration
+    FTE_DTF_MAX_ROUNDS = 10
+    # Trees too large are rendered compactly within this budget by try-shrinking and
+    # dirs-then-files rather than given up; 0 to disable
+    FTE_MAX_FILE_TREE_TOKENS = 0
 
     # File Preview Scoring
     FPS_PREVIEW_SCORE_THRESHOLD = 2
+    # Previews are shrunk to fit this budget; 0 to disable
+    FPS_PREVIEW_TOKEN_BUDGET = 4000
+    # Max in-flight queries on an event loop; 0 to use threads
+    FPS_NUM_ASYNC_QUERIES = 0
 
     # Snippet Context Retrieval
     SCR_SNIPPET_FINDER_NAME_ENUM_FNDR = "enumerative-finder"
@@ -50,6 +60,11 @@ class _FileConfigMixin:
         100  # Do not consider directories containing files more than this number
     )
     EXCLUDE_HIDDEN_FILES = True  # Whether to consider hidden files
+    PARSED_FILE_CACHE_MAX_BYTES = (
+        512 * 1024 * 1024  # Roughly bound the memory taken by cached parsed files
+    )
+
+    PREVIEW_CACHE_MAX_ENTRIES = 4096  # Previews kept in memory before the on-disk cache
 
     EXCLUDED_FILE_NAMES: List[str] = ["gradle-wrapper.properties", "local.properties"]
     EXCLUDED_DIRECTORY_NAMES: List[str] = [
@@ -171,7 +186,42 @@ class _FileConfigMixin:
         )
 
 
-class CoraConfig(_FileConfigMixin, _RetrieverConfigMixin):
+class _LLMConfigMixin:
+    # Least recently used responses are evicted once cached ones exceed this size
+    LLM_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+    # Responses older than this are never reused
+    LLM_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+    # Upper bound of adaptive concurrency per model; 0 for unbounded
+    LLM_MAX_CONCURRENCY = 0
+    LLM_MAX_RETRIES = 6  # Retries of rate-limited or failed calls (with backoff)
+    # Stream responses of agents and cut them once JSON closes; off unless turned on by
+    # --llm-stream-json or the environment
+    LLM_STREAM_JSON_RESPONSES = False
+    # Further cut them right after the decision (e.g., scores), skipping the reason
+    LLM_STOP_AT_DECISIONS = False
+    # Keep Ollama models loaded between calls, so that the KV cache of the shared prompt
+    # prefix is reused rather than recomputed after the default 5 minutes of idleness
+    OLLAMA_KEEP_ALIVE = "30m"
+    # Constrain responses of agents to their schemas by providers' structured outputs (off
+    # unless turned on by --llm-constrain-json or the environment); models rejecting schemas
+    # (with 400 or 422) are retried and then queried without schemas
+    LLM_CONSTRAIN_JSON_RESPONSES = False
+    # Ollama before 0.5 rejects schemas as formats, after which models fall back to JSON mode
+    OLLAMA_FORMAT_BY_SCHEMA = True
+    # Concurrent calls to in-process HuggingFace models arriving within the wait are batched
+    HF_MAX_BATCH_SIZE = 8
+    HF_BATCH_WAIT_SECONDS = 0.02
+    # Connections to EASYDEPLOY_ENDPOINT are pooled and kept alive across calls
+    EASYDEPLOY_MAX_CONNECTIONS = 64
+    EASYDEPLOY_KEEPALIVE_SECONDS = 60.0
+    EASYDEPLOY_TIMEOUT_SECONDS = 120.0
+    EASYDEPLOY_CONNECT_TIMEOUT_SECONDS = 10.0
+    # Set this >1 only if the endpoint accepts a batch (JSON array) of requests
+    EASYDEPLOY_MAX_BATCH_SIZE = 1
+    EASYDEPLOY_BATCH_WAIT_SECONDS = 0.005
+
+
+class CoraConfig(_FileConfigMixin, _RetrieverConfigMixin, _LLMConfigMixin):
     # Additional environments or overridden environments
     _additional_envs_ = {}
 
@@ -199,6 +249,80 @@ class CoraConfig(_FileConfigMixin, _RetrieverConfigMixin):
             keyword_index_cache_directory.mkdir(parents=True)
         return keyword_index_cache_directory
 
+    @classmethod
+    def preview_cache_directory(cls) -> Path:
+        preview_cache_directory = CoraConfig.cache_directory() / "previews"
+        if not preview_cache_directory.exists():
+            preview_cache_directory.mkdir(parents=True)
+        return preview_cache_directory
+
+    @classmethod
+    def llm_cache_file(cls) -> Path:
+        if not cls.get("CACHE_DIRECTORY_PATH"):
+            raise ValueError(
+                "CACHE_DIRECTORY_PATH should be set to cache responses of LLMs"
+            )
+        if not CoraConfig.cache_directory().exists():
+            CoraConfig.cache_directory().mkdir(parents=True)
+        return CoraConfig.cache_directory() / "llm_responses.sqlite"
+
+    @classmethod
+    def llm_max_requests_per_minute(cls) -> int:
+        # Different deployments have different limits, so they're given by environments
+        return int(cls.get("LLM_MAX_REQUESTS_PER_MINUTE") or 0)
+
+    @classmethod
+    def llm_max_tokens_per_minute(cls) -> int:
+        return int(cls.get("LLM_MAX_TOKENS_PER_MINUTE") or 0)
+
+    @classmethod
+    def llm_stream_json_responses(cls) -> bool:
+        return cls.LLM_STREAM_JSON_RESPONSES or misc.to_bool(
+            cls.get("LLM_STREAM_JSON_RESPONSES")
+        )
+
+    @classmethod
+    def llm_stop_at_decisions(cls) -> bool:
+        return cls.LLM_STOP_AT_DECISIONS or misc.to_bool(
+            cls.get("LLM_STOP_AT_DECISIONS")
+        )
+
+    @classmethod
+    def llm_constrain_json_responses(cls) -> bool:
+        return cls.LLM_CONSTRAIN_JSON_RESPONSES or misc.to_bool(
+            cls.get("LLM_CONSTRAIN_JSON_RESPONSES")
+        )
+
+    @classmethod
+    def llm_replay_transcript(cls) -> Path:
+        if not cls.get("LLM_REPLAY_TRANSCRIPT"):
+            raise ValueError(
+                "LLM_REPLAY_TRANSCRIPT should be set to record or replay LLMs"
+            )
+        return Path(cls.get("LLM_REPLAY_TRANSCRIPT")).resolve()
+
+    @classmethod
+    def llm_replay_mode(cls) -> str:
+        mode = cls.get("LLM_REPLAY_MODE") or "replay"
+        if mode not in ["record", "replay"]:
+            raise ValueError(
+                f'LLM_REPLAY_MODE should be "record" or "replay", got: {mode}'
+            )
+        return mode
+
+    @classmethod
+    def llm_replay_latency(cls) -> Tuple[float, float]:
+        # The synthetic latency of replayed responses and its (uniform) jitter
+        return (
+            float(cls.get("LLM_REPLAY_LATENCY_SECONDS") or 0),
+            float(cls.get("LLM_REPLAY_JITTER_SECONDS") or 0),
+        )
+
+    @classmethod
+    def llm_replay_fail_on_miss(cls) -> bool:
+        # Otherwise, requests missing the transcript are responded empty and reported at exit
+        return misc.to_bool(cls.get("LLM_REPLAY_FAIL_ON_MISS") or "1")
+
     @classmethod
     def sanitize_content_in_repository(cls) -> bool:
         return misc.to_bool(cls.get("SANITIZE_CONTENT_IN_REPOSITORY"))
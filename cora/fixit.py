@@ -10,6 +10,7 @@ from cora.agents.rewrite.issue import IssueSummarizer
 from cora.base.console import BoxedConsoleBase
 from cora.base.rag import GeneratorBase
 from cora.options import ArgumentError
+from cora.preview.batch import precompute_previews
 from cora.repair import repair
 from cora.repair.events import IssueRepaCallbacks
 from cora.repo.repo import Repository
@@ -168,6 +169,8 @@ def main():
     issue_id = args.issue_id
     llm = options.parse_llms(args)
     procs, threads = options.parse_perf(args)
+    if options.parse_precompute(args):
+        precompute_previews(repo, includes=incl, num_procs=procs)
     eval_script, eval_args = parse_eval_script(args)
     log_dir, verbose = options.parse_logging(args)
 
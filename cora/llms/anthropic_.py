@@ -1,11 +1,80 @@
+import json
+from typing import List, Optional
+
 import anthropic
 
-from cora.llms.base import LLMBase
+from cora.llms import usage
+from cora.llms.base import LLMBase, ChatMessage
+from cora.utils.aio import LoopLocal
+
+# Retries are left to our rate limiter
+_client = anthropic.Anthropic(max_retries=0)
+_async_client = LoopLocal(lambda: anthropic.AsyncAnthropic(max_retries=0))
+
+
+def _record_usage(resp_usage):
+    # Input tokens exclude those read from or written into the prompt cache
+    cache_read = getattr(resp_usage, "cache_read_input_tokens", 0) or 0
+    cache_creation = getattr(resp_usage, "cache_creation_input_tokens", 0) or 0
+    usage.record_tokens(
+        resp_usage.input_tokens + cache_read + cache_creation,
+        resp_usage.output_tokens,
+        cache_read,
+    )
+
+
+def _record_stream_usage(stream):
+    # The input usage arrives first, so it's known even if the stream is cut
+    try:
+        _record_usage(stream.current_message_snapshot.usage)
+    except AssertionError:
+        pass  # Nothing was received
+
+
+# Responses are constrained to a schema by forcing the model to call a tool with the schema
+_RESPONSE_TOOL = "respond"
 
-_client = anthropic.Anthropic()
 
+def _tool_args(response_schema) -> dict:
+    if not response_schema:
+        return {}
+    return {
+        "tools": [
+            {
+                "name": _RESPONSE_TOOL,
+                "description": "Respond with a JSON object in the required format",
+                "input_schema": response_schema,
+            }
+        ],
+        "tool_choice": {"type": "tool", "name": _RESPONSE_TOOL},
+    }
 
-def call_anthropic(model_name, messages, *, temperature, top_p, max_tokens, system):
+
+def _response_text(resp) -> str:
+    for block in resp.content:
+        if block.type == "tool_use":
+            return json.dumps(block.input, ensure_ascii=False)
+    return resp.content[0].text
+
+
+def _stream_text(event) -> Optional[str]:
+    if event.type == "text":
+        return event.text
+    if event.type == "input_json":
+        return event.partial_json  # The tool's input, i.e., the response object
+    return None
+
+
+def call_anthropic(
+    model_name,
+    messages,
+    *,
+    temperature,
+    top_p,
+    max_tokens,
+    system,
+    response_schema=None,
+):
     resp = _client.messages.create(
         model=model_name,
         messages=messages,
@@ -13,8 +82,87 @@ def call_anthropic(model_name, messages, *, temperature, top_p, max_tokens, syst
         temperature=temperature,
         top_p=top_p,
         max_tokens=max_tokens,
+        **_tool_args(response_schema),
     )
-    return resp.content[0].text
+    _record_usage(resp.usage)
+    return _response_text(resp)
+
+
+async def acall_anthropic(
+    model_name,
+    messages,
+    *,
+    temperature,
+    top_p,
+    max_tokens,
+    system,
+    response_schema=None,
+):
+    resp = await _async_client.get().messages.create(
+        model=model_name,
+        messages=messages,
+        system=system,
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=max_tokens,
+        **_tool_args(response_schema),
+    )
+    _record_usage(resp.usage)
+    return _response_text(resp)
+
+
+def stream_anthropic(
+    model_name,
+    messages,
+    *,
+    temperature,
+    top_p,
+    max_tokens,
+    system,
+    response_schema=None,
+):
+    with _client.messages.stream(
+        model=model_name,
+        messages=messages,
+        system=system,
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=max_tokens,
+        **_tool_args(response_schema),
+    ) as stream:
+        try:
+            for event in stream:
+                if text := _stream_text(event):
+                    yield text
+        finally:
+            _record_stream_usage(stream)
+
+
+async def astream_anthropic(
+    model_name,
+    messages,
+    *,
+    temperature,
+    top_p,
+    max_tokens,
+    system,
+    response_schema=None,
+):
+    async with _async_client.get().messages.stream(
+        model=model_name,
+        messages=messages,
+        system=system,
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=max_tokens,
+        **_tool_args(response_schema),
+    ) as stream:
+        try:
+            async for event in stream:
+                if text := _stream_text(event):
+                    yield text
+        finally:
+            _record_stream_usage(stream)
 
 
 class Anthropic(LLMBase):
@@ -22,13 +170,10 @@ class Anthropic(LLMBase):
         super().__init__(*args, **kwargs)
         self.model = model
 
-    def do_query(self) -> str:
-        messages = [m.to_json() for m in self.history]
-        if messages[0]["role"] == "system":
-            system_prompt = messages[0]["content"]
-            messages = messages[1:]
-        else:
-            system_prompt = anthropic.NOT_GIVEN
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        system_prompt, messages = self._split_system_prompt(messages)
         return call_anthropic(
             self.model,
             messages=messages,
@@ -36,4 +181,71 @@ class Anthropic(LLMBase):
             top_p=self.top_p,
             max_tokens=self.max_tokens,
             system=system_prompt,
+            response_schema=response_schema,
         )
+
+    async def do_acomplete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        system_prompt, messages = self._split_system_prompt(messages)
+        return await acall_anthropic(
+            self.model,
+            messages=messages,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            system=system_prompt,
+            response_schema=response_schema,
+        )
+
+    def do_stream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ):
+        system_prompt, messages = self._split_system_prompt(messages)
+        return stream_anthropic(
+            self.model,
+            messages=messages,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            system=system_prompt,
+            response_schema=response_schema,
+        )
+
+    def do_astream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ):
+        system_prompt, messages = self._split_system_prompt(messages)
+        return astream_anthropic(
+            self.model,
+            messages=messages,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            system=system_prompt,
+            response_schema=response_schema,
+        )
+
+    @staticmethod
+    def _split_system_prompt(messages: List[ChatMessage]):
+        system_prompt, json_messages = anthropic.NOT_GIVEN, []
+        for i, m in enumerate(messages):
+            content = m.to_json()["content"]
+            if m.cache_breakpoint:
+                # Cache the shared prefix explicitly, which Anthropic never does implicitly
+                prefix, rest = (
+                    content[: m.cache_breakpoint],
+                    content[m.cache_breakpoint :],
+                )
+                content = [
+                    {
+                        "type": "text",
+                        "text": prefix,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ] + ([{"type": "text", "text": rest}] if rest else [])
+            if i == 0 and m.role == "system":
+                system_prompt = content
+            else:
+                json_messages.append({"role": m.role, "content": content})
+        return system_prompt, json_messages
@@ -1,8 +1,38 @@
+import asyncio
+import threading
 from abc import abstractmethod
-from dataclasses import dataclass
-from typing import Literal, Optional, List
+from dataclasses import dataclass, asdict
+from typing import Literal, Optional, List, Generator, AsyncGenerator, Set, Tuple
 
-from cora.base.console import get_boxed_console
+from cora.base.console import BoxedConsoleBase, get_boxed_console
+from cora.llms.cache import (
+    CacheMode,
+    CACHE_MODE_OFF,
+    CACHE_MODE_READ_WRITE,
+    ResponseCache,
+    get_response_cache,
+)
+from cora.llms import usage
+from cora.llms.limiter import RateLimiter, get_rate_limiter, status_of
+from cora.llms.stream import JSONStop
+from cora.utils.misc import estimate_num_tokens
+
+# Put into prompts to split the content shared by many calls (ahead) from the rest, such
+# that providers can cache the shared content (prefix) and skip processing it again
+PROMPT_CACHE_BREAKPOINT = "<|cache-breakpoint|>"
+
+
+# Providers and models that rejected response schemas (e.g., OpenAI-compatible endpoints
+# without structured outputs); their responses are no longer constrained
+_SCHEMA_REJECTING_MODELS: Set[Tuple[str, Optional[str]]] = set()
+_SCHEMA_REJECTING_MODELS_LOCK = threading.Lock()
+
+# Statuses of requests rejected as bad, which unsupported response schemas fail with
+_BAD_REQUEST_STATUSES = (400, 422)
+
+
+class UnrecoverableQueryError(Exception):
+    """Querying failed in a way that retrying (e.g., in the next chat round) never recovers."""
 
 
 @dataclass
@@ -33,6 +63,8 @@ class ChatMessage:
     content: str = None
     name: Optional[str] = None
     function_call: Optional[FunctionCall] = None
+    # Content preceding this offset is shared by many calls and is worth caching
+    cache_breakpoint: Optional[int] = None
 
     def to_json(self):
         obj = {"role": self.role, "content": ""}
@@ -45,21 +77,75 @@ class ChatMessage:
         return obj
 
 
-class LLMBase:
+class Conversation:
+    """
+    Messages of a chat with an LLM. Each run of an agent has its own conversation, such that
+    an agent (and its LLM) can be shared by threads (or tasks) without racing on messages.
+    """
+
     DEBUG_OUTPUT_SYSTEM_COLOR = "bright_red"
     DEBUG_OUTPUT_ASSISTANT_COLOR = "bright_yellow"
     DEBUG_OUTPUT_USER_COLOR = "light_cyan1"
     DEBUG_OUTPUT_FUNCTION_COLOR = "light_cyan1"
 
+    def __init__(self, console: BoxedConsoleBase):
+        self.messages: List[ChatMessage] = []
+        self.console = console
+
+    def append_system_message(self, content: str):
+        self.append_message(ChatMessage(role="system", content=content))
+
+    def append_user_message(self, content: str):
+        self.append_message(ChatMessage(role="user", content=content))
+
+    def append_assistant_message(self, content: str):
+        self.append_message(ChatMessage(role="assistant", content=content))
+
+    def append_message(self, message: ChatMessage):
+        if message.content and PROMPT_CACHE_BREAKPOINT in message.content:
+            message.cache_breakpoint = message.content.index(PROMPT_CACHE_BREAKPOINT)
+            message.content = message.content.replace(PROMPT_CACHE_BREAKPOINT, "", 1)
+        color = {
+            "system": Conversation.DEBUG_OUTPUT_SYSTEM_COLOR,
+            "user": Conversation.DEBUG_OUTPUT_USER_COLOR,
+            "function": Conversation.DEBUG_OUTPUT_FUNCTION_COLOR,
+            "assistant": Conversation.DEBUG_OUTPUT_ASSISTANT_COLOR,
+        }[message.role]
+        if message.role == "assistant" and message.function_call is not None:
+            fn_reason = message.function_call.reasoning
+            fn_name = message.function_call.name
+            fn_args = message.function_call.arguments
+            formatted_message = f"{fn_reason}\n\nCall Function: {fn_name}(**{fn_args})"
+        else:
+            formatted_message = message.content
+        self.console.printb(
+            formatted_message, title=message.role.capitalize(), background=color
+        )
+        self.messages.append(message)
+
+
+class LLMBase:
+    """
+    An LLM with its sampling parameters. It holds no chat states; complete() (and acomplete())
+    is reentrant and can be called by many threads (or tasks) at the same time.
+    """
+
     def __init__(
-        self, *, temperature=0, top_k=50, top_p=0.95, max_tokens=4096, debug_mode=False
+        self,
+        *,
+        temperature=0,
+        top_k=50,
+        top_p=0.95,
+        max_tokens=4096,
+        debug_mode=False,
+        cache_mode: CacheMode = CACHE_MODE_OFF,
     ):
-        self.history = []
         self.temperature = temperature
         self.top_k = top_k
         self.top_p = top_p
         self.max_tokens = max_tokens
         self.debug_mode = debug_mode
+        self.cache_mode = cache_mode
         self.console = get_boxed_console(debug_mode=debug_mode)
 
     def is_debug_mode(self):
@@ -73,45 +159,263 @@ class LLMBase:
         self.debug_mode = False
         self.console = get_boxed_console(debug_mode=False)
 
-    def query(self) -> str:
-        r = self.do_query()
-        self.append_assistant_message(r)
+    def new_conversation(self) -> Conversation:
+        return Conversation(self.console)
+
+    def complete(
+        self,
+        messages: List[ChatMessage],
+        *,
+        json_stop: Optional[JSONStop] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        """
+        Complete the messages. Given json_stop, the response is streamed and cut once its
+        JSON object closes (or its decision fields are given). Given response_schema (a JSON
+        schema), providers supporting structured outputs constrain the response to it.
+        """
+        with usage.metering_call() as call:
+            key = self._cache_key_if_cacheable(messages, json_stop, response_schema)
+            r = get_response_cache().get(key) if key else None
+            if r is None:
+                r = self._complete_with_schema_fallback(
+                    messages, json_stop, response_schema
+                )
+                if key and self.cache_mode == CACHE_MODE_READ_WRITE:
+                    get_response_cache().put(key, r)
+                self._estimate_usage_if_unreported(call, messages, r)
+            else:
+                call.cached_calls = 1
+        return r
+
+    async def acomplete(
+        self,
+        messages: List[ChatMessage],
+        *,
+        json_stop: Optional[JSONStop] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        with usage.metering_call() as call:
+            key = self._cache_key_if_cacheable(messages, json_stop, response_schema)
+            r = get_response_cache().get(key) if key else None
+            if r is None:
+                r = await self._acomplete_with_schema_fallback(
+                    messages, json_stop, response_schema
+                )
+                if key and self.cache_mode == CACHE_MODE_READ_WRITE:
+                    get_response_cache().put(key, r)
+                self._estimate_usage_if_unreported(call, messages, r)
+            else:
+                call.cached_calls = 1
+        return r
+
+    def query(
+        self,
+        conversation: Conversation,
+        *,
+        json_stop: Optional[JSONStop] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        """Complete the conversation and append the response to it."""
+        r = self.complete(
+            conversation.messages, json_stop=json_stop, response_schema=response_schema
+        )
+        conversation.append_assistant_message(r)
         return r
 
-    def get_history(self) -> List[ChatMessage]:
-        return self.history
+    async def aquery(
+        self,
+        conversation: Conversation,
+        *,
+        json_stop: Optional[JSONStop] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        r = await self.acomplete(
+            conversation.messages, json_stop=json_stop, response_schema=response_schema
+        )
+        conversation.append_assistant_message(r)
+        return r
 
-    def clear_history(self):
-        self.history = []
+    def _complete_with_schema_fallback(
+        self,
+        messages: List[ChatMessage],
+        json_stop: Optional[JSONStop],
+        response_schema: Optional[dict],
+    ) -> str:
+        def complete(schema: Optional[dict]) -> str:
+            return self._rate_limiter().call(
+                (
+                    (lambda: self._complete_by_stream(messages, json_stop, schema))
+                    if json_stop
+                    else (lambda: self.do_complete(messages, response_schema=schema))
+                ),
+                self._num_tokens_to_send(messages),
+            )
 
-    def append_system_message(self, content: str):
-        self.append_message(ChatMessage(role="system", content=content))
+        schema = self._supported_schema(response_schema)
+        try:
+            return complete(schema)
+        except Exception as e:
+            if schema is None or status_of(e) not in _BAD_REQUEST_STATUSES:
+                raise
+        # Retry once without the schema; the request is bad anyway if this fails too
+        r = complete(None)
+        self._reject_schemas()
+        return r
 
-    def append_user_message(self, content: str):
-        self.append_message(ChatMessage(role="user", content=content))
+    async def _acomplete_with_schema_fallback(
+        self,
+        messages: List[ChatMessage],
+        json_stop: Optional[JSONStop],
+        response_schema: Optional[dict],
+    ) -> str:
+        async def acomplete(schema: Optional[dict]) -> str:
+            return await self._rate_limiter().acall(
+                (
+                    (lambda: self._acomplete_by_stream(messages, json_stop, schema))
+                    if json_stop
+                    else (lambda: self.do_acomplete(messages, response_schema=schema))
+                ),
+                self._num_tokens_to_send(messages),
+            )
 
-    def append_assistant_message(self, content: str):
-        self.append_message(ChatMessage(role="assistant", content=content))
+        schema = self._supported_schema(response_schema)
+        try:
+            return await acomplete(schema)
+        except Exception as e:
+            if schema is None or status_of(e) not in _BAD_REQUEST_STATUSES:
+                raise
+        r = await acomplete(None)
+        self._reject_schemas()
+        return r
 
-    def append_message(self, message: ChatMessage):
-        color = {
-            "system": LLMBase.DEBUG_OUTPUT_SYSTEM_COLOR,
-            "user": LLMBase.DEBUG_OUTPUT_USER_COLOR,
-            "function": LLMBase.DEBUG_OUTPUT_FUNCTION_COLOR,
-            "assistant": LLMBase.DEBUG_OUTPUT_ASSISTANT_COLOR,
-        }[message.role]
-        if message.role == "assistant" and message.function_call is not None:
-            fn_reason = message.function_call.reasoning
-            fn_name = message.function_call.name
-            fn_args = message.function_call.arguments
-            formatted_message = f"{fn_reason}\n\nCall Function: {fn_name}(**{fn_args})"
-        else:
-            formatted_message = message.content
+    def _supported_schema(self, response_schema: Optional[dict]) -> Optional[dict]:
+        with _SCHEMA_REJECTING_MODELS_LOCK:
+            if self._schema_key() in _SCHEMA_REJECTING_MODELS:
+                return None
+        return response_schema
+
+    def _reject_schemas(self):
+        with _SCHEMA_REJECTING_MODELS_LOCK:
+            if self._schema_key() in _SCHEMA_REJECTING_MODELS:
+                return
+            _SCHEMA_REJECTING_MODELS.add(self._schema_key())
         self.console.printb(
-            formatted_message, title=message.role.capitalize(), background=color
+            f"{type(self).__name__} ({getattr(self, 'model', None)}) rejected the response "
+            f"schema; its responses are no longer constrained to schemas"
+        )
+
+    def _schema_key(self) -> Tuple[str, Optional[str]]:
+        return type(self).__name__, getattr(self, "model", None)
+
+    def _complete_by_stream(
+        self,
+        messages: List[ChatMessage],
+        json_stop: JSONStop,
+        response_schema: Optional[dict],
+    ) -> str:
+        scanner = json_stop.scanner()
+        chunks = self.do_stream(messages, response_schema=response_schema)
+        try:
+            for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+        finally:
+            chunks.close()  # Cancel the remaining stream if any
+        return scanner.text
+
+    async def _acomplete_by_stream(
+        self,
+        messages: List[ChatMessage],
+        json_stop: JSONStop,
+        response_schema: Optional[dict],
+    ) -> str:
+        scanner = json_stop.scanner()
+        chunks = self.do_astream(messages, response_schema=response_schema)
+        try:
+            async for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+        finally:
+            await chunks.aclose()
+        return scanner.text
+
+    @staticmethod
+    def _estimate_usage_if_unreported(
+        call: usage.Usage, messages: List[ChatMessage], response: str
+    ):
+        # Not all providers report the usage
+        if call.prompt_tokens == 0 and call.completion_tokens == 0:
+            call.prompt_tokens = sum(
+                estimate_num_tokens(m.content or "") for m in messages
+            )
+            call.completion_tokens = estimate_num_tokens(response or "")
+
+    def _rate_limiter(self) -> RateLimiter:
+        return get_rate_limiter(type(self).__name__, getattr(self, "model", None))
+
+    def _num_tokens_to_send(self, messages: List[ChatMessage]) -> int:
+        # Providers count the maximum tokens to generate against the limits upfront
+        return (
+            sum(estimate_num_tokens(m.content or "") for m in messages)
+            + self.max_tokens
+        )
+
+    def _cache_key_if_cacheable(
+        self,
+        messages: List[ChatMessage],
+        json_stop: Optional[JSONStop],
+        response_schema: Optional[dict] = None,
+    ) -> Optional[str]:
+        # Only responses of deterministic (greedy decoding) queries are cached
+        if self.cache_mode != CACHE_MODE_OFF and self.temperature == 0:
+            return self._cache_key(messages, json_stop, response_schema)
+        return None
+
+    def _cache_key(
+        self,
+        messages: List[ChatMessage],
+        json_stop: Optional[JSONStop],
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        # Responses cut at different points, or constrained differently, are different
+        extras = {"json_stop": asdict(json_stop)} if json_stop else {}
+        if response_schema:
+            extras["response_schema"] = response_schema
+        return ResponseCache.key_of(
+            **extras,
+            provider=type(self).__name__,
+            model=getattr(self, "model", None),
+            temperature=self.temperature,
+            top_k=self.top_k,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            messages=[m.to_json() for m in messages],
         )
-        self.history.append(message)
 
     @abstractmethod
-    def do_query(self) -> str:
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        """Providers not supporting structured outputs ignore the response schema."""
         pass
+
+    async def do_acomplete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        # Providers without an async client block a worker thread instead
+        return await asyncio.to_thread(
+            self.do_complete, messages, response_schema=response_schema
+        )
+
+    def do_stream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> Generator[str, None, None]:
+        """Stream chunks of the response; closing the generator cancels the stream."""
+        # Providers not supporting streaming yield the whole response
+        yield self.do_complete(messages, response_schema=response_schema)
+
+    async def do_astream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> AsyncGenerator[str, None]:
+        yield await self.do_acomplete(messages, response_schema=response_schema)
@@ -0,0 +1,99 @@
+"""
+Dynamic micro-batching of concurrent calls to backends that serve many requests at once
+more cheaply than one by one (e.g., a local model generating for a batch of prompts, or an
+endpoint accepting a batch of requests in a single POST).
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, List, TypeVar, Generic
+
+I = TypeVar("I")  # Items to process
+R = TypeVar("R")  # Results of items
+
+
+@dataclass
+class _Pending(Generic[I]):
+    item: I
+    key: Hashable
+    future: Future = field(default_factory=Future)
+
+
+class MicroBatcher(Generic[I, R]):
+    """
+    Gather items submitted by concurrent callers into batches processed by worker threads:
+    a batch collects items arriving within wait_seconds after its first item, up to max_size,
+    and only items of the same key (e.g., the same generation options) share a batch.
+    At most max_in_flight batches are processed at a time; the next batch is formed only
+    once one of them finishes, so items keep accumulating into it meanwhile.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[I]], List[R]],
+        *,
+        max_size: int,
+        wait_seconds: float,
+        max_in_flight: int = 1,
+        name: str = "micro-batcher",
+    ):
+        self.process = process
+        self.max_size = max(1, max_size)
+        self.wait_seconds = wait_seconds
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._left: List[_Pending] = []  # Items left by batches of other keys
+        self._slots = threading.Semaphore(max(1, max_in_flight))
+        self._workers = ThreadPoolExecutor(
+            max(1, max_in_flight), thread_name_prefix=name
+        )
+        threading.Thread(target=self._serve, name=name, daemon=True).start()
+
+    def submit(self, item: I, key: Hashable = None) -> R:
+        """Block until the batch containing the item is processed and return its result."""
+        pending = _Pending(item, key)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def _serve(self):
+        while True:
+            self._slots.acquire()
+            self._workers.submit(self._process, self._next_batch())
+
+    def _process(self, batch: List[_Pending]):
+        try:
+            results = self.process([p.item for p in batch])
+            if len(results) != len(batch):
+                # Never let callers wait forever or take results of others
+                raise ValueError(
+                    f"Processed a batch of {len(batch)} items into {len(results)} results"
+                )
+        except Exception as e:
+            for p in batch:
+                p.future.set_exception(e)
+        else:
+            for p, res in zip(batch, results):
+                p.future.set_result(res)
+        finally:
+            self._slots.release()
+
+    def _next_batch(self) -> List[_Pending]:
+        first = self._left.pop(0) if self._left else self._queue.get()
+        batch, deadline = [first], time.monotonic() + self.wait_seconds
+        # Items left over previously arrived earlier, so take them first
+        for p in list(self._left):
+            if len(batch) < self.max_size and p.key == first.key:
+                batch.append(p)
+                self._left.remove(p)
+        while len(batch) < self.max_size:
+            try:
+                p = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if p.key == first.key:
+                batch.append(p)
+            else:
+                self._left.append(p)
+        return batch
@@ -0,0 +1,177 @@
+"""
+A persistent cache of LLM responses, keyed by the provider, the model, the sampling
+parameters, and the full chat history. Responses are saved in an SQLite file under the
+cache directory, with least-recently-used entries evicted once exceeding a size limit.
+
+Usage: python -m cora.llms.cache [--clear]  # Print (or clear) the cache's statistics
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional, Dict, Literal
+
+from cora.config import CoraConfig
+
+CacheMode = Literal["read-write", "read-only", "off"]
+CACHE_MODE_READ_WRITE = "read-write"
+CACHE_MODE_READ_ONLY = "read-only"
+CACHE_MODE_OFF = "off"
+CACHE_MODES = [CACHE_MODE_READ_WRITE, CACHE_MODE_READ_ONLY, CACHE_MODE_OFF]
+
+_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    num_hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class ResponseCache:
+    def __init__(self, db_file: Path, *, max_bytes: int, ttl_seconds: float):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_writes = 0
+        self.num_evictions = 0
+        self._lock = threading.Lock()
+        # Processes (e.g., parallel runs) may share the same file; let them wait for each other
+        self._conn = sqlite3.connect(
+            str(db_file), timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def key_of(**kwargs) -> str:
+        return hashlib.blake2b(
+            json.dumps(kwargs, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+            digest_size=32,
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.num_misses += 1
+                self._incr_stat("misses")
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed = ?, num_hits = num_hits + 1 WHERE key = ?",
+                (now, key),
+            )
+            self.num_hits += 1
+            self._incr_stat("hits")
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now, size = time.time(), len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self.num_writes += 1
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM stats")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            num_entries, num_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            stats = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        return {
+            "entries": num_entries,
+            "bytes": num_bytes,
+            "total_hits": stats.get("hits", 0),
+            "total_misses": stats.get("misses", 0),
+            "hits": self.num_hits,
+            "misses": self.num_misses,
+            "writes": self.num_writes,
+            "evictions": self.num_evictions,
+        }
+
+    def _incr_stat(self, name: str):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _evict(self):
+        # Evict expired entries first, then least recently used ones until fitting the size
+        self._conn.execute(
+            "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,)
+        )
+        num_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        while num_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if num_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                num_bytes -= size
+                self.num_evictions += 1
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(
+                CoraConfig.llm_cache_file(),
+                max_bytes=CoraConfig.LLM_CACHE_MAX_BYTES,
+                ttl_seconds=CoraConfig.LLM_CACHE_TTL_SECONDS,
+            )
+        return _CACHE
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--clear", action="store_true", help="Clear all cached responses"
+    )
+    args = parser.parse_args()
+    cache = get_response_cache()
+    if args.clear:
+        cache.clear()
+    for name, value in cache.stats().items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,162 @@
-from cora.llms.base import LLMBase
+"""
+Calls to models deployed by EasyDeploy at EASYDEPLOY_ENDPOINT, which takes an OpenAI-style chat
+request (model, messages, and sampling options) and responds with an OpenAI-style completion.
+Endpoints accepting a JSON array of requests (responding with an array of completions in the
+same order) are sent concurrent calls in batches if EASYDEPLOY_MAX_BATCH_SIZE > 1, except
+calls constraining responses by schemas. Requests of a failed batch are retried one by one.
 
+Requests share a pooled HTTP client, so connections are kept alive and reused across calls.
+"""
 
-def call_easydeploy(model, messages, *, temperature, top_p, max_tokens) -> str:
-    raise NotImplementedError("EasyDeploy")
+import asyncio
+import threading
+from typing import List, Optional, Union
+
+import httpx
+
+from cora.config import CoraConfig
+from cora.llms import usage
+from cora.llms.base import LLMBase, ChatMessage
+from cora.llms.batching import MicroBatcher
+from cora.utils.aio import LoopLocal
+
+
+def _new_client_args() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=CoraConfig.EASYDEPLOY_MAX_CONNECTIONS,
+            max_keepalive_connections=CoraConfig.EASYDEPLOY_MAX_CONNECTIONS,
+            keepalive_expiry=CoraConfig.EASYDEPLOY_KEEPALIVE_SECONDS,
+        ),
+        "timeout": httpx.Timeout(
+            CoraConfig.EASYDEPLOY_TIMEOUT_SECONDS,
+            connect=CoraConfig.EASYDEPLOY_CONNECT_TIMEOUT_SECONDS,
+        ),
+    }
+
+
+_client: Optional[httpx.Client] = None
+_async_client = LoopLocal(lambda: httpx.AsyncClient(**_new_client_args()))
+_batcher: Optional[MicroBatcher] = None
+_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(**_new_client_args())
+        return _client
+
+
+def reset_client():
+    """Close the pooled connections, e.g., once EASYDEPLOY_ENDPOINT is changed."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _get_batcher() -> MicroBatcher:
+    global _batcher
+    with _lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                _post_batch,
+                max_size=CoraConfig.EASYDEPLOY_MAX_BATCH_SIZE,
+                wait_seconds=CoraConfig.EASYDEPLOY_BATCH_WAIT_SECONDS,
+                max_in_flight=CoraConfig.EASYDEPLOY_MAX_CONNECTIONS,
+                name="easydeploy-batcher",
+            )
+        return _batcher
+
+
+def _post(request: Union[dict, List[dict]]) -> httpx.Response:
+    resp = _get_client().post(CoraConfig.easydeploy_endpoint_url(), json=request)
+    resp.raise_for_status()
+    return resp
+
+
+def _post_or_error(request: dict) -> Union[dict, httpx.HTTPError]:
+    try:
+        return _post(request).json()
+    except httpx.HTTPError as e:
+        return e
+
+
+def _post_batch(requests: List[dict]) -> List[Union[dict, httpx.HTTPError]]:
+    try:
+        resp = _post(requests)
+    except httpx.HTTPStatusError:
+        # A bad request (or an endpoint rejecting arrays) fails the whole batch, so retry
+        # them one by one, failing only callers of the requests that fail again
+        return [_post_or_error(r) for r in requests]
+    completions = resp.json()
+    if not isinstance(completions, list) or len(completions) != len(requests):
+        raise ValueError(
+            f"Expected {len(requests)} completions in the batch, got: {completions}"
+        )
+    return completions
+
+
+def _make_request(
+    model, messages, temperature, top_p, max_tokens, response_schema
+) -> dict:
+    request = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        "max_tokens": max_tokens,
+    }
+    if response_schema:
+        request["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "response", "schema": response_schema},
+        }
+    return request
+
+
+def _parse_completion(completion: Union[dict, httpx.HTTPError]) -> str:
+    if isinstance(completion, httpx.HTTPError):
+        raise completion
+    if u := completion.get("usage"):
+        usage.record_tokens(u.get("prompt_tokens"), u.get("completion_tokens"))
+    return completion["choices"][0]["message"]["content"]
+
+
+def _batching(request: dict) -> bool:
+    # Endpoints batching requests may not constrain each by its own schema
+    return CoraConfig.EASYDEPLOY_MAX_BATCH_SIZE > 1 and "response_format" not in request
+
+
+def call_easydeploy(
+    model, messages, *, temperature, top_p, max_tokens, response_schema=None
+) -> str:
+    request = _make_request(
+        model, messages, temperature, top_p, max_tokens, response_schema
+    )
+    if _batching(request):
+        # Requests of different models can share a batch, as they're sent to the same endpoint
+        return _parse_completion(_get_batcher().submit(request))
+    return _parse_completion(_post(request).json())
+
+
+async def acall_easydeploy(
+    model, messages, *, temperature, top_p, max_tokens, response_schema=None
+) -> str:
+    request = _make_request(
+        model, messages, temperature, top_p, max_tokens, response_schema
+    )
+    if _batching(request):
+        completion = await asyncio.to_thread(_get_batcher().submit, request)
+        return _parse_completion(completion)
+    resp = await _async_client.get().post(
+        CoraConfig.easydeploy_endpoint_url(), json=request
+    )
+    resp.raise_for_status()
+    return _parse_completion(resp.json())
 
 
 class EasyDeploy(LLMBase):
@@ -10,11 +164,26 @@ class EasyDeploy(LLMBase):
         super().__init__(*args, **kwargs)
         self.model = model
 
-    def do_query(self) -> str:
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
         return call_easydeploy(
             self.model,
-            [m.to_json() for m in self.history],
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    async def do_acomplete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        return await acall_easydeploy(
+            self.model,
+            [m.to_json() for m in messages],
             temperature=self.temperature,
             top_p=self.top_p,
             max_tokens=self.max_tokens,
+            response_schema=response_schema,
         )
@@ -1,23 +1,28 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from typing import Literal
 
 from cora.llms.anthropic_ import Anthropic
 from cora.llms.base import LLMBase
+from cora.llms.cache import CacheMode, CACHE_MODE_OFF, get_response_cache
 from cora.llms.easydeploy_ import EasyDeploy
 from cora.llms.huggingface_ import HuggingFace
 from cora.llms.ollama_ import Ollama
 from cora.llms.openai_ import OpenAI
+from cora.llms.replay_ import Replay
 
 
 @dataclass
 class LLMConfig:
-    provider: Literal["openai", "ollama", "huggingface"]
+    provider: Literal[
+        "openai", "anthropic", "ollama", "huggingface", "easydeploy", "replay"
+    ]
     llm_name: str
     debug_mode: bool = field(default=False)
     temperature: float = field(default=0)
     top_k: int = field(default=50)
     top_p: float = field(default=0.95)
     max_tokens: int = field(default=1024)
+    cache_mode: CacheMode = field(default=CACHE_MODE_OFF)
 
     @property
     def max_completion_tokens(self) -> int:
@@ -27,6 +32,22 @@ class LLMConfig:
 class LLMFactory:
     @classmethod
     def create(cls, config: LLMConfig) -> LLMBase:
+        if config.cache_mode != CACHE_MODE_OFF:
+            # Open the cache now, or each query would fail (and be retried) on its own
+            get_response_cache()
+        if config.provider == "replay":
+            # The name is of the live model, "provider:model", which is called in recording
+            provider, llm_name = config.llm_name.split(":", maxsplit=1)
+            live = cls.create(replace(config, provider=provider, llm_name=llm_name))
+            return Replay(
+                live,
+                debug_mode=config.debug_mode,
+                temperature=config.temperature,
+                top_k=config.top_k,
+                top_p=config.top_p,
+                max_tokens=config.max_tokens,
+                cache_mode=config.cache_mode,
+            )
         return {
             "ollama": Ollama,
             "openai": OpenAI,
@@ -40,6 +61,7 @@ class LLMFactory:
             top_k=config.top_k,
             top_p=config.top_p,
             max_tokens=config.max_tokens,
+            cache_mode=config.cache_mode,
         )
 
 
@@ -47,5 +69,6 @@ if __name__ == "__main__":
     llm = LLMFactory.create(
         LLMConfig(provider="ollama", llm_name="qwen2:0.5b-instruct", debug_mode=True)
     )
-    llm.append_user_message("Hi, I'm Simon!")
-    llm.query()
+    conv = llm.new_conversation()
+    conv.append_user_message("Hi, I'm Simon!")
+    llm.query(conv)
@@ -1,12 +1,119 @@
-from cora.llms.base import LLMBase
+"""
+In-process generation by local HuggingFace models on CPU, fully offline. Each model is loaded
+once per process, and concurrent calls (e.g., from scorer threads) are gathered into dynamic
+micro-batches: a batch collects calls arriving within a short window, up to a maximum size.
 
-# TODO: make thread-safe
-_CACHED_MODELS = {}
+This requires transformers and torch, which are imported only when a model is loaded.
+"""
 
+import threading
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional
 
-def call_huggingface(model_id, messages, *, temperature, top_p, max_tokens):
-    # TODO: directly use pipeline
-    raise NotImplementedError("HuggingFace")
+from cora.config import CoraConfig
+from cora.llms import usage
+from cora.llms.base import LLMBase, ChatMessage
+from cora.llms.batching import MicroBatcher
+
+
+class _LocalModel:
+    def __init__(self, model_id: str):
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "transformers and torch are required by the HuggingFace backend"
+            ) from e
+        self._torch = torch
+        # A local model directory, or a model that was downloaded into the cache before
+        kwargs = {"local_files_only": True}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id, **kwargs)
+        self.tokenizer.padding_side = "left"  # Generate right after each prompt
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_id, **kwargs)
+        self.model.to("cpu").eval()
+        self._batcher = MicroBatcher(
+            self._generate_batch,
+            max_size=CoraConfig.HF_MAX_BATCH_SIZE,
+            wait_seconds=CoraConfig.HF_BATCH_WAIT_SECONDS,
+            name=f"hf-batcher-{Path(model_id).name}",
+        )
+
+    def generate(self, messages: List[dict], options: Tuple) -> Tuple[str, int, int]:
+        # Only calls with the same generation options can share a batch
+        return self._batcher.submit((messages, options), key=options)
+
+    def _generate_batch(self, batch: List[Tuple]) -> List[Tuple[str, int, int]]:
+        temperature, top_p, top_k, max_tokens = batch[0][1]
+        prompts = [self._make_prompt(messages) for messages, _ in batch]
+        inputs = self.tokenizer(
+            prompts, return_tensors="pt", padding=True, add_special_tokens=False
+        )
+        if temperature > 0:
+            sampling = {
+                "do_sample": True,
+                "temperature": temperature,
+                "top_p": top_p,
+                "top_k": top_k,
+            }
+        else:
+            sampling = {"do_sample": False}
+        with self._torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **sampling,
+            )
+        # Prompts are left-padded to the same length, after which are the generated tokens
+        num_prompt_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+        generated = outputs[:, inputs["input_ids"].shape[1] :]
+        results = []
+        for i, tokens in enumerate(generated):
+            num_completion_tokens = int(
+                (tokens != self.tokenizer.pad_token_id).sum().item()
+            )
+            results.append(
+                (
+                    self.tokenizer.decode(tokens, skip_special_tokens=True),
+                    num_prompt_tokens[i],
+                    num_completion_tokens,
+                )
+            )
+        return results
+
+    def _make_prompt(self, messages: List[dict]) -> str:
+        if self.tokenizer.chat_template:
+            return self.tokenizer.apply_chat_template(
+                messages, tokenize=False, add_generation_prompt=True
+            )
+        # Base models have no chat template; let them continue the plain conversation
+        return (
+            "".join(f"{m['role']}: {m['content']}\n" for m in messages) + "assistant: "
+        )
+
+
+_loaded_models: Dict[str, _LocalModel] = {}
+_loaded_models_lock = threading.Lock()
+
+
+def _get_model(model_id: str) -> _LocalModel:
+    with _loaded_models_lock:
+        if model_id not in _loaded_models:
+            # Loading fails without caching anything, so the next call retries
+            _loaded_models[model_id] = _LocalModel(model_id)
+        return _loaded_models[model_id]
+
+
+def call_huggingface(model_id, messages, *, temperature, top_p, top_k, max_tokens):
+    text, prompt_tokens, completion_tokens = _get_model(model_id).generate(
+        messages, (temperature, top_p, top_k, max_tokens)
+    )
+    # Batches are generated in a thread of the model; record the usage in the caller's context
+    usage.record_tokens(prompt_tokens, completion_tokens)
+    return text
 
 
 class HuggingFace(LLMBase):
@@ -14,11 +121,15 @@ class HuggingFace(LLMBase):
         super().__init__(*args, **kwargs)
         self.model = model
 
-    def do_query(self) -> str:
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        # Generation isn't constrained, which needs more than transformers itself
         return call_huggingface(
             self.model,
-            [m.to_json() for m in self.history],
+            [m.to_json() for m in messages],
             temperature=self.temperature,
             top_p=self.top_p,
+            top_k=self.top_k,
             max_tokens=self.max_tokens,
         )
@@ -0,0 +1,223 @@
+"""
+Rate limiting of LLM calls, shared by all LLMs of the same provider and model:
+- Token buckets bound the requests and the tokens sent per minute;
+- Rate-limited (429), overloaded and failed (5xx) calls are retried with jittered
+  exponential backoff, respecting the Retry-After header if any;
+- The number of concurrent calls adapts in an AIMD manner: it grows by one per window of
+  successful calls (after a slow start) and halves upon being rate limited, such that the number of threads
+  (e.g., --num-procs) is merely an upper bound of it.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from cora.config import CoraConfig
+from cora.llms import usage
+from cora.utils.misc import CannotReachHereError
+
+T = TypeVar("T")
+
+_INITIAL_CONCURRENCY = 4
+
+# Interval to check again when waiting for a free concurrency slot
+_SLOT_POLLING_SECONDS = 0.05
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60  # Refilled per second
+        self.level = per_minute
+        self.last_refill = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Return the seconds to wait until the bucket is no longer in debt."""
+        now = time.monotonic()
+        self.level = min(
+            self.capacity, self.level + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+        return 0 if self.level >= 0 else -self.level / self.rate
+
+    def take(self, amount: float):
+        # Taking more than left puts the bucket in debt, which delays later takes;
+        # requests larger than the capacity are thus allowed once the bucket is full
+        self.level -= min(amount, self.capacity)
+
+
+def status_of(e: Exception) -> Optional[int]:
+    """Return the HTTP status of the call failing with e, if any."""
+    # httpx's errors carry the status in the response rather than themselves
+    response = getattr(e, "response", None)
+    status = getattr(e, "status_code", None) or getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(e: Exception) -> Optional[Tuple[bool, float]]:
+    """
+    Return whether the call failing with e is rate limited and the seconds the server asks
+    to wait before retrying, or None if retrying is meaningless.
+    """
+    response = getattr(e, "response", None)
+    status = status_of(e)
+    name = type(e).__name__
+    rate_limited = status in (429, 529) or "RateLimit" in name
+    failed = (status is not None and status >= 500) or any(
+        n in name for n in ["Timeout", "Connect", "Overloaded"]
+    )
+    if not rate_limited and not failed:
+        return None
+    retry_after = 0.0
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        pass
+    return rate_limited or status == 503, retry_after
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        *,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 0,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # AIMD: the allowed concurrency, starting small and doubling per window (slow start)
+        # until being rate limited for the first time, as a burst costs a storm of errors
+        self.concurrency = float(
+            min(max_concurrency, _INITIAL_CONCURRENCY)
+            if max_concurrency
+            else _INITIAL_CONCURRENCY
+        )
+        self.slow_start = True
+        self.num_in_flight = 0
+        self.last_decrease = 0.0
+        self.num_calls = 0
+        self.num_retries = 0
+        self.num_rate_limited = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[], T], num_tokens: int = 0) -> T:
+        for attempt in range(self.max_retries + 1):
+            while (wait := self._try_acquire(num_tokens)) > 0:
+                time.sleep(wait)
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_failure(e, started, attempt)
+                usage.record_retry()
+                time.sleep(delay)
+                continue
+            self._on_success()
+            return result
+        raise CannotReachHereError("Either returned or raised")
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], num_tokens: int = 0) -> T:
+        for attempt in range(self.max_retries + 1):
+            while (wait := self._try_acquire(num_tokens)) > 0:
+                await asyncio.sleep(wait)
+            started = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_failure(e, started, attempt)
+                usage.record_retry()
+                await asyncio.sleep(delay)
+                continue
+            self._on_success()
+            return result
+        raise CannotReachHereError("Either returned or raised")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.num_calls,
+                "retries": self.num_retries,
+                "rate_limited": self.num_rate_limited,
+                "concurrency": self.concurrency,
+                "in_flight": self.num_in_flight,
+            }
+
+    def _try_acquire(self, num_tokens: int) -> float:
+        with self._lock:
+            if self.num_in_flight >= self.concurrency // 1:
+                return _SLOT_POLLING_SECONDS
+            for bucket in [self.requests, self.tokens]:
+                if bucket and (wait := bucket.wait_time()) > 0:
+                    return wait
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(num_tokens)
+            self.num_in_flight += 1
+            self.num_calls += 1
+            return 0
+
+    def _on_success(self):
+        with self._lock:
+            # Grow only if being limited by the concurrency rather than the callers
+            limited = self.num_in_flight >= self.concurrency // 1
+            self.num_in_flight -= 1
+            if limited:
+                # Additive increase: +1 after a window (the concurrency) of successful calls
+                self.concurrency += 1 if self.slow_start else 1 / self.concurrency
+                if self.max_concurrency:
+                    self.concurrency = min(self.concurrency, self.max_concurrency)
+
+    def _on_failure(self, e: Exception, started: float, attempt: int) -> float:
+        """Return the seconds to wait before retrying, or raise e if it's not to retry."""
+        with self._lock:
+            num_in_flight, self.num_in_flight = (
+                self.num_in_flight,
+                self.num_in_flight - 1,
+            )
+            error = classify_error(e)
+            if error is None or attempt >= self.max_retries:
+                raise e
+            rate_limited, retry_after = error
+            self.num_retries += 1
+            if rate_limited:
+                self.num_rate_limited += 1
+                self.slow_start = False
+                # Multiplicative decrease, but only once for calls sent at the same time
+                if started >= self.last_decrease:
+                    self.concurrency = max(
+                        1.0, min(self.concurrency, num_in_flight) / 2
+                    )
+                    self.last_decrease = time.monotonic()
+        # Full jitter, yet never earlier than the server asks
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return max(delay, retry_after)
+
+
+_LIMITERS: Dict[Tuple[str, str], RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    with _LIMITERS_LOCK:
+        if (provider, model) not in _LIMITERS:
+            _LIMITERS[(provider, model)] = RateLimiter(
+                requests_per_minute=CoraConfig.llm_max_requests_per_minute(),
+                tokens_per_minute=CoraConfig.llm_max_tokens_per_minute(),
+                max_concurrency=CoraConfig.LLM_MAX_CONCURRENCY,
+                max_retries=CoraConfig.LLM_MAX_RETRIES,
+            )
+        return _LIMITERS[(provider, model)]
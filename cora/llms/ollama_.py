@@ -1,33 +1,223 @@
+import threading
+from typing import Any, Awaitable, Callable, List, Optional, Set, TypeVar
+
 import ollama
 
-from cora.llms.base import LLMBase
+from cora.config import CoraConfig
+from cora.llms import usage
+from cora.llms.base import LLMBase, ChatMessage
+from cora.utils.aio import LoopLocal
+
+T = TypeVar("T")
+
+_async_client = LoopLocal(ollama.AsyncClient)
+
+# Models whose server (Ollama before 0.5) rejected schemas as formats; they get JSON mode
+_JSON_MODE_MODELS: Set[str] = set()
+_JSON_MODE_MODELS_LOCK = threading.Lock()
+
+
+def _format(model_name, response_schema):
+    if not response_schema:
+        return ""
+    with _JSON_MODE_MODELS_LOCK:
+        if not CoraConfig.OLLAMA_FORMAT_BY_SCHEMA or model_name in _JSON_MODE_MODELS:
+            return "json"
+    return response_schema
+
+
+def _rejects_format(e: Exception, format_) -> bool:
+    # Older Ollama fails to decode a schema into the format, which it expects to be a string
+    return (
+        isinstance(format_, dict)
+        and isinstance(e, ollama.ResponseError)
+        and e.status_code == 400
+        and "format" in str(e.error)
+    )
+
+
+def _fall_back_to_json_mode(model_name):
+    with _JSON_MODE_MODELS_LOCK:
+        _JSON_MODE_MODELS.add(model_name)
+
 
+def _chat_by_format(model_name, response_schema, chat: Callable[[Any], T]) -> T:
+    format_ = _format(model_name, response_schema)
+    try:
+        return chat(format_)
+    except ollama.ResponseError as e:
+        if not _rejects_format(e, format_):
+            raise
+    _fall_back_to_json_mode(model_name)
+    return chat("json")
 
-def call_ollama(model_name, messages, *, temperature, top_p, max_tokens):
-    resp = ollama.chat(
+
+async def _achat_by_format(
+    model_name, response_schema, chat: Callable[[Any], Awaitable[T]]
+) -> T:
+    format_ = _format(model_name, response_schema)
+    try:
+        return await chat(format_)
+    except ollama.ResponseError as e:
+        if not _rejects_format(e, format_):
+            raise
+    _fall_back_to_json_mode(model_name)
+    return await chat("json")
+
+
+def call_ollama(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    resp = _chat_by_format(
         model_name,
-        messages=messages,
-        options={"temperature": temperature, "top_p": top_p, "max_tokens": max_tokens},
+        response_schema,
+        lambda format_: ollama.chat(
+            model_name,
+            messages=messages,
+            options={
+                "temperature": temperature,
+                "top_p": top_p,
+                "max_tokens": max_tokens,
+            },
+            keep_alive=CoraConfig.OLLAMA_KEEP_ALIVE,
+            format=format_,
+        ),
     )
+    usage.record_tokens(resp.get("prompt_eval_count"), resp.get("eval_count"))
     return resp["message"]["content"]
 
 
+async def acall_ollama(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    resp = await _achat_by_format(
+        model_name,
+        response_schema,
+        lambda format_: _async_client.get().chat(
+            model_name,
+            messages=messages,
+            options={
+                "temperature": temperature,
+                "top_p": top_p,
+                "max_tokens": max_tokens,
+            },
+            keep_alive=CoraConfig.OLLAMA_KEEP_ALIVE,
+            format=format_,
+        ),
+    )
+    usage.record_tokens(resp.get("prompt_eval_count"), resp.get("eval_count"))
+    return resp["message"]["content"]
+
+
+def stream_ollama(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    def chat(format_):
+        parts = ollama.chat(
+            model_name,
+            messages=messages,
+            options={
+                "temperature": temperature,
+                "top_p": top_p,
+                "max_tokens": max_tokens,
+            },
+            keep_alive=CoraConfig.OLLAMA_KEEP_ALIVE,
+            format=format_,
+            stream=True,
+        )
+        # Streams are requested lazily; request it now to see if the format is rejected
+        return parts, next(parts, None)
+
+    parts, part = _chat_by_format(model_name, response_schema, chat)
+    while part is not None:
+        if part.get("done"):
+            usage.record_tokens(part.get("prompt_eval_count"), part.get("eval_count"))
+        yield part["message"]["content"]
+        part = next(parts, None)
+
+
+async def astream_ollama(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    async def chat(format_):
+        parts = await _async_client.get().chat(
+            model_name,
+            messages=messages,
+            options={
+                "temperature": temperature,
+                "top_p": top_p,
+                "max_tokens": max_tokens,
+            },
+            keep_alive=CoraConfig.OLLAMA_KEEP_ALIVE,
+            format=format_,
+            stream=True,
+        )
+        return parts, await anext(parts, None)
+
+    parts, part = await _achat_by_format(model_name, response_schema, chat)
+    while part is not None:
+        if part.get("done"):
+            usage.record_tokens(part.get("prompt_eval_count"), part.get("eval_count"))
+        yield part["message"]["content"]
+        part = await anext(parts, None)
+
+
 class Ollama(LLMBase):
     def __init__(self, model, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.model = model
 
-    def do_query(self) -> str:
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
         return call_ollama(
             self.model,
-            [m.to_json() for m in self.history],
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    async def do_acomplete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        return await acall_ollama(
+            self.model,
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    def do_stream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ):
+        return stream_ollama(
+            self.model,
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    def do_astream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ):
+        return astream_ollama(
+            self.model,
+            [m.to_json() for m in messages],
             temperature=self.temperature,
             top_p=self.top_p,
             max_tokens=self.max_tokens,
+            response_schema=response_schema,
         )
 
 
 if __name__ == "__main__":
     model_ = Ollama("qwen2:0.5b-instruct", temperature=0.8, debug_mode=True)
-    model_.append_user_message("Hi, I'm Tony! What's your name?")
-    model_.query()
+    conv_ = model_.new_conversation()
+    conv_.append_user_message("Hi, I'm Tony! What's your name?")
+    model_.query(conv_)
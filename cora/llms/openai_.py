@@ -1,31 +1,155 @@
+from typing import List, Optional
+
 import openai
 
-from cora.llms.base import LLMBase
+from cora.llms import usage
+from cora.llms.base import LLMBase, ChatMessage
+from cora.utils.aio import LoopLocal
+
+# Retries are left to our rate limiter
+_client = openai.OpenAI(max_retries=0)
+_async_client = LoopLocal(lambda: openai.AsyncOpenAI(max_retries=0))
+
+
+def _record_usage(resp):
+    if not resp.usage:
+        return
+    # Prompts sharing a long prefix with recent ones are cached automatically
+    details = getattr(resp.usage, "prompt_tokens_details", None)
+    usage.record_tokens(
+        resp.usage.prompt_tokens,
+        resp.usage.completion_tokens,
+        getattr(details, "cached_tokens", 0),
+    )
+
 
-_client = openai.OpenAI()
+def _response_format(response_schema):
+    if not response_schema:
+        return openai.NOT_GIVEN
+    # Not strict, as strict schemas forbid optional fields and more
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "response", "schema": response_schema},
+    }
 
 
-def call_openai(model_name, messages, *, temperature, top_p, max_tokens):
+def call_openai(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
     resp = _client.chat.completions.create(
         model=model_name,
         messages=messages,
         temperature=temperature,
         top_p=top_p,
         max_completion_tokens=max_tokens,
+        response_format=_response_format(response_schema),
+    )
+    _record_usage(resp)
+    return resp.choices[0].message.content
+
+
+async def acall_openai(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    resp = await _async_client.get().chat.completions.create(
+        model=model_name,
+        messages=messages,
+        temperature=temperature,
+        top_p=top_p,
+        max_completion_tokens=max_tokens,
+        response_format=_response_format(response_schema),
     )
+    _record_usage(resp)
     return resp.choices[0].message.content
 
 
+def stream_openai(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    with _client.chat.completions.create(
+        model=model_name,
+        messages=messages,
+        temperature=temperature,
+        top_p=top_p,
+        max_completion_tokens=max_tokens,
+        response_format=_response_format(response_schema),
+        stream=True,
+        stream_options={"include_usage": True},
+    ) as stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            _record_usage(chunk)  # Only the last chunk carries the usage (lost if cut)
+
+
+async def astream_openai(
+    model_name, messages, *, temperature, top_p, max_tokens, response_schema=None
+):
+    async with await _async_client.get().chat.completions.create(
+        model=model_name,
+        messages=messages,
+        temperature=temperature,
+        top_p=top_p,
+        max_completion_tokens=max_tokens,
+        response_format=_response_format(response_schema),
+        stream=True,
+        stream_options={"include_usage": True},
+    ) as stream:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            _record_usage(chunk)
+
+
 class OpenAI(LLMBase):
     def __init__(self, model, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.model = model
 
-    def do_query(self) -> str:
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
         return call_openai(
             self.model,
-            [m.to_json() for m in self.history],
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    async def do_acomplete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        return await acall_openai(
+            self.model,
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    def do_stream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ):
+        return stream_openai(
+            self.model,
+            [m.to_json() for m in messages],
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            response_schema=response_schema,
+        )
+
+    def do_astream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ):
+        return astream_openai(
+            self.model,
+            [m.to_json() for m in messages],
             temperature=self.temperature,
             top_p=self.top_p,
             max_tokens=self.max_tokens,
+            response_schema=response_schema,
         )
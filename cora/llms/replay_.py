@@ -0,0 +1,194 @@
+"""
+Record and replay of LLM calls for deterministic, offline benchmarking and profiling. A live
+run (LLM_REPLAY_MODE=record) records each request (by its hash) and response of the model
+into the transcript (LLM_REPLAY_TRANSCRIPT, one JSON object per line). Later runs (replay
+mode) respond from the transcript without any model, after a synthetic latency.
+
+Use it as the model "replay:<provider>:<model>", e.g., "replay:openai:gpt-4o".
+"""
+
+import asyncio
+import atexit
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import AsyncGenerator, Dict, Generator, List, Optional
+
+from cora.base.console import get_boxed_console
+from cora.config import CoraConfig
+from cora.llms import usage
+from cora.llms.base import LLMBase, ChatMessage, UnrecoverableQueryError
+from cora.llms.stream import JSONStop
+
+REPLAY_MODE_RECORD = "record"
+REPLAY_MODE_REPLAY = "replay"
+
+
+class ReplayMissError(UnrecoverableQueryError):
+    def __init__(self, key: str):
+        super().__init__(f"No response to the request ({key}) in the transcript")
+
+
+class _Transcript:
+    def __init__(self):
+        self.file = CoraConfig.llm_replay_transcript()
+        self.entries: Dict[str, List[dict]] = defaultdict(list)
+        self.num_replayed: Dict[str, int] = defaultdict(int)
+        self.num_hits = 0
+        self.missed_keys: List[str] = []
+        self._lock = threading.Lock()
+        if self.file.exists():
+            with self.file.open("r", encoding="utf-8") as fin:
+                for line in fin:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]].append(entry)
+        atexit.register(self.report)
+
+    def record(self, entry: dict):
+        with self._lock:
+            self.entries[entry["key"]].append(entry)
+            with self.file.open("a", encoding="utf-8") as fou:
+                fou.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def replay(self, key: str) -> Optional[dict]:
+        # Identical requests (e.g., sampled) are replayed in the order they were recorded
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.missed_keys.append(key)
+                return None
+            self.num_hits += 1
+            i = self.num_replayed[key]
+            self.num_replayed[key] += 1
+            return entries[min(i, len(entries) - 1)]
+
+    def report(self):
+        if self.missed_keys:
+            get_boxed_console(box_title="Replay", debug_mode=True).printb(
+                f"{len(self.missed_keys)} of {len(self.missed_keys) + self.num_hits} "
+                f"requests missed the transcript {self.file}"
+            )
+
+
+_transcript: Optional[_Transcript] = None
+_transcript_lock = threading.Lock()
+
+
+def get_transcript() -> _Transcript:
+    global _transcript
+    with _transcript_lock:
+        if _transcript is None:
+            _transcript = _Transcript()
+        return _transcript
+
+
+class Replay(LLMBase):
+    """Wrap the live model, whose requests are hashed the same way as its response cache."""
+
+    def __init__(self, live: LLMBase, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.live = live
+        self.model = getattr(live, "model", None)
+        self.mode = CoraConfig.llm_replay_mode()
+
+    def complete(
+        self,
+        messages: List[ChatMessage],
+        *,
+        json_stop: Optional[JSONStop] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        key = self.live._cache_key(messages, json_stop, response_schema)
+        if self.mode == REPLAY_MODE_RECORD:
+            with usage.metering() as meter:
+                start = time.perf_counter()
+                r = self.live.complete(
+                    messages, json_stop=json_stop, response_schema=response_schema
+                )
+            self._record(key, r, time.perf_counter() - start, meter)
+            return r
+        with usage.metering_call():
+            entry = self._replay(key)
+            time.sleep(self._synthetic_latency())
+            return entry["response"]
+
+    async def acomplete(
+        self,
+        messages: List[ChatMessage],
+        *,
+        json_stop: Optional[JSONStop] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
+        key = self.live._cache_key(messages, json_stop, response_schema)
+        if self.mode == REPLAY_MODE_RECORD:
+            with usage.metering() as meter:
+                start = time.perf_counter()
+                r = await self.live.acomplete(
+                    messages, json_stop=json_stop, response_schema=response_schema
+                )
+            self._record(key, r, time.perf_counter() - start, meter)
+            return r
+        with usage.metering_call():
+            entry = self._replay(key)
+            await asyncio.sleep(self._synthetic_latency())
+            return entry["response"]
+
+    # Replay responds by complete() and acomplete(); direct calls go to the live model
+
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        return self.live.do_complete(messages, response_schema=response_schema)
+
+    async def do_acomplete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        return await self.live.do_acomplete(messages, response_schema=response_schema)
+
+    def do_stream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> Generator[str, None, None]:
+        return self.live.do_stream(messages, response_schema=response_schema)
+
+    def do_astream(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> AsyncGenerator[str, None]:
+        return self.live.do_astream(messages, response_schema=response_schema)
+
+    def _record(self, key: str, response: str, seconds: float, meter: usage.UsageMeter):
+        get_transcript().record(
+            {
+                "key": key,
+                "model": self.model,
+                "response": response,
+                "seconds": round(seconds, 3),
+                "prompt_tokens": meter.total.prompt_tokens,
+                "completion_tokens": meter.total.completion_tokens,
+            }
+        )
+
+    @staticmethod
+    def _replay(key: str) -> dict:
+        entry = get_transcript().replay(key)
+        if entry is None:
+            if CoraConfig.llm_replay_fail_on_miss():
+                raise ReplayMissError(key)
+            entry = {"response": "", "prompt_tokens": 0, "completion_tokens": 0}
+        usage.record_tokens(entry["prompt_tokens"], entry["completion_tokens"])
+        return entry
+
+    @staticmethod
+    def _synthetic_latency() -> float:
+        latency, jitter = CoraConfig.llm_replay_latency()
+        return max(0.0, latency + random.uniform(-jitter, jitter))
+
+    def enable_debug_mode(self):
+        super().enable_debug_mode()
+        self.live.enable_debug_mode()
+
+    def disable_debug_mode(self):
+        super().disable_debug_mode()
+        self.live.disable_debug_mode()
@@ -0,0 +1,121 @@
+"""
+Early termination of streamed responses: agents respond with a JSON object, so there's no
+need to wait for anything the model says after the object closes, or (if asked so) after
+the fields of the decision (e.g., a score) are given, skipping the lengthy explanation.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+_IDENTIFIER_CHARS = set(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$"
+)
+
+
+@dataclass
+class JSONStop:
+    # Stop once all these top-level fields are given, rather than the whole object closes
+    decision_fields: Optional[List[str]] = field(default=None)
+
+    def scanner(self) -> "JSONStreamScanner":
+        return JSONStreamScanner(self.decision_fields)
+
+
+class JSONStreamScanner:
+    """
+    Scan a streamed response for its first top-level JSON (JSON5, precisely, as
+    AgentBase.parse_json_response() does) object. Feed chunks of the response until
+    feed() returns True, then take the text to parse.
+    """
+
+    def __init__(self, decision_fields: Optional[List[str]] = None):
+        self.decision_fields = set(decision_fields or [])
+        self.chunks: List[str] = []
+        self.done = False
+        self.stopped_at_decision = False
+        self._end = -1  # Where the text ends once done
+        self._pos = 0  # Number of chars scanned
+        self._depth = 0
+        self._quote = None  # The opening quote if in a string
+        self._escaped = False
+        self._comment = None  # "//" or "/*" if in a comment
+        self._prev = ""
+        self._expect_key = False  # Whether a key of the top-level object is next
+        self._key: List[str] = []
+        self._in_key = False
+        self._keys_given = set()
+
+    @property
+    def text(self) -> str:
+        text = "".join(self.chunks)
+        if not self.done:
+            return text
+        if self.stopped_at_decision:
+            # Cut the remaining fields and close the object
+            return text[: self._end] + "}"
+        return text[: self._end]
+
+    def feed(self, chunk: str) -> bool:
+        if self.done:
+            return True
+        self.chunks.append(chunk)
+        for i, ch in enumerate(chunk):
+            if self._scan(ch):
+                self.done = True
+                self._end = self._pos + i + (0 if self.stopped_at_decision else 1)
+                break
+        self._pos += len(chunk)
+        return self.done
+
+    def _scan(self, ch: str) -> bool:
+        prev, self._prev = self._prev, ch
+        if self._comment == "//":
+            if ch == "\n":
+                self._comment = None
+            return False
+        if self._comment == "/*":
+            if prev == "*" and ch == "/":
+                self._comment, self._prev = None, ""
+            return False
+        if self._quote:
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == self._quote:
+                self._quote, self._in_key = None, False
+            elif self._in_key:
+                self._key.append(ch)
+            return False
+        if self._depth == 0:
+            # Skip anything preceding the object
+            if ch == "{":
+                self._depth, self._expect_key = 1, True
+            return False
+        if prev == "/" and ch in "/*":
+            self._comment = prev + ch
+            return False
+        if ch in "\"'":
+            self._quote = ch
+            if self._depth == 1 and self._expect_key and ch != "}":
+                self._in_key, self._key = True, []
+            return False
+        if self._depth == 1 and self._expect_key and ch != "}":
+            if ch in _IDENTIFIER_CHARS:
+                self._key.append(ch)  # Unquoted keys of JSON5
+            elif ch == ":":
+                self._expect_key = False
+            return False
+        if ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                return True
+        elif ch == "," and self._depth == 1:
+            self._keys_given.add("".join(self._key))
+            self._expect_key, self._key = True, []
+            if self.decision_fields and self.decision_fields <= self._keys_given:
+                self.stopped_at_decision = True
+                return True
+        return False
@@ -0,0 +1,144 @@
+"""
+Accounting of LLM calls: every call records its tokens, wall time and retries into all
+usage meters that are active (see metering()) in the calling context, along with the
+JSON-repair rounds of agents. Meters are nested, e.g., a stage's meter and the meter of
+the whole retrieval both see calls of the stage. Calls are accounted to the agent running
+in the calling context (see accounting_to()), so LLMs can be shared by agents.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class Usage:
+    calls: int = field(default=0)
+    cached_calls: int = field(default=0)
+    prompt_tokens: int = field(default=0)
+    cached_prompt_tokens: int = field(default=0)  # Read from providers' prompt caches
+    completion_tokens: int = field(default=0)
+    seconds: float = field(default=0.0)
+    retries: int = field(default=0)
+    repair_rounds: int = field(default=0)
+
+    def add(self, other: "Usage"):
+        self.calls += other.calls
+        self.cached_calls += other.cached_calls
+        self.prompt_tokens += other.prompt_tokens
+        self.cached_prompt_tokens += other.cached_prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.seconds += other.seconds
+        self.retries += other.retries
+        self.repair_rounds += other.repair_rounds
+
+    @property
+    def repair_rate(self) -> float:
+        # Rounds repairing malformed responses per call, which cost extra calls of their own
+        return self.repair_rounds / self.calls if self.calls else 0.0
+
+    def to_json(self) -> dict:
+        return {
+            **asdict(self),
+            "seconds": round(self.seconds, 3),
+            "repair_rate": round(self.repair_rate, 4),
+        }
+
+
+class UsageMeter:
+    def __init__(self):
+        self.total = Usage()
+        self.by_agent: Dict[str, Usage] = defaultdict(Usage)
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, agent: Optional[str], usage: Usage):
+        with self._lock:
+            self.total.add(usage)
+            self.by_agent[agent or "<unknown>"].add(usage)
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {
+                **self.total.to_json(),
+                "wall_seconds": round(self.wall_seconds, 3),
+                "by_agent": {a: u.to_json() for a, u in self.by_agent.items()},
+            }
+
+
+_active_meters: ContextVar[Tuple[UsageMeter, ...]] = ContextVar(
+    "active_meters", default=()
+)
+_current_call: ContextVar[Optional[Usage]] = ContextVar("current_call", default=None)
+_current_agent: ContextVar[Optional[str]] = ContextVar("current_agent", default=None)
+
+
+@contextmanager
+def metering():
+    """Meter LLM calls made within the context, including those of its child threads/tasks."""
+    meter, start = UsageMeter(), time.perf_counter()
+    token = _active_meters.set(_active_meters.get() + (meter,))
+    try:
+        yield meter
+    finally:
+        _active_meters.reset(token)
+        meter.wall_seconds = time.perf_counter() - start
+
+
+@contextmanager
+def metering_as_kwargs():
+    """Meter like metering(), yielding a dict that carries the usage once exiting the context."""
+    kwargs = {}
+    with metering() as meter:
+        yield kwargs
+    kwargs["usage"] = meter.to_json()
+
+
+@contextmanager
+def accounting_to(agent: Optional[str]):
+    """Account LLM calls made within the context to the agent."""
+    token = _current_agent.set(agent)
+    try:
+        yield
+    finally:
+        _current_agent.reset(token)
+
+
+@contextmanager
+def metering_call():
+    """Account a single LLM call; providers report tokens of the call via record_tokens()."""
+    agent, usage, start = _current_agent.get(), Usage(calls=1), time.perf_counter()
+    token = _current_call.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_call.reset(token)
+        usage.seconds = time.perf_counter() - start
+        _record(agent, usage)
+
+
+def record_tokens(
+    prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0
+):
+    if (usage := _current_call.get()) is not None:
+        usage.prompt_tokens += prompt_tokens or 0
+        usage.completion_tokens += completion_tokens or 0
+        usage.cached_prompt_tokens += cached_prompt_tokens or 0
+
+
+def record_retry():
+    if (usage := _current_call.get()) is not None:
+        usage.retries += 1
+
+
+def record_repair_round():
+    _record(_current_agent.get(), Usage(repair_rounds=1))
+
+
+def _record(agent: Optional[str], usage: Usage):
+    for meter in _active_meters.get():
+        meter.record(agent, usage)
@@ -5,6 +5,8 @@ from typing import Tuple, List
 
 from cora.base.console import BoxedConsoleConfigs
 from cora.base.repos import RepoTup
+from cora.config import CoraConfig
+from cora.llms.cache import CACHE_MODE_OFF, CACHE_MODES
 from cora.llms.factory import LLMConfig
 from cora.repo.repo import Repository
 
@@ -58,6 +60,17 @@ def parse_llms(args: any) -> LLMConfig:
             'Invalid argument for "--model". It should be in the format '
             'of "provider:model" such as "openai:gpt-4o", "ollama:qwen2:0.5b-instruct".'
         )
+    if args.llm_cache != CACHE_MODE_OFF and not CoraConfig.get("CACHE_DIRECTORY_PATH"):
+        raise ArgumentError(
+            f'The argument "--llm-cache {args.llm_cache}" requires the environment variable '
+            "CACHE_DIRECTORY_PATH to be set to the directory to cache the LM's responses."
+        )
+    if args.llm_stream_json:
+        CoraConfig.LLM_STREAM_JSON_RESPONSES = True
+    if args.llm_stop_at_decisions:
+        CoraConfig.LLM_STOP_AT_DECISIONS = True
+    if args.llm_constrain_json:
+        CoraConfig.LLM_CONSTRAIN_JSON_RESPONSES = True
     return LLMConfig(
         provider=p,
         llm_name=m,
@@ -66,6 +79,7 @@ def parse_llms(args: any) -> LLMConfig:
         top_k=args.model_top_k,
         top_p=args.model_top_p,
         max_tokens=args.model_max_tokens,
+        cache_mode=args.llm_cache,
     )
 
 
@@ -73,6 +87,10 @@ def parse_perf(args: any) -> Tuple[int, int]:
     return args.num_procs, args.num_threads
 
 
+def parse_precompute(args: any) -> bool:
+    return args.precompute_previews
+
+
 def parse_logging(args: any):
     if args.log_dir:
         log_dir = Path(args.log_dir)
@@ -133,7 +151,8 @@ def make_model_options(parser: ArgumentParser) -> List[Action]:
             required=True,
             type=str,
             help='The assistive LM in the format of "provider:model" such as '
-            '"openai:gpt-4o", "ollama:qwen2:0.5b-instruct"',
+            '"openai:gpt-4o", "ollama:qwen2:0.5b-instruct"; prefix it by "replay:" to record '
+            "or replay its responses (see LLM_REPLAY_* in env.template)",
         ),
         parser.add_argument(
             "--model-temperature",
@@ -163,6 +182,30 @@ def make_model_options(parser: ArgumentParser) -> List[Action]:
             type=int,
             help="Parameter max-tokens controlling the LM's maximum number of tokens to generate",
         ),
+        parser.add_argument(
+            "--llm-cache",
+            default=CACHE_MODE_OFF,
+            choices=CACHE_MODES,
+            help="Whether to reuse (read-only) or to reuse and save (read-write) the LM's responses "
+            "to deterministic queries, which are cached under CACHE_DIRECTORY_PATH (required then)",
+        ),
+        parser.add_argument(
+            "--llm-stream-json",
+            action="store_true",
+            help="Stream the LM's responses to agents and cut them once their JSON objects close",
+        ),
+        parser.add_argument(
+            "--llm-stop-at-decisions",
+            action="store_true",
+            help="Further cut the streamed responses right after the decisions (e.g., scores), "
+            "skipping their reasons",
+        ),
+        parser.add_argument(
+            "--llm-constrain-json",
+            action="store_true",
+            help="Constrain the LM's responses to agents' JSON schemas by the provider's "
+            "structured outputs (if supported)",
+        ),
     ]
 
 
@@ -182,6 +225,12 @@ def make_perf_options(parser: ArgumentParser) -> List[Action]:
             type=int,
             help="The maximum number of threads to use in parallel in the each process",
         ),
+        parser.add_argument(
+            "--precompute-previews",
+            action="store_true",
+            help="Precompute previews of all (included) files with --num-procs processes "
+            "before retrieval, such that previewing a file is merely a cache read",
+        ),
     ]
 
 
@@ -1,8 +1,10 @@
 from abc import abstractmethod
 from functools import cached_property
-from typing import Type, Dict, List
+from typing import Type, Dict, List, Optional
 
+from cora.preview.store import get_preview_store
 from cora.splits.ftypes import parse_ftype
+from cora.utils.misc import estimate_num_tokens
 
 
 class FilePreview:
@@ -31,15 +33,66 @@ class FilePreview:
         return register_inner
 
     @classmethod
-    def of(cls, file_name: str, file_content: str) -> str:
+    def of(
+        cls, file_name: str, file_content: str, token_budget: Optional[int] = None
+    ) -> str:
+        """Preview the file; the preview is shrunk to (roughly) fit token_budget if given"""
+        return get_preview_store().get_or_preview(
+            cls.previewer_of(file_name, file_content), token_budget=token_budget
+        )
+
+    @classmethod
+    def previewer_of(cls, file_name: str, file_content: str) -> "FilePreview":
         file_type = parse_ftype(file_name)
         return cls._PREVIEW_DICT.get(file_type, _FileContent)(
             file_type, file_name, file_content
-        ).get_preview()
+        )
 
     @abstractmethod
     def get_preview(self) -> str: ...
 
+    def get_preview_within(self, token_budget: int) -> str:
+        # Previewers able to collapse their preview progressively should override this
+        return self.truncate_preview(self.get_preview(), token_budget)
+
+    def truncate_preview(self, preview: str, token_budget: int) -> str:
+        """Keep the leading lines of the preview within the budget and hide the others"""
+        if estimate_num_tokens(preview) <= token_budget:
+            return preview
+        preview_lines = preview.split("\n")
+        # Leave some room for the message of hidden lines
+        kept_lines = []
+        num_tokens = estimate_num_tokens(self.hidden_lines_message(0, 0))
+        for line in preview_lines:
+            num_tokens += estimate_num_tokens(line + "\n")
+            if num_tokens > token_budget:
+                break
+            kept_lines.append(line)
+        start_number = None
+        for line in preview_lines[len(kept_lines) :]:
+            start_number, _ = self.parse_preview_line(line)
+            if start_number is not None:
+                break
+        if start_number is None:
+            start_number = len(kept_lines)
+        kept_lines.append(
+            self.hidden_lines_message(start_number, len(self.file_lines) - 1)
+        )
+        return "\n".join(kept_lines)
+
+    @staticmethod
+    def hidden_lines_message(start_number: int, end_number: int) -> str:
+        return f"...\n(lines {start_number}-{end_number} are hidden in preview)\n..."
+
+    def settings(self) -> Dict[str, any]:
+        # Settings that the preview depends on (besides the file content)
+        return {}
+
+    def cache_key(self) -> str:
+        # Previewers like CodePreview serve many file types, each parsed by its own grammar
+        settings = ",".join(f"{k}={v}" for k, v in sorted(self.settings().items()))
+        return f"{type(self).__name__}[{self.file_type}]({settings})"
+
     @classmethod
     def preview_line(cls, line_number, line_content):
         return str(line_number) + cls._PREVIEW_SPLITTER + line_content
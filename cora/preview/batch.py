@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from cora.base.repos import RepoBase
+from cora.config import CoraConfig
+from cora.preview.base import FilePreview
+from cora.preview.store import PreviewStore, get_preview_store
+from cora.utils.parallel import parallel
+from cora.utils.pattern import match_any_pattern
+from cora.utils.sanitize import sanitize_content
+
+# Files are sent to worker processes in batches to amortize the inter-process overhead
+_NUM_FILES_PER_BATCH = 64
+
+
+def precompute_previews(
+    repo: RepoBase, includes: Optional[List[str]] = None, num_procs: int = 1
+) -> int:
+    """
+    Precompute previews of all (included) files in the repository with a pool of processes,
+    and save them into the preview store such that looking up their previews are merely reads.
+    Previews exceeding FPS_PREVIEW_TOKEN_BUDGET are also saved shrunk to fit the budget.
+    Return the number of files that are successfully previewed.
+    """
+    files = [
+        entry.path
+        for entry in repo.file_listing
+        if entry.is_file and (not includes or match_any_pattern(entry.path, includes))
+    ]
+    store = get_preview_store()
+    # Workers cannot see our configurations, so let's pass them explicitly
+    batches = [
+        (
+            _preview_files,
+            (
+                repo.repo_path,
+                files[i : i + _NUM_FILES_PER_BATCH],
+                store.cache_dir,
+                CoraConfig.sanitize_content_in_repository(),
+                CoraConfig.FPS_PREVIEW_TOKEN_BUDGET or None,
+            ),
+        )
+        for i in range(0, len(files), _NUM_FILES_PER_BATCH)
+    ]
+    num_previewed = 0
+    for results in parallel(batches, n_jobs=max(num_procs, 1), backend="loky"):
+        for previews in results:
+            for key, preview in previews:
+                store.put(key, preview)
+            num_previewed += 1
+    return num_previewed
+
+
+def _preview_files(
+    repo_path: str,
+    files: List[str],
+    cache_dir: Optional[Path],
+    san_cont: bool,
+    token_budget: Optional[int],
+) -> List[List[Tuple[str, str]]]:
+    # Each batch has its own store writing to the same directory, but not holding in memory
+    store = PreviewStore(cache_dir=cache_dir, max_entries=0)
+    results = []
+    for file in files:
+        try:
+            # This must be consistent with RepoBase.get_file_content()
+            content = (Path(repo_path) / file).read_text(
+                encoding="utf-8", errors="replace"
+            )
+            if san_cont:
+                content = sanitize_content(content)
+            previewer = FilePreview.previewer_of(file, content)
+            results.append(store.get_or_preview_all(previewer, token_budget))
+        except Exception:
+            continue  # Those failed are to be previewed (and fail again) lazily
+    return results
@@ -1,9 +1,12 @@
 import re
+from functools import cached_property
+from typing import Optional, Set, Tuple, List
 
-import tree_sitter_languages
-from tree_sitter import Node, Parser
+from tree_sitter import Node
 
 from cora.preview.base import FilePreview
+from cora.splits.parsed import ParsedFile
+from cora.utils.misc import estimate_num_tokens
 
 
 def _extract_words(string):
@@ -62,20 +65,66 @@ class CodePreview(FilePreview):
         super().__init__(
             file_type=file_type, file_name=file_name, file_content=file_content
         )
-        parser = Parser()
-        parser.set_language(tree_sitter_languages.get_language(file_type))
-        self.file_tree = parser.parse(bytes(file_content, "utf8"))
         self.min_line = 5
         self.max_line = 50
         self.num_kept_lines = 2
         self.num_kept_terms = 5
 
+    @cached_property
+    def file_tree(self):
+        # Parse lazily, as the preview might have been cached
+        return ParsedFile.of(self.file_type, self.file_content).tree
+
+    def settings(self):
+        return {
+            "min_line": self.min_line,
+            "max_line": self.max_line,
+            "num_kept_lines": self.num_kept_lines,
+            "num_kept_terms": self.num_kept_terms,
+        }
+
     def get_preview(self):
+        return self._render()
+
+    def get_preview_within(self, token_budget: int) -> str:
+        expanded_nodes = []
+        preview = self._render(expanded_nodes=expanded_nodes)
+        if estimate_num_tokens(preview) <= token_budget:
+            return preview
+
+        # Collapse (rather than get into) expanded nodes, deeper nodes first and larger nodes
+        # first among nodes of the same depth; find the fewest nodes to collapse by bisection
+        expanded_nodes.sort(
+            key=lambda e: (-e[0], e[1].start_point[0] - e[1].end_point[0])
+        )
+        node_keys = [(n.start_byte, n.end_byte) for _, n in expanded_nodes]
+        lo, hi, previews = 1, len(node_keys), {}
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            previews[mid] = self._render(collapsed_nodes=set(node_keys[:mid]))
+            if estimate_num_tokens(previews[mid]) <= token_budget:
+                hi = mid - 1
+            else:
+                lo = mid + 1
+        if lo <= len(node_keys):
+            return previews.get(lo) or self._render(collapsed_nodes=set(node_keys[:lo]))
+
+        # Even collapsing all does not fit the budget; let's truncate it
+        return self.truncate_preview(
+            previews.get(len(node_keys)) or preview, token_budget
+        )
+
+    def _render(
+        self,
+        collapsed_nodes: Optional[Set[Tuple[int, int]]] = None,
+        expanded_nodes: Optional[List[Tuple[int, Node]]] = None,
+    ):
         file_lines = self.file_lines
+        collapsed_nodes = collapsed_nodes or set()
 
         last_line_number = -1
 
-        def traverse_node(node: Node):
+        def traverse_node(node: Node, depth: int = 0):
             nonlocal last_line_number
             preview_lines = []
             for child in node.children:
@@ -93,8 +142,13 @@ class CodePreview(FilePreview):
                     preview_lines.append(self.preview_line(line_number, line))
                     last_line_number = line_number
                 # The child node is too large; let's get into its children.
-                if end_number - start_number > self.max_line:
-                    preview_lines.extend(traverse_node(child))
+                if (
+                    end_number - start_number > self.max_line
+                    and (child.start_byte, child.end_byte) not in collapsed_nodes
+                ):
+                    if expanded_nodes is not None:
+                        expanded_nodes.append((depth, child))
+                    preview_lines.extend(traverse_node(child, depth + 1))
                 # The child node is small enough; let's present all its content.
                 elif end_number - start_number < self.min_line:
                     node_lines = file_lines[start_number : end_number + 1]
@@ -105,7 +159,7 @@ class CodePreview(FilePreview):
                         ]
                     )
                     preview_lines.append(text)
-                # The child line is within min_line--max_line; let's present its head/tail and hide its body
+                # The child line is within min_line--max_line (or is to be collapsed); let's present its head/tail and hide its body
                 else:
                     node_lines = file_lines[start_number : end_number + 1]
                     num_kept_lines = self.num_kept_lines
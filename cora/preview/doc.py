@@ -0,0 +1,79 @@
+from bisect import bisect_left
+from typing import List, Tuple
+
+from cora.preview.base import FilePreview
+
+
+class PreviewDoc:
+    """
+    A file preview as entries of line-numbered preview lines, where lines without line
+    numbers are markers of elided lines. The preview is parsed once and then rendered
+    with hidden line ranges as many times as needed.
+    """
+
+    def __init__(self, preview: str):
+        self.preview = preview
+        # Line-numbered entries sorted by their line numbers; the last wins upon duplicates
+        entries = {}
+        for line in preview.splitlines():
+            line_number, line_content = FilePreview.parse_preview_line(line)
+            if line_number is not None and line_number >= 0:
+                entries[line_number] = (line, line_content)
+        self.line_numbers: List[int] = sorted(entries.keys())
+        self.entries: List[Tuple[str, str]] = [entries[n] for n in self.line_numbers]
+
+    @classmethod
+    def of(cls, file_name: str, file_content: str) -> "PreviewDoc":
+        return cls(FilePreview.of(file_name, file_content))
+
+    def render(self, hidden_ranges: List[Tuple[int, int]]) -> str:
+        """
+        Render the preview with lines in hidden_ranges ([start, end) each) hidden. Once any
+        line is hidden, only line-numbered lines are kept and each run of absent lines (either
+        hidden or elided by the preview) is replaced by a message. Previews without any line
+        numbers are rendered in full.
+        """
+        if len(hidden_ranges) == 0:
+            return self.preview
+        # Lines cannot be located in previews without line numbers (e.g., Python's outlines)
+        if len(self.line_numbers) == 0:
+            return self.preview
+
+        rendered = []
+        prev_number, last_number, last_content = -1, 0, ""
+
+        def render_range(index: int, end_index: int):
+            nonlocal prev_number, last_number, last_content
+            for i in range(index, end_index):
+                line_number = self.line_numbers[i]
+                line, line_content = self.entries[i]
+                if line_number == prev_number + 1:
+                    rendered.append(line)
+                    last_number, last_content = line_number, line_content
+                else:
+                    spacing = FilePreview.spacing_for_line_number(last_number)
+                    indentation = FilePreview.indentation_of_line(last_content)
+                    rendered.extend(
+                        [
+                            spacing + indentation + "...",
+                            spacing
+                            + indentation
+                            + f"(lines {prev_number + 1}-{line_number - 1} are hidden in preview)",
+                            spacing + indentation + "...\n",
+                            line,
+                        ]
+                    )
+                prev_number = line_number
+
+        # Visit only the visible entries, jumping over the hidden ones
+        index = 0
+        for start, end in sorted(hidden_ranges):
+            start_index = max(index, bisect_left(self.line_numbers, start))
+            render_range(index, start_index)
+            index = max(index, bisect_left(self.line_numbers, end))
+        render_range(index, len(self.line_numbers))
+
+        return "\n".join(rendered)
+
+    def __str__(self):
+        return self.preview
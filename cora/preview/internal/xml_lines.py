@@ -0,0 +1,66 @@
+"""
+A lean XML parser keeping merely the element structure and the lines of each element.
+
+Previews only care about where each element starts and ends, so we let expat (in C)
+do everything but two tiny start/end handlers, rather than building an ElementTree by
+the pure-Python SlowXMLParser. Documents that the lean parser rejects are parsed again
+by SlowXMLParser, such that the accepted documents and the errors keep the same.
+"""
+
+from typing import List
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+from cora.preview.internal.xml_element import Elements
+from cora.preview.internal.xml_parser import SlowXMLParser
+
+
+class XMLNode:
+    __slots__ = ("start_line", "end_line", "children")
+
+    def __init__(self, start_line: int, end_line: int = -1):
+        self.start_line = start_line  # 1-based, as expat's
+        self.end_line = end_line  # 1-based, as expat's
+        self.children: List["XMLNode"] = []
+
+
+def parse_xml_lines(content: str) -> XMLNode:
+    try:
+        return _parse_by_expat(content)
+    except expat.error:
+        return _to_xml_node(ElementTree.fromstring(content, parser=SlowXMLParser()))
+
+
+def _parse_by_expat(content: str) -> XMLNode:
+    # The same namespace separator as SlowXMLParser, as it decides the errors of prefixes
+    parser = expat.ParserCreate(None, "}")
+    parser.ordered_attributes = 1  # Avoid creating dicts of attributes
+    document = XMLNode(0)
+    stack = [document]
+
+    def start(_tag, _attrs):
+        node = XMLNode(parser.CurrentLineNumber)
+        stack[-1].children.append(node)
+        stack.append(node)
+
+    def end(_tag):
+        stack.pop().end_line = parser.CurrentLineNumber
+
+    def reject(*_args):
+        # SlowXMLParser rejects undefined entities; let it do so
+        raise expat.error("undefined entity")
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.SkippedEntityHandler = reject
+    parser.ExternalEntityRefHandler = reject
+    parser.Parse(content, True)
+    return document.children[0]
+
+
+def _to_xml_node(element: ElementTree.Element) -> XMLNode:
+    node = XMLNode(
+        Elements.start_line_number(element), Elements.end_line_number(element)
+    )
+    node.children = [_to_xml_node(child) for child in element]
+    return node
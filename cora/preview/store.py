@@ -0,0 +1,146 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Protocol, Callable, List, Tuple
+
+from cora.config import CoraConfig
+from cora.utils.misc import estimate_num_tokens
+
+# Bump this whenever previewers change their outputs, such that stale previews are not reused
+_PREVIEW_STORE_VERSION = 1
+
+
+class _Previewer(Protocol):
+    file_content: str
+
+    def cache_key(self) -> str: ...
+
+    def get_preview(self) -> str: ...
+
+    def get_preview_within(self, token_budget: int) -> str: ...
+
+
+class PreviewStore:
+    """
+    Previews keyed by the file content's hash, the previewer, and its settings; an in-memory
+    LRU is put in front of an on-disk cache such that previews survive across processes.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_entries: int = 4096):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_preview(
+        self, previewer: _Previewer, token_budget: Optional[int] = None
+    ) -> str:
+        return self.get_or_preview_all(previewer, token_budget)[-1][1]
+
+    def get_or_preview_all(
+        self, previewer: _Previewer, token_budget: Optional[int] = None
+    ) -> List[Tuple[str, str]]:
+        """The keyed previews looked up for the preview within the budget, the last being it"""
+        key = self.key_of(previewer)
+        previews = [(key, self._get_or_compute(key, previewer.get_preview))]
+        if token_budget is None or estimate_num_tokens(previews[0][1]) <= token_budget:
+            return previews
+        # Only previews exceeding the budget are shrunk (and cached) separately
+        key = self.key_of(previewer, token_budget)
+        previews.append(
+            (
+                key,
+                self._get_or_compute(
+                    key, lambda: previewer.get_preview_within(token_budget)
+                ),
+            )
+        )
+        return previews
+
+    def _get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        preview = self._get(key)
+        if preview is None:
+            preview = self._load(key)
+            if preview is None:
+                preview = compute()
+                self._save(key, preview)
+            self._put(key, preview)
+        return preview
+
+    def put(self, key: str, preview: str):
+        self._put(key, preview)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            preview = self._entries.get(key)
+            if preview is not None:
+                self._entries.move_to_end(key)
+            return preview
+
+    def _put(self, key: str, preview: str):
+        with self._lock:
+            self._entries[key] = preview
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path_of(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / (key + ".txt")
+
+    def _load(self, key: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        try:
+            return self._path_of(key).read_text(encoding="utf-8")
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+
+    def _save(self, key: str, preview: str):
+        if self.cache_dir is None:
+            return
+        path = self._path_of(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, such that concurrent readers never see a partial preview
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fou:
+                fou.write(preview)
+            os.replace(temp_path, path)
+        except OSError:
+            Path(temp_path).unlink(missing_ok=True)
+
+    @staticmethod
+    def key_of(previewer: _Previewer, token_budget: Optional[int] = None) -> str:
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(
+            f"v{_PREVIEW_STORE_VERSION}:{previewer.cache_key()}:{token_budget}\0".encode()
+        )
+        hasher.update(previewer.file_content.encode("utf-8", errors="surrogatepass"))
+        return hasher.hexdigest()
+
+
+_STORE: Optional[PreviewStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_preview_store() -> PreviewStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            # Previews are kept only in memory if there's no cache directory configured
+            _STORE = PreviewStore(
+                cache_dir=(
+                    CoraConfig.preview_cache_directory()
+                    if CoraConfig.get("CACHE_DIRECTORY_PATH")
+                    else None
+                ),
+                max_entries=CoraConfig.PREVIEW_CACHE_MAX_ENTRIES,
+            )
+        return _STORE
@@ -1,8 +1,8 @@
-from xml.etree import ElementTree
+from functools import cached_property
 
 from cora.preview.base import FilePreview
-from cora.preview.internal.xml_element import Elements
-from cora.preview.internal.xml_parser import SlowXMLParser
+from cora.preview.internal.xml_lines import XMLNode, parse_xml_lines
+from cora.utils.misc import estimate_num_tokens
 
 
 @FilePreview.register(["xml"])
@@ -11,10 +11,30 @@ class XMLPreview(FilePreview):
         super().__init__(
             file_type=file_type, file_name=file_name, file_content=file_content
         )
-        # TODO: Comments are all lost
-        self.xml_tree = ElementTree.fromstring(file_content, parser=SlowXMLParser())
         self.max_kept_depth = 5
 
+    @cached_property
+    def xml_tree(self):
+        # TODO: Comments are all lost
+        return parse_xml_lines(self.file_content)
+
+    def settings(self):
+        return {"max_kept_depth": self.max_kept_depth}
+
+    def get_preview_within(self, token_budget: int) -> str:
+        # Hide deeper elements progressively until the preview fits the budget
+        max_kept_depth = self.max_kept_depth
+        try:
+            preview = self.get_preview()
+            while (
+                estimate_num_tokens(preview) > token_budget and self.max_kept_depth > 1
+            ):
+                self.max_kept_depth -= 1
+                preview = self.get_preview()
+        finally:
+            self.max_kept_depth = max_kept_depth
+        return self.truncate_preview(preview, token_budget)
+
     def get_preview(self):
         file_lines = self.file_lines
         last_line_number = -1
@@ -25,14 +45,14 @@ class XMLPreview(FilePreview):
                 preview.append(self.preview_line(line_number, file_lines[line_number]))
                 last_line_number = line_number
 
-        def traverse_element(element: ElementTree.Element, *, depth):
+        def traverse_element(element: XMLNode, *, depth):
             nonlocal last_line_number
             preview = []
 
             # We have reached max kept depth; let's hide all our children.
-            if depth + 1 == self.max_kept_depth and len(element) > 0:
-                start_number = Elements.start_line_number(element) - 1
-                child_start_number = Elements.start_line_number(element[0]) - 1
+            if depth + 1 == self.max_kept_depth and element.children:
+                start_number = element.start_line - 1
+                child_start_number = element.children[0].start_line - 1
 
                 if child_start_number > start_number:
                     # Continue from last previewed line until our first child
@@ -44,8 +64,8 @@ class XMLPreview(FilePreview):
                     preview_lines_update_last_number(
                         last_line_number + 1, start_number + 1, preview
                     )
-                end_number = Elements.end_line_number(element) - 1
-                child_end_number = Elements.end_line_number(element[-1]) - 1
+                end_number = element.end_line - 1
+                child_end_number = element.children[-1].end_line - 1
 
                 if child_end_number > last_line_number:
                     spacing = self.spacing_for_line_number(child_start_number)
@@ -72,9 +92,9 @@ class XMLPreview(FilePreview):
                 return preview
 
             # Let's preview our children one by one
-            for child in element:
-                child_start_number = Elements.start_line_number(child) - 1
-                child_end_number = Elements.end_line_number(child) - 1
+            for child in element.children:
+                child_start_number = child.start_line - 1
+                child_end_number = child.end_line - 1
                 # This means [start_number, last_line_number] were already processed
                 if child_start_number < last_line_number:
                     child_start_number = last_line_number + 1
@@ -86,7 +106,7 @@ class XMLPreview(FilePreview):
                     last_line_number + 1, child_start_number, preview
                 )
                 # The child do not have any further children; let's put its content.
-                if len(child) == 0:
+                if not child.children:
                     preview.extend(
                         [
                             self.preview_line(line_number, file_lines[line_number])
@@ -102,7 +122,7 @@ class XMLPreview(FilePreview):
 
             preview_lines_update_last_number(
                 last_line_number + 1,
-                (Elements.end_line_number(element) - 1) + 1,
+                (element.end_line - 1) + 1,
                 preview,
             )
 
@@ -49,6 +49,15 @@ JSON_SCHEMA = """\
 }\
 """
 
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "line": {"type": ["array", "null"], "items": {"type": "integer"}},
+        "reason": {"type": "string"},
+    },
+    "required": ["line", "reason"],
+}
+
 NOT_INTEGER_LIST_MESSAGE = """\
 **FAILURE**: The relevant line ({line}) you gave is NOT an integer list or null.
 
@@ -122,7 +131,14 @@ class SnipRefiner(AgentBase):
         *args,
         **kwargs,
     ):
-        AgentBase.__init__(self, llm=llm, json_schema=JSON_SCHEMA, *args, **kwargs)
+        AgentBase.__init__(
+            self,
+            llm=llm,
+            json_schema=JSON_SCHEMA,
+            response_schema=RESPONSE_SCHEMA,
+            *args,
+            **kwargs,
+        )
         self.repo = repo
         self.surroundings = surroundings
 
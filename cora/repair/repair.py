@@ -6,6 +6,7 @@ from typing import Protocol, Optional, List
 
 from cora.base.console import get_boxed_console
 from cora.base.repos import RepoTup
+from cora.llms import usage
 from cora.llms.factory import LLMFactory, LLMConfig
 from cora.repair.events import (
     IssueRepaEvents as Events,
@@ -14,6 +15,7 @@ from cora.repair.events import (
 from cora.repair.patch import PatchGen
 from cora.repair.refine import SnipRefiner
 from cora.repo.repo import Repository
+from cora.splits.parsed import edit_by_patch
 from cora.utils import cmdline, event
 from cora.utils.event import EventEmitter
 from cora.utils.parallel import parallel
@@ -52,6 +54,7 @@ class IssueRepa(EventEmitter):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_GEN_PATCH_START.value,
         after_event=Events.EVENT_GEN_PATCH_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def gen_patch(self, issue: str, snip_paths: List[str]) -> Optional[str]:
         self.console.printb(
@@ -74,6 +77,7 @@ class IssueRepa(EventEmitter):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_EVAL_PATCH_START.value,
         after_event=Events.EVENT_EVAL_PATCH_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def eval_patch(
         self,
@@ -106,6 +110,8 @@ class IssueRepa(EventEmitter):
         except subprocess.CalledProcessError as e:
             self.console.printb(f"The generated patch is invalid: {e.stderr}")
             return False
+        # Let later splitting/previewing of patched files reuse their original trees
+        edit_by_patch(Path(self.repo.repo_path), patch_str)
         self.console.printb(
             f"The patched repository is placed at: {patched_repo.repo_path}"
         )
@@ -145,6 +151,7 @@ class IssueRepa(EventEmitter):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_START.value,
         after_event=Events.EVENT_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def try_repair(
         self,
@@ -9,6 +9,7 @@ from cora.agents.rewrite.dont import DontRewrite
 from cora.agents.rewrite.issue import IssueSummarizer
 from cora.base.rag import GeneratorBase
 from cora.llms.factory import LLMConfig, LLMFactory
+from cora.preview.batch import precompute_previews
 
 RESP_GEN_NO_REASONING_PROMPT = """\
 ## Context ##
@@ -124,6 +125,8 @@ def main():
     query, incl = options.parse_query(args)
     llm = options.parse_llms(args)
     procs, threads = options.parse_perf(args)
+    if options.parse_precompute(args):
+        precompute_previews(repo, includes=incl, num_procs=procs)
     log_dir, verbose = options.parse_logging(args)
 
     if args.query_as_issue:
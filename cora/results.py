@@ -41,6 +41,9 @@ class CfarResult(RetrieverCallbacks):
             # Let's fall back to string for failed cases
             new_phase_res = str(phase_res)
         self.result[phase] = new_phase_res
+        # Summarize the LLM usage of all phases for a cost and latency breakdown
+        if "usage" in phase_res:
+            self.result.setdefault("usage", {})[phase] = phase_res["usage"]
         with self.res_file.open("w") as fou:
             fou.write(json5.dumps(self.result))
 
@@ -1,7 +1,9 @@
+import asyncio
 from collections import defaultdict
 from typing import Optional, Set, List, Dict, OrderedDict
 
 from cora.agents.choose_files import FileChooser
+from cora.agents.explore_dirs import DirFinder
 from cora.agents.explore_tree import FileFinder
 from cora.agents.find_entities import EntDefnFinder
 from cora.agents.rewrite.base import RewriterBase
@@ -13,6 +15,7 @@ from cora.base.console import get_boxed_console
 from cora.base.ftree import FileTree
 from cora.base.paths import FilePath
 from cora.config import CoraConfig
+from cora.llms import usage
 from cora.llms.factory import LLMFactory, LLMConfig
 from cora.repo.repo import Repository
 from cora.retrv.events import (
@@ -20,6 +23,7 @@ from cora.retrv.events import (
     RetrieverEvents as Events,
 )
 from cora.utils import event
+from cora.utils.aio import gather_with_limit
 from cora.utils.misc import CannotReachHereError
 from cora.utils.parallel import parallel
 
@@ -54,6 +58,7 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_QRW_START.value,
         after_event=Events.EVENT_QRW_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def rewrite_query(self, query: str):
         self.console.printb(f"QRW: Rewriting the user query using {self.rewriter} ...")
@@ -68,6 +73,7 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_EDL_START.value,
         after_event=Events.EVENT_EDL_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def lookup_entity_definition(self, query: str, limit: int) -> List[str]:
         self.console.printb(
@@ -121,6 +127,7 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_KWS_START.value,
         after_event=Events.EVENT_KWS_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def search_keyword_engine(
         self, query: str, limit: int, skipping: Optional[Set[str]] = None
@@ -143,6 +150,7 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_FTE_START.value,
         after_event=Events.EVENT_FTE_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def explore_file_tree(
         self,
@@ -150,7 +158,9 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
         starting_files: Optional[Set[str]] = None,
         going_upward: Optional[int] = None,
         max_file_tree_size: int = 1500,
+        max_file_tree_tokens: int = 0,
         give_up_early: bool = True,
+        hierarchical: bool = False,
         limit: int = 2147483647,  # By default, let LLMs to find until the very last
     ):
         self.console.printb(
@@ -178,24 +188,63 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
                     query, file_tree, size=max_file_tree_size
                 )
             if file_tree.current_size() > max_file_tree_size:
-                # Give up, otherwise LLMs fail due to limited context window
-                return self._give_up_ftree_exploration(
-                    query=query,
-                    starting_files=starting_files,
-                    searched_files=[],
-                    file_limit=limit,
-                    going_upward=going_upward,
-                )
+                if hierarchical:
+                    # Narrow down the tree from directories to files, with each prompt bounded
+                    return self._explore_file_tree_hierarchically(
+                        query,
+                        file_tree,
+                        starting_files=starting_files,
+                        max_file_tree_size=max_file_tree_size,
+                        max_file_tree_tokens=max_file_tree_tokens,
+                        limit=limit,
+                    )
+                elif not give_up_early and max_file_tree_tokens > 0:
+                    # Rather than giving up, render a compact tree within the token budget
+                    self.console.printb(
+                        f"Rendering the file tree within a budget of {max_file_tree_tokens} tokens."
+                    )
+                else:
+                    # Give up, otherwise LLMs fail due to limited context window
+                    return self._give_up_ftree_exploration(
+                        query=query,
+                        starting_files=starting_files,
+                        searched_files=[],
+                        file_limit=limit,
+                        going_upward=going_upward,
+                    )
+
+        return self._find_files_in_file_tree(
+            query,
+            file_tree,
+            starting_files=starting_files,
+            tree_token_budget=(
+                max_file_tree_tokens
+                if file_tree.current_size() > max_file_tree_size
+                else None
+            ),
+            limit=limit,
+        )
 
+    def _find_files_in_file_tree(
+        self,
+        query: str,
+        file_tree: FileTree,
+        *,
+        starting_files: Optional[Set[str]],
+        tree_token_budget: Optional[int],
+        limit: int,
+    ) -> List[str]:
         file_finder = FileFinder(
             query,
             self.repo,
             tree=file_tree,
             llm=LLMFactory.create(self.use_llm),
             includes=self.incl_pats,
+            tree_token_budget=tree_token_budget,
+            focus_files=starting_files,
         )
         # Notify file finder that these files are already found
-        file_finder.file_list.extend(starting_files)
+        file_finder.file_list.extend(starting_files or [])
 
         dep_files = []
         while len(dep_files) < limit:
@@ -213,9 +262,94 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
 
         return dep_files
 
+    def _explore_file_tree_hierarchically(
+        self,
+        query: str,
+        file_tree: FileTree,
+        *,
+        starting_files: Optional[Set[str]],
+        max_file_tree_size: int,
+        max_file_tree_tokens: int,
+        limit: int,
+    ) -> List[str]:
+        self.console.printb(
+            "Explore the file tree hierarchically, from top-level directories to files"
+        )
+        tree_token_budget = max_file_tree_tokens if max_file_tree_tokens > 0 else None
+
+        # Starting from the root directory, each round shows the chosen directories with their
+        # direct children, and lets LLMs choose (deeper) directories from them. We stop once
+        # the chosen directories fit into a single prompt or once LLMs do not go any deeper.
+        # Each round narrows down a view of the given tree, keeping how it has been reshaped.
+        chosen_dirs = [FileTree.DIRECTORY_LINE_ENDINGS]
+        for _ in range(CoraConfig.FTE_DTF_MAX_ROUNDS):
+            dir_tree = file_tree.view()
+            dir_tree.keep_only(chosen_dirs)
+            if dir_tree.current_size() <= max_file_tree_size:
+                break
+            dir_tree.show_only_children_of(chosen_dirs)
+            dir_finder = DirFinder(
+                query,
+                self.repo,
+                tree=dir_tree,
+                llm=LLMFactory.create(self.use_llm),
+                dir_limit=CoraConfig.FTE_DTF_DIR_LIMIT,
+                tree_token_budget=(
+                    tree_token_budget
+                    if dir_tree.current_size() > max_file_tree_size
+                    else None
+                ),
+            )
+            next_dirs, reason = dir_finder.find()
+            if not next_dirs:
+                self.console.printb(f"Quit: {reason}")
+                return self._give_up_ftree_exploration(
+                    query=query,
+                    starting_files=starting_files,
+                    searched_files=[],
+                    file_limit=limit,
+                )
+            self.console.printb(
+                f"Chose {len(next_dirs)} directories: {reason}\n"
+                + "\n".join(f"- {d}" for d in next_dirs)
+            )
+            if set(next_dirs) <= set(chosen_dirs):
+                # Relevant files are direct children of the chosen directories
+                chosen_dirs = next_dirs
+                break
+            chosen_dirs = next_dirs
+
+        # Files are found in the finally chosen directories, even if we ran out of rounds
+        dir_tree = self._narrow_file_tree_to_dirs(
+            file_tree, chosen_dirs, max_file_tree_size
+        )
+        return self._find_files_in_file_tree(
+            query,
+            dir_tree,
+            starting_files=starting_files,
+            tree_token_budget=(
+                tree_token_budget
+                if dir_tree.current_size() > max_file_tree_size
+                else None
+            ),
+            limit=limit,
+        )
+
+    @staticmethod
+    def _narrow_file_tree_to_dirs(
+        file_tree: FileTree, dirs: List[str], max_file_tree_size: int
+    ) -> FileTree:
+        # Keep the directories' subtrees, or only their direct children if they are too large
+        dir_tree = file_tree.view()
+        dir_tree.keep_only(dirs)
+        if dir_tree.current_size() > max_file_tree_size:
+            dir_tree.show_only_children_of(dirs)
+        return dir_tree
+
     @event.hook_method_to_emit_events(
         before_event=Events.EVENT_FPS_START.value,
         after_event=Events.EVENT_FPS_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def score_files_by_preview(
         self, query: str, file_list: List[str], num_proc: int = 1
@@ -223,14 +357,25 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
         self.console.printb("FPS: Scoring each file by its preview ...")
         num_proc = 1 if num_proc <= 1 else num_proc
 
-        results = parallel(
-            [
-                (self.score_file_by_preview, (query, file, file_list, num_proc > 1))
-                for file in file_list
-            ],
-            n_jobs=num_proc,
-            backend="threading",
-        )
+        if CoraConfig.FPS_NUM_ASYNC_QUERIES > 0:
+            results = asyncio.run(
+                gather_with_limit(
+                    [
+                        self.ascore_file_by_preview(query, file, file_list, True)
+                        for file in file_list
+                    ],
+                    limit=CoraConfig.FPS_NUM_ASYNC_QUERIES,
+                )
+            )
+        else:
+            results = parallel(
+                [
+                    (self.score_file_by_preview, (query, file, file_list, num_proc > 1))
+                    for file in file_list
+                ],
+                n_jobs=num_proc,
+                backend="threading",
+            )
 
         score_dict = defaultdict(list)
         for file, res in zip(file_list, results):
@@ -250,8 +395,22 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
         self.console.printb(f"File {file} is scored {score}: {reason}")
         return score, reason
 
+    async def ascore_file_by_preview(
+        self, query: str, file: str, file_list: List[str], disable_debugging=False
+    ):
+        scorer = PreviewScorer(
+            query=query, repo=self.repo, llm=LLMFactory.create(self.use_llm)
+        )
+        if disable_debugging:
+            scorer.disable_debugging()
+        score, reason = await scorer.ascore(file, file_list)
+        self.console.printb(f"File {file} is scored {score}: {reason}")
+        return score, reason
+
     @event.hook_method_to_emit_events(
-        before_event=Events.EVENT_START.value, after_event=Events.EVENT_FINISH.value
+        before_event=Events.EVENT_START.value,
+        after_event=Events.EVENT_FINISH.value,
+        around=usage.metering_as_kwargs,
     )
     def retrieve(
         self, query, files_only: bool = False, num_proc: int = 1, **kwargs
@@ -276,6 +435,7 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
         if CoraConfig.FTE_STRATEGY in [
             CoraConfig.FTE_STRATEGY_NAME_FTD_GU,
             CoraConfig.FTE_STRATEGY_NAME_FTD_TS,
+            CoraConfig.FTE_STRATEGY_NAME_DTF,
         ]:
             # We conservatively assume that the files we miss should be around these files (like in the same module)
             # So we go upward some layers and reshape the file tree before performing file finding.
@@ -286,10 +446,16 @@ class Retriever(event.EventEmitter, rag.RetrieverBase):
                 going_upward=CoraConfig.FTE_FTD_GOING_UPWARD,
                 # We will try shrink the file tree if our file tree is too large if our strategy asks us to do so
                 give_up_early=(
-                    CoraConfig.FTE_STRATEGY == CoraConfig.FTE_STRATEGY_NAME_FTD_GU
+                    CoraConfig.FTE_STRATEGY != CoraConfig.FTE_STRATEGY_NAME_FTD_TS
+                ),
+                # Or we will explore the file tree from directories to files if our strategy asks us to do so
+                hierarchical=(
+                    CoraConfig.FTE_STRATEGY == CoraConfig.FTE_STRATEGY_NAME_DTF
                 ),
                 # Give up searching when the file tree exceeds this number
                 max_file_tree_size=CoraConfig.FTE_MAX_FILE_TREE_SIZE,
+                # Otherwise, render the file tree compactly within this number of tokens
+                max_file_tree_tokens=CoraConfig.FTE_MAX_FILE_TREE_TOKENS,
                 limit=CoraConfig.FTE_FILE_LIMIT,
             )
         elif CoraConfig.FTE_STRATEGY == CoraConfig.FTE_STRATEGY_NAME_NO_FTE:
@@ -1,11 +1,12 @@
-import re
-from typing import List
+from functools import cached_property
+from typing import List, Dict, Tuple
 
 from tree_sitter import Node, Range
-from tree_sitter_languages import get_parser
 
 from cora.base.paths import FilePath, SnippetPath
+from cora.splits.edits import InputEdit
 from cora.splits.ftypes import parse_ftype
+from cora.splits.parsed import ParsedFile, language_of
 from cora.splits.splitter import Splitter
 
 
@@ -18,7 +19,8 @@ class ASTSpl(Splitter):
 
     def __init__(self, file: FilePath, snippet_size: int = 1500, min_size: int = 100):
         super().__init__(file)
-        self._parser = get_parser(parse_ftype(file.name))
+        self._lang = parse_ftype(file.name)
+        language_of(self._lang)  # Fail early if the language is not supported
         self._snippet_size = snippet_size
         self._min_size = min_size
 
@@ -31,18 +33,23 @@ class ASTSpl(Splitter):
             return [SnippetPath(self.file, 0, ranges[0].end_point[0] + 1)]
 
         # Merge overly small ranges into one of their adjacent ranges
+        # Ranges are contiguous, so we count the current range by summing up its ranges
         merged_ranges = []
         cur_ran = Range((0, 0), (0, 0), 0, 0)
+        cur_non_spaces, cur_newlines = 0, 0
         for ran in ranges:
             cur_ran = Range(
                 cur_ran.start_point, ran.end_point, cur_ran.start_byte, ran.end_byte
             )
-            cur_cont = self.content[cur_ran.start_byte : cur_ran.end_byte]
-            if len(re.sub(r"\s", "", cur_cont)) > self._min_size and "\n" in cur_cont:
+            ran_cont = self.content[ran.start_byte : ran.end_byte]
+            cur_non_spaces += len("".join(ran_cont.split()))
+            cur_newlines += ran_cont.count("\n")
+            if cur_non_spaces > self._min_size and cur_newlines > 0:
                 merged_ranges.append(cur_ran)
                 cur_ran = Range(
                     ran.end_point, ran.end_point, ran.end_byte, ran.end_byte
                 )
+                cur_non_spaces, cur_newlines = 0, 0
         if cur_ran.end_byte - cur_ran.start_byte > 0:
             merged_ranges.append(cur_ran)
 
@@ -57,8 +64,30 @@ class ASTSpl(Splitter):
 
         return snippets
 
+    @cached_property
+    def parsed(self) -> ParsedFile:
+        return ParsedFile.of_file(self._lang, self.file)
+
+    @cached_property
+    def content(self):
+        return self.parsed.content
+
+    @cached_property
+    def _split_memo(self) -> Dict[tuple, Tuple[Range, ...]]:
+        # Memoized ranges of each split node, shared by all splitters of the parsed file
+        key = (ASTSpl.__name__, self._snippet_size)
+        memo = self.parsed.memo.get(key)
+        if memo is None:
+            memo = {}
+            # Inherit ranges of untouched nodes if the file is edited from another one
+            if self.parsed.origin is not None:
+                origin_memo, edits = self.parsed.origin
+                memo = _shift_memo(origin_memo.get(key, {}), edits)
+            memo = self.parsed.memo.setdefault(key, memo)
+        return memo
+
     def _split_ast(self) -> List[Range]:
-        ast = self._parser.parse(self.content.encode("utf-8"))
+        ast = self.parsed.tree
 
         # Split recursively, each splits saving their starting and ending point in a range
         ranges = self._split_node(ast.root_node)
@@ -82,6 +111,14 @@ class ASTSpl(Splitter):
         return ranges
 
     def _split_node(self, node: Node) -> List[Range]:
+        # Ranges of a node only depend on its subtree, which is identified by below key
+        key = (node.start_byte, node.end_byte, node.type, node.descendant_count)
+        ranges = self._split_memo.get(key)
+        if ranges is None:
+            ranges = self._split_memo[key] = tuple(self._do_split_node(node))
+        return list(ranges)
+
+    def _do_split_node(self, node: Node) -> List[Range]:
         ranges: List[Range] = []
         cur_ran = Range(
             node.start_point, node.start_point, node.start_byte, node.start_byte
@@ -115,3 +152,28 @@ class ASTSpl(Splitter):
                 )
         ranges.append(cur_ran)
         return ranges
+
+
+def _shift_memo(memo: dict, edits: List[InputEdit]) -> dict:
+    # Edits are applied backwards such that each edit's positions are valid in the memo
+    for e in reversed(edits):
+        shifted_memo = {}
+        for key, ranges in memo.items():
+            start_byte, end_byte, *rest = key
+            # Nodes touching an edit are dropped as their subtree might be changed
+            if end_byte < e.start_byte:
+                shifted_memo[key] = ranges
+            elif start_byte > e.old_end_byte:
+                shifted_key = (e.shift_byte(start_byte), e.shift_byte(end_byte), *rest)
+                shifted_memo[shifted_key] = tuple(_shift_range(r, e) for r in ranges)
+        memo = shifted_memo
+    return memo
+
+
+def _shift_range(ran: Range, e: InputEdit) -> Range:
+    return Range(
+        e.shift_point(ran.start_point),
+        e.shift_point(ran.end_point),
+        e.shift_byte(ran.start_byte),
+        e.shift_byte(ran.end_byte),
+    )
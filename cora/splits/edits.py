@@ -0,0 +1,191 @@
+import re
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+
+_PATTERN_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Tags of lines in a hunk: context, removed, added, and "\ No newline at end of file"
+_HUNK_LINE_TAGS = (" ", "-", "+", "\\")
+
+
+@dataclass(frozen=True)
+class TextEdit:
+    start: int  # Start (char) offset in the old content
+    end: int  # End (char, exclusive) offset in the old content
+    text: str  # The new text replacing the old content[start:end]
+
+
+@dataclass(frozen=True)
+class InputEdit:
+    # An edit in bytes and points as expected by tree-sitter's Tree.edit()
+    start_byte: int
+    old_end_byte: int
+    new_end_byte: int
+    start_point: Tuple[int, int]
+    old_end_point: Tuple[int, int]
+    new_end_point: Tuple[int, int]
+
+    def shift_byte(self, byte: int) -> int:
+        return byte - self.old_end_byte + self.new_end_byte
+
+    def shift_point(self, point: Tuple[int, int]) -> Tuple[int, int]:
+        row, col = point
+        if row == self.old_end_point[0]:
+            return (
+                self.new_end_point[0],
+                col - self.old_end_point[1] + self.new_end_point[1],
+            )
+        return row - self.old_end_point[0] + self.new_end_point[0], col
+
+
+def apply_edits(content: str, edits: List[TextEdit]) -> str:
+    parts, last = [], 0
+    for e in _check_edits(edits):
+        parts.append(content[last : e.start])
+        parts.append(e.text)
+        last = e.end
+    parts.append(content[last:])
+    return "".join(parts)
+
+
+def to_input_edits(content: str, edits: List[TextEdit]) -> List[InputEdit]:
+    """Convert the edits into tree-sitter's; each is relative to the content with all its following edits applied"""
+    input_edits = []
+    for e in _check_edits(edits):
+        start_byte, start_point = _locate(content, e.start)
+        old_end_byte, old_end_point = _locate(content, e.end)
+        new_bytes = e.text.encode("utf-8")
+        num_new_lines = e.text.count("\n")
+        if num_new_lines == 0:
+            new_end_point = (start_point[0], start_point[1] + len(new_bytes))
+        else:
+            new_end_point = (
+                start_point[0] + num_new_lines,
+                len(e.text[e.text.rfind("\n") + 1 :].encode("utf-8")),
+            )
+        input_edits.append(
+            InputEdit(
+                start_byte=start_byte,
+                old_end_byte=old_end_byte,
+                new_end_byte=start_byte + len(new_bytes),
+                start_point=start_point,
+                old_end_point=old_end_point,
+                new_end_point=new_end_point,
+            )
+        )
+    return input_edits
+
+
+def edits_of_search_replace(content: str, search: str, replace: str) -> List[TextEdit]:
+    """Edits equivalent to content.replace(search, replace)"""
+    if not search:
+        raise ValueError("The search block of a search/replace edit cannot be empty")
+    edits, start = [], content.find(search)
+    while start != -1:
+        edits.append(TextEdit(start, start + len(search), replace))
+        start = content.find(search, start + len(search))
+    return edits
+
+
+def edits_of_unified_diff(content: str, udiff: str) -> List[TextEdit]:
+    """Edits equivalent to applying the hunks of a file's unified diff to its content"""
+    old_lines = _split_lines(content)
+    line_offsets = [0]
+    for line in old_lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    edits = []
+    diff_lines = _split_lines(udiff)
+    index = 0
+    while index < len(diff_lines):
+        match = _PATTERN_HUNK_HEADER.match(diff_lines[index])
+        index += 1
+        if not match:
+            continue
+        # A hunk of an empty range points to the line before the range
+        old_lno = int(match.group(1)) - (0 if match.group(2) == "0" else 1)
+        del_start, removed, added = old_lno, 0, []
+        while index < len(diff_lines) and diff_lines[index][:1] in _HUNK_LINE_TAGS:
+            tag, line = diff_lines[index][0], diff_lines[index][1:]
+            index += 1
+            if tag == "\\":
+                # "\ No newline at end of file" only matters to lines we add
+                if added and index >= 2 and diff_lines[index - 2][0] == "+":
+                    added[-1] = added[-1].rstrip("\n")
+                continue
+            if tag == " ":
+                if removed or added:
+                    edits.append(
+                        _make_line_edit(line_offsets, del_start, removed, added)
+                    )
+                _check_line(old_lines, old_lno, line)
+                old_lno, del_start, removed, added = old_lno + 1, old_lno + 1, 0, []
+            elif tag == "-":
+                _check_line(old_lines, old_lno, line)
+                old_lno, removed = old_lno + 1, removed + 1
+            else:
+                added.append(line)
+        if removed or added:
+            edits.append(_make_line_edit(line_offsets, del_start, removed, added))
+    return edits
+
+
+def split_patch(patch: str) -> Dict[str, str]:
+    """Split a (git-styled, -p1) patch into the unified diff of each of its patched files"""
+    diffs: Dict[str, List[str]] = {}
+    curr_file, curr_lines = None, []
+    for line in _split_lines(patch):
+        if line.startswith("diff --git "):
+            curr_file, curr_lines = None, []
+        elif line.startswith("+++ ") and not curr_lines:
+            path = line[4:].rstrip("\n").split("\t")[0]
+            curr_file = path[2:] if path.startswith("b/") else path
+            if curr_file == "/dev/null":
+                curr_file = None  # The file is deleted
+            elif curr_file not in diffs:
+                diffs[curr_file] = curr_lines
+            else:
+                curr_lines = diffs[curr_file]
+        elif curr_file is not None and (line.startswith("@@") or curr_lines):
+            curr_lines.append(line)
+    return {f: "".join(lines) for f, lines in diffs.items()}
+
+
+def _make_line_edit(
+    line_offsets: List[int], start_lno: int, num_removed: int, added: List[str]
+) -> TextEdit:
+    return TextEdit(
+        line_offsets[start_lno], line_offsets[start_lno + num_removed], "".join(added)
+    )
+
+
+def _check_line(old_lines: List[str], lno: int, line: str):
+    if lno >= len(old_lines) or old_lines[lno].rstrip("\n") != line.rstrip("\n"):
+        raise ValueError(
+            f"The diff does not apply: line {lno + 1} is not the expected '{line.rstrip()}'"
+        )
+
+
+def _check_edits(edits: List[TextEdit]) -> List[TextEdit]:
+    edits = sorted(edits, key=lambda e: (e.start, e.end))
+    for i in range(len(edits) - 1):
+        if edits[i].end > edits[i + 1].start:
+            raise ValueError(f"Overlapping edits: {edits[i]} and {edits[i + 1]}")
+    return edits
+
+
+def _locate(content: str, offset: int) -> Tuple[int, Tuple[int, int]]:
+    # Byte offset and (row, byte column) point of the char offset
+    line_start = content.rfind("\n", 0, offset) + 1
+    column = len(content[line_start:offset].encode("utf-8"))
+    byte = column + len(content[:line_start].encode("utf-8"))
+    return byte, (content.count("\n", 0, line_start), column)
+
+
+def _split_lines(text: str) -> List[str]:
+    # Only "\n" breaks lines (as patch does), other line boundaries are left as they are
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
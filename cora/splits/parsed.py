@@ -0,0 +1,243 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Tuple, Optional, List, Set
+
+from tree_sitter import Tree, Parser, Language
+from tree_sitter_languages import get_language
+
+from cora.base.paths import FilePath
+from cora.config import CoraConfig
+from cora.splits.edits import (
+    TextEdit,
+    InputEdit,
+    apply_edits,
+    to_input_edits,
+    split_patch,
+    edits_of_unified_diff,
+)
+from cora.splits.ftypes import parse_ftype
+
+# A tree-sitter tree roughly takes several times the memory of its source
+_TREE_BYTES_PER_SOURCE_BYTE = 10
+
+# Reusing a tree costs linearly in its top-level nodes; flat files are reparsed from scratch
+_MAX_TOP_LEVEL_NODES_FOR_REUSE = 500
+
+_ParsedKey = Tuple[str, bytes]  # (language, digest of the content)
+
+_FileKey = Tuple[str, str]  # (language, path of the file)
+
+
+@lru_cache(maxsize=None)
+def language_of(lang: Optional[str]) -> Language:
+    """Load the tree-sitter language once; raise if it is not supported"""
+    if not lang:
+        raise ValueError("No language is given to load its tree-sitter grammar")
+    return get_language(lang)
+
+
+_parsers = threading.local()
+
+
+def _parser_of(lang: str) -> Parser:
+    # Parsers are not thread-safe, so let each thread own its parsers
+    if not hasattr(_parsers, "cache"):
+        _parsers.cache = {}
+    parser = _parsers.cache.get(lang)
+    if parser is None:
+        parser = Parser()
+        parser.set_language(language_of(lang))
+        _parsers.cache[lang] = parser
+    return parser
+
+
+class ParsedFile:
+    """
+    A file's content together with its tree-sitter tree.
+    Parsed files are shared (read-only) by splitters and previewers via ParsedFile.of()
+    and ParsedFile.of_file(), such that a file is parsed at most once while it is cached.
+    """
+
+    def __init__(self, lang: str, content: str, content_bytes: bytes, tree: Tree):
+        self.lang = lang
+        self.content = content
+        self.content_bytes = content_bytes
+        self.tree = tree
+        # Data derived from the tree by its users, e.g., ranges of a splitter
+        self.memo: Dict[Any, Any] = {}
+        # The memo of the file this file is edited from, and the edits
+        self.origin: Optional[Tuple[Dict[Any, Any], List[InputEdit]]] = None
+
+    @property
+    def approx_size(self) -> int:
+        return len(self.content_bytes) * (2 + _TREE_BYTES_PER_SOURCE_BYTE)
+
+    def edit(self, edits: List[TextEdit]) -> "ParsedFile":
+        """Apply the edits and reparse incrementally; this file itself is left untouched"""
+        new_content = apply_edits(self.content, edits)
+        new_bytes = new_content.encode("utf-8")
+        input_edits = to_input_edits(self.content, edits)
+        parser = _parser_of(self.lang)
+        if self.tree.root_node.child_count > _MAX_TOP_LEVEL_NODES_FOR_REUSE:
+            new_tree = parser.parse(new_bytes)
+        else:
+            # Tree.edit() is in place; reparsing the unchanged bytes reuses all subtrees to make a cheap copy
+            tree = parser.parse(self.content_bytes, self.tree)
+            for e in reversed(input_edits):
+                tree.edit(
+                    start_byte=e.start_byte,
+                    old_end_byte=e.old_end_byte,
+                    new_end_byte=e.new_end_byte,
+                    start_point=e.start_point,
+                    old_end_point=e.old_end_point,
+                    new_end_point=e.new_end_point,
+                )
+            new_tree = parser.parse(new_bytes, tree)
+        parsed = ParsedFile(self.lang, new_content, new_bytes, new_tree)
+        parsed.origin = (self.memo, input_edits)
+        return _CACHE.put(parsed)
+
+    @staticmethod
+    def parse(lang: str, content: str) -> "ParsedFile":
+        content_bytes = content.encode("utf-8")
+        return ParsedFile(
+            lang, content, content_bytes, _parser_of(lang).parse(content_bytes)
+        )
+
+    @staticmethod
+    def of(lang: str, content: str) -> "ParsedFile":
+        return _CACHE.get_or_parse(lang, content)
+
+    @staticmethod
+    def of_file(lang: str, file: FilePath) -> "ParsedFile":
+        return _CACHE.get_or_parse_file(lang, file)
+
+    @staticmethod
+    def cached_of_file(lang: str, file: FilePath) -> Optional["ParsedFile"]:
+        return _CACHE.get_file(lang, file)
+
+
+def edit_by_patch(root: FilePath, patch: str):
+    """Incrementally reparse files patched by the patch from their cached versions under root"""
+    for file, udiff in split_patch(patch).items():
+        lang = parse_ftype(file)
+        try:
+            language_of(lang)
+            parsed = ParsedFile.cached_of_file(lang, root / file)
+            if parsed is not None:
+                parsed.edit(edits_of_unified_diff(parsed.content, udiff))
+        except (ValueError, IndexError, AttributeError, OSError):
+            # Unsupported languages, new or deleted files, and hunks that do not apply;
+            # the patched file will then be parsed from scratch
+            continue
+
+
+class ParsedFileCache:
+    """
+    An LRU cache of parsed files bounded by their (approximate) memory. Entries are keyed
+    by their language and content hash; files on disk are additionally indexed by their
+    path and mtime such that a cache hit does not even read the file.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[_ParsedKey, ParsedFile] = OrderedDict()
+        self._files: Dict[_FileKey, Tuple[int, int, _ParsedKey]] = {}
+        # Files indexed by each entry such that evicting the entry also drops them
+        self._files_of: Dict[_ParsedKey, Set[_FileKey]] = {}
+        self._num_bytes = 0
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return CoraConfig.PARSED_FILE_CACHE_MAX_BYTES
+
+    def get_or_parse(self, lang: str, content: str) -> ParsedFile:
+        key = self._key_of(lang, content.encode("utf-8"))
+        parsed = self._get(key)
+        if parsed is None:
+            parsed = self._put(key, ParsedFile.parse(lang, content))
+        return parsed
+
+    def get_file(self, lang: str, file: FilePath) -> Optional[ParsedFile]:
+        path = str(file)
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._files.get((lang, path))
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return self._get(cached[2])
+        return None
+
+    def get_or_parse_file(self, lang: str, file: FilePath) -> ParsedFile:
+        parsed = self.get_file(lang, file)
+        if parsed is not None:
+            return parsed
+        path = str(file)
+        stat = os.stat(path)
+        parsed = self.get_or_parse(
+            lang, FilePath(path).read_text(encoding="utf-8", errors="replace")
+        )
+        key = self._key_of(lang, parsed.content_bytes)
+        with self._lock:
+            self._unindex_file((lang, path))
+            # Files too large to cache are not indexed either, as they would never hit
+            if key in self._entries:
+                self._files[(lang, path)] = (stat.st_mtime_ns, stat.st_size, key)
+                self._files_of.setdefault(key, set()).add((lang, path))
+        return parsed
+
+    def put(self, parsed: ParsedFile) -> ParsedFile:
+        return self._put(self._key_of(parsed.lang, parsed.content_bytes), parsed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._files.clear()
+            self._files_of.clear()
+            self._num_bytes = 0
+
+    def _get(self, key: _ParsedKey) -> Optional[ParsedFile]:
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+            return parsed
+
+    def _put(self, key: _ParsedKey, parsed: ParsedFile) -> ParsedFile:
+        with self._lock:
+            # Another thread might have parsed the same content in the meantime
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            # Files too large are never cached, otherwise they would evict all others
+            if parsed.approx_size > self.max_bytes:
+                return parsed
+            self._entries[key] = parsed
+            self._num_bytes += parsed.approx_size
+            while self._num_bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._num_bytes -= evicted.approx_size
+                for file_key in self._files_of.pop(evicted_key, ()):
+                    self._files.pop(file_key, None)
+            return parsed
+
+    def _unindex_file(self, file_key: _FileKey):
+        cached = self._files.pop(file_key, None)
+        if cached is not None:
+            files = self._files_of.get(cached[2])
+            if files is not None:
+                files.discard(file_key)
+                if not files:
+                    del self._files_of[cached[2]]
+
+    @staticmethod
+    def _key_of(lang: str, content_bytes: bytes) -> _ParsedKey:
+        return lang, hashlib.blake2b(content_bytes, digest_size=16).digest()
+
+
+_CACHE = ParsedFileCache()
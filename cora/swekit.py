@@ -16,6 +16,7 @@ from cora.base.rag import GeneratorBase
 from cora.base.repos import RepoTup
 from cora.llms.factory import LLMConfig
 from cora.options import ArgumentError
+from cora.preview.batch import precompute_previews
 from cora.repair import repair
 from cora.repair.events import IssueRepaCallbacks
 from cora.repo.repo import Repository
@@ -131,6 +132,7 @@ class SWEKit:
         num_thread: int,
         debug_mode: bool,
         log_dir: Optional[Path] = None,
+        precompute_previews: bool = False,
     ):
         self.dataset_id = dataset_id
         self.dataset_split = dataset_split
@@ -139,6 +141,7 @@ class SWEKit:
         self.num_proc = num_proc
         self.num_thread = num_thread
         self.debug_mode = debug_mode
+        self.precompute_previews = precompute_previews
         self.log_dir = log_dir
         self.console = get_boxed_console(
             box_title="SWE-kit",
@@ -174,12 +177,16 @@ class SWEKit:
             should_download_repo = False
         repo = Repository(RepoTup(repo_org, repo_name, repo_path))
         self.console.printb(f"The repository has been loaded into: {repo_path}")
+        includes = ["*.py"]  # We focus on Python for SWE-bench
+        if self.precompute_previews:
+            self.console.printb("Precomputing previews of all files in the repository")
+            precompute_previews(repo, includes=includes, num_procs=self.num_proc)
 
         # Create an RepoAgent to retrieve context and try resolving the issue
         agent = RepoAgent(
             name="SWE-kit",
             repo=repo,
-            includes=["*.py"],  # We focus on Python for SWE-bench
+            includes=includes,
             use_llm=self.use_llm,
             rewriter=IssueSummarizer(repo, use_llm=self.use_llm),
             generator=_Generator(self.dataset_id, self.dataset_split),
@@ -292,6 +299,7 @@ def main():
         num_thread=threads,
         log_dir=log_dir,
         debug_mode=verbose,
+        precompute_previews=options.parse_precompute(args),
     )
     swekit.run(
         instance,
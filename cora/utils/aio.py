@@ -0,0 +1,38 @@
+import asyncio
+from typing import Callable, Generic, TypeVar
+from weakref import WeakKeyDictionary
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """
+    An object lazily created once per event loop. Async clients pool connections that are
+    bound to the loop opening them, so they cannot be shared by different loops (e.g., by
+    successive asyncio.run() calls).
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._objects: WeakKeyDictionary[asyncio.AbstractEventLoop, T] = (
+            WeakKeyDictionary()
+        )
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        if loop not in self._objects:
+            self._objects[loop] = self.factory()
+        return self._objects[loop]
+
+
+async def gather_with_limit(coros: list, limit: int) -> list:
+    """Await all coroutines with at most limit (if positive) of them in flight at a time."""
+    if limit <= 0:
+        return await asyncio.gather(*coros)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*[run(c) for c in coros])
@@ -1,7 +1,8 @@
 import inspect
 from abc import abstractmethod
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Protocol, Dict, List, Optional
+from typing import Protocol, Dict, List, Optional, Callable, ContextManager, Any
 
 _EVENTS_CLASS_TEMPLATE = """\
 from enum import Enum, unique
@@ -63,8 +64,16 @@ def _inspect_args_in_dict(fn, *, is_method: bool, args: tuple, kwargs: dict):
 
 
 def hook_method_to_emit_events(
-    before_event: Optional[str] = None, after_event: Optional[str] = None
+    before_event: Optional[str] = None,
+    after_event: Optional[str] = None,
+    *,
+    around: Optional[Callable[[], ContextManager[Dict[str, Any]]]] = None,
 ):
+    """
+    Emit before_event and after_event around the method. If given, the method is run
+    within the context around() gives, whose dict is emitted together with after_event.
+    """
+
     def wrap_method(method):
         def _wrapper(self, *args, **kwargs):
             if before_event or after_event:
@@ -75,9 +84,10 @@ def hook_method_to_emit_events(
                 fn_args = {}
             if before_event:
                 self.emit(before_event, **fn_args)
-            res = method(self, *args, **kwargs)
+            with around() if around else nullcontext({}) as extras:
+                res = method(self, *args, **kwargs)
             if after_event:
-                self.emit(after_event, **fn_args, result=res)
+                self.emit(after_event, **fn_args, result=res, **extras)
             return res
 
         return _wrapper
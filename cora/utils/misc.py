@@ -1,7 +1,4 @@
 import pickle
-import random
-import time
-import traceback
 from collections import OrderedDict
 
 import joblib
@@ -12,25 +9,6 @@ class CannotReachHereError(RuntimeError):
         super().__init__(msg)
 
 
-# TODO: Consider using jd/tenacity
-def robust_call(retry=2, sleep=10):
-    def _robust_call(fn):
-        def _function(*args, **kwargs):
-            exception = None
-            for _ in range(retry):
-                try:
-                    return fn(*args, **kwargs)
-                except Exception as e:
-                    exception = e
-                    traceback.print_exc()
-                    time.sleep(random.randint(1, sleep))
-            raise exception
-
-        return _function
-
-    return _robust_call
-
-
 def to_bool(s):
     if isinstance(s, bool):
         return s
@@ -54,3 +32,8 @@ def load_object(path):
 
 def ordered_set(array: list) -> set:
     return OrderedDict.fromkeys([x for x in array])
+
+
+def estimate_num_tokens(text: str) -> int:
+    # A cheap (and slightly conservative) estimation: ~3 chars per token for code and paths
+    return (len(text) + 2) // 3
@@ -1,9 +1,15 @@
+import contextvars
 from typing import List, Tuple
 
 from joblib import Parallel, delayed
 
 
 def parallel(fn_and_args: List[Tuple[any, tuple]], n_jobs: int, backend="locky") -> any:
+    if backend == "threading":
+        # Let threads see the caller's context variables (e.g., the active usage meters)
+        return Parallel(n_jobs=n_jobs, backend=backend)(
+            delayed(contextvars.copy_context().run)(x[0], *x[1]) for x in fn_and_args
+        )
     return Parallel(n_jobs=n_jobs, backend=backend)(
         delayed(x[0])(*x[1]) for x in fn_and_args
     )
@@ -0,0 +1,220 @@
+"""
+Tests of FileTree: the heap-based collapsing is compared against the former linear scan
+on generated trees, and views, keep_only(), show_only_children_of(), and the budgeted
+rendering are checked on a small tree.
+"""
+
+import random
+from typing import List
+
+import pytest
+
+from cora.base.ftree import FileTree
+from cora.utils.misc import estimate_num_tokens
+
+
+def _tree_of(tree_str: str) -> FileTree:
+    file_tree = FileTree()
+    file_tree._parse_tree(tree_str)
+    return file_tree
+
+
+def _random_tree_str(rng: random.Random, max_depth: int = 4) -> str:
+    lines: List[str] = []
+
+    def add_dir(path: str, depth: int):
+        num_files = rng.choice([0, 0, 1, 2, 3, 5, 12])
+        num_dirs = rng.randint(0, 4) if depth < max_depth else 0
+        children = [("f", i) for i in range(num_files)]
+        children += [("d", i) for i in range(num_dirs)]
+        rng.shuffle(children)
+        for kind, i in children:
+            indent = "  " * depth
+            if kind == "f":
+                lines.append(f"{indent}file{i}.py")
+            else:
+                sub_path = f"{path}dir{i}/"
+                lines.append(f"{indent}{sub_path}")
+                add_dir(sub_path, depth + 1)
+
+    while not lines:
+        add_dir("", 0)
+    return "\n".join(lines)
+
+
+def _former_collapse_innermost_directories_until(file_tree: FileTree, size: int):
+    # The former linear scan, with ties broken by collapsing the lower line first
+    if file_tree.current_size() <= size:
+        return
+
+    def hide_node(n):
+        file_tree._hide_line(n.data)
+
+    tree_root = file_tree._as_tree(file_tree._shown_lines())
+    im_dir_nodes = []
+    while file_tree.current_size() > size:
+        if len(im_dir_nodes) == 0:
+            im_dir_nodes = set()
+            for node in tree_root.leaves():
+                if node.data.is_dir:
+                    im_dir_nodes.add(node)
+                elif node.parent:
+                    im_dir_nodes.add(node.parent)
+            im_dir_nodes = sorted(
+                im_dir_nodes,
+                key=lambda n: (
+                    n.data.num_indent * 1000000 - len(n.children),
+                    n.data.index,
+                ),
+            )
+        chosen_node = im_dir_nodes.pop()
+        chosen_node.accept(hide_node)
+        chosen_node.detach()
+
+
+def _shown_paths(file_tree: FileTree) -> List[str]:
+    return [line.full_path() for line in file_tree._shown_lines()]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_collapse_as_former_on_generated_trees(seed: int):
+    rng = random.Random(seed)
+    tree = _tree_of(_random_tree_str(rng))
+    sizes = sorted({0, 1, tree.complete_size() // 2, tree.complete_size()})
+    sizes += [rng.randrange(tree.complete_size() + 1) for _ in range(5)]
+    for size in sizes:
+        actual, expected = tree.view(), tree.view()
+        actual.collapse_innermost_directories_until(size)
+        _former_collapse_innermost_directories_until(expected, size)
+        assert _shown_paths(actual) == _shown_paths(expected), f"size {size}"
+        assert actual.current_size() == len(_shown_paths(actual))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_collapse_as_former_on_partially_shown_trees(seed: int):
+    rng = random.Random(seed)
+    tree = _tree_of(_random_tree_str(rng))
+    dirs = tree.find_files("*/", is_dir=True)
+    tree.show_only_children_of(rng.sample(dirs, min(3, len(dirs))) + ["/"])
+    size = tree.current_size() // 2
+    actual, expected = tree.view(), tree.view()
+    actual.collapse_innermost_directories_until(size)
+    _former_collapse_innermost_directories_until(expected, size)
+    assert _shown_paths(actual) == _shown_paths(expected)
+
+
+_SMALL_TREE = """
+README.md
+setup.py
+src/
+  src/app/
+    main.py
+    utils.py
+    src/app/core/
+      engine.py
+  src/lib/
+    helper.py
+docs/
+  index.md
+"""
+
+
+def test_views_have_their_own_visibility():
+    tree = _tree_of(_SMALL_TREE)
+    view = tree.view()
+    view.keep_only(["src/lib/"])
+    assert _shown_paths(view) == ["src/", "src/lib/", "src/lib/helper.py"]
+    assert view.current_size() == 3
+    assert tree.current_size() == tree.complete_size()
+    # A view of a view starts from the visibility of the latter
+    assert _shown_paths(view.view()) == _shown_paths(view)
+
+
+def test_keep_only_files_and_directories():
+    tree = _tree_of(_SMALL_TREE)
+    tree.keep_only(["setup.py", "src/app/core/"])
+    assert _shown_paths(tree) == [
+        "setup.py",
+        "src/",
+        "src/app/",
+        "src/app/core/",
+        "src/app/core/engine.py",
+    ]
+    # Lines hidden before are not kept again
+    tree.keep_only(["src/app/"])
+    assert _shown_paths(tree) == [
+        "src/",
+        "src/app/",
+        "src/app/core/",
+        "src/app/core/engine.py",
+    ]
+
+
+def test_keep_only_the_root_is_a_no_op():
+    tree = _tree_of(_SMALL_TREE)
+    tree.keep_only(["docs/"])
+    tree.keep_only(["/"])
+    assert _shown_paths(tree) == ["docs/", "docs/index.md"]
+
+
+def test_show_only_children_of():
+    tree = _tree_of(_SMALL_TREE)
+    tree.show_only_children_of(["src/app"])
+    assert _shown_paths(tree) == [
+        "src/",
+        "src/app/",
+        "src/app/main.py",
+        "src/app/utils.py",
+        "src/app/core/",
+    ]
+    tree.reset()
+    tree.show_only_children_of(["/"])
+    assert _shown_paths(tree) == ["README.md", "setup.py", "src/", "docs/"]
+
+
+def test_show_only_children_of_keeps_hidden_lines_hidden():
+    tree = _tree_of(_SMALL_TREE)
+    tree.keep_only(["src/app/main.py", "docs/"])
+    tree.show_only_children_of(["/", "src/app/"])
+    assert _shown_paths(tree) == ["src/", "src/app/", "src/app/main.py", "docs/"]
+
+
+def test_budgeted_str_is_full_when_fitting():
+    tree = _tree_of(_SMALL_TREE)
+    assert tree.to_budgeted_str(10000) == tree.to_str()
+
+
+def test_budgeted_str_counts_files_of_unexpanded_directories():
+    tree = _tree_of(_SMALL_TREE)
+    budget = estimate_num_tokens(tree.to_str()) - 5
+    rendered = tree.to_budgeted_str(budget)
+    assert estimate_num_tokens(rendered) <= budget
+    assert "(+" in rendered and " files)" in rendered
+
+
+# Top-level files of distinct extensions, such that they are not folded
+_WIDE_TREE = "\n".join(f"module_{i:03d}_with_a_long_name.e{i}" for i in range(60)) + (
+    "\nsrc/\n  src/a.py\n  src/b.py"
+)
+
+
+def test_budgeted_str_summarizes_top_level_entries_out_of_budget():
+    tree = _tree_of(_WIDE_TREE)
+    budget = 60
+    rendered = tree.to_budgeted_str(budget)
+    assert sum(estimate_num_tokens(l + "\n") for l in rendered.split("\n")) <= budget
+    lines = rendered.split("\n")
+    summary = lines[-1]
+    assert summary.startswith("(+") and summary.endswith(" more files)")
+    num_shown = sum(1 for l in lines[:-1] if l.startswith("module_"))
+    num_shown += 2 if "src/ (+2 files)" in lines or "  src/a.py" in lines else 0
+    assert num_shown + int(summary[2:].split()[0]) == 62
+
+
+def test_budgeted_str_keeps_entries_near_focus():
+    tree = _tree_of(
+        _WIDE_TREE + "".join(f"\npkg{i}/\n  pkg{i}/mod.py" for i in range(10))
+    )
+    assert "pkg9/ (+1 files)" not in tree.to_budgeted_str(40).split("\n")
+    rendered = tree.to_budgeted_str(40, focus_files=["pkg9/mod.py"])
+    assert "pkg9/ (+1 files)" in rendered.split("\n")
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+# The OpenAI client is created once imported, which requires a key even if never used
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Given the path and the JSON body of a POST, return the status, headers, and body to reply
+Handler = Callable[[str, dict], Tuple[int, Dict[str, str], bytes]]
+
+
+class LocalServer:
+    """An HTTP server on localhost, serving POSTs (in threads) by a handler"""
+
+    def __init__(self, handler: Handler):
+        self.handler = handler
+        self.requests: List[Tuple[str, dict]] = []
+        self.num_in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._request_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _request_handler(self):
+        server = self
+
+        class _RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server._lock:
+                    server.requests.append((self.path, body))
+                    server.num_in_flight += 1
+                    server.max_in_flight = max(
+                        server.max_in_flight, server.num_in_flight
+                    )
+                try:
+                    status, headers, content = server.handler(self.path, body)
+                finally:
+                    with server._lock:
+                        server.num_in_flight -= 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return _RequestHandler
+
+
+@pytest.fixture
+def local_server():
+    servers = []
+
+    def start(handler: Handler) -> LocalServer:
+        server = LocalServer(handler)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
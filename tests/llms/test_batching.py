@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from cora.llms.batching import MicroBatcher
+
+
+class _Backend:
+    """Process batches into results, holding the first batch until released"""
+
+    def __init__(self, fn=lambda items: [f"done {i}" for i in items]):
+        self.fn = fn
+        self.batches: List[list] = []
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, items: list) -> list:
+        self.batches.append(items)
+        self.started.set()
+        self.released.wait(timeout=5)
+        return self.fn(items)
+
+
+def _submit_while_busy(batcher: MicroBatcher, backend: _Backend, items, keys) -> list:
+    """Submit the items while the first batch is being processed, so they all queue up"""
+    with ThreadPoolExecutor(len(items) + 1) as pool:
+        first = pool.submit(batcher.submit, "first")
+        assert backend.started.wait(timeout=5)
+        futures = [pool.submit(batcher.submit, i, k) for i, k in zip(items, keys)]
+        deadline = time.monotonic() + 5
+        while batcher._queue.qsize() < len(items) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        backend.released.set()
+        assert first.result(timeout=5) == "done first"
+        return [f.result(timeout=5) for f in futures]
+
+
+def test_batch_items_by_key():
+    backend = _Backend()
+    batcher = MicroBatcher(backend, max_size=8, wait_seconds=0.01)
+    items = list(range(6))
+    keys = ["a", "b", "a", "b", "a", "b"]
+    results = _submit_while_busy(batcher, backend, items, keys)
+    assert results == [f"done {i}" for i in items]
+    # Callers (and thus keys) are not ordered, as they queue up from threads
+    assert backend.batches[0] == ["first"]
+    assert sorted(sorted(b) for b in backend.batches[1:]) == [[0, 2, 4], [1, 3, 5]]
+
+
+def test_batch_at_most_max_size_items():
+    backend = _Backend()
+    batcher = MicroBatcher(backend, max_size=3, wait_seconds=0.01)
+    items = list(range(7))
+    results = _submit_while_busy(batcher, backend, items, [None] * len(items))
+    assert results == [f"done {i}" for i in items]
+    assert [len(b) for b in backend.batches] == [1, 3, 3, 1]
+    assert sorted(i for b in backend.batches[1:] for i in b) == items
+
+
+def test_propagate_exceptions_to_every_caller():
+    def fail(items):
+        if "first" not in items:
+            raise ConnectionError("backend is down")
+        return [f"done {i}" for i in items]
+
+    backend = _Backend(fail)
+    batcher = MicroBatcher(backend, max_size=8, wait_seconds=0.01)
+    with pytest.raises(ConnectionError, match="backend is down"):
+        _submit_while_busy(batcher, backend, [0, 1, 2], [None] * 3)
+    assert sorted(backend.batches[1]) == [0, 1, 2]
+    # The batcher keeps serving after failures
+    assert batcher.submit("first") == "done first"
+
+
+@pytest.mark.parametrize("num_results", [0, 2, 4])
+def test_fail_every_caller_on_results_of_a_wrong_length(num_results: int):
+    backend = _Backend(lambda items: ["result"] * num_results)
+    backend.released.set()
+    batcher = MicroBatcher(backend, max_size=3, wait_seconds=5)
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(batcher.submit, i) for i in range(3)]
+        for f in futures:
+            with pytest.raises(ValueError, match="batch of 3 items"):
+                f.result(timeout=5)
+    assert [sorted(b) for b in backend.batches] == [[0, 1, 2]]
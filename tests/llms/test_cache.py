@@ -0,0 +1,172 @@
+from argparse import Namespace
+from typing import List, Optional
+
+import pytest
+
+from cora.config import CoraConfig
+from cora.llms import base, cache
+from cora.llms.base import LLMBase, ChatMessage
+from cora.llms.cache import (
+    ResponseCache,
+    CACHE_MODE_OFF,
+    CACHE_MODE_READ_ONLY,
+    CACHE_MODE_READ_WRITE,
+)
+from cora.llms.factory import LLMFactory, LLMConfig
+from cora.options import ArgumentError, parse_llms
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def _cache_in(tmp_path, max_bytes: int = 1 << 20, ttl_seconds: float = 60):
+    return ResponseCache(
+        tmp_path / "responses.sqlite", max_bytes=max_bytes, ttl_seconds=ttl_seconds
+    )
+
+
+class _EchoLLM(LLMBase):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.model = "echo"
+        self.num_calls = 0
+
+    def do_complete(
+        self, messages: List[ChatMessage], *, response_schema: Optional[dict] = None
+    ) -> str:
+        self.num_calls += 1
+        return f"echo: {messages[-1].content}"
+
+    async def do_acomplete(self, messages, *, response_schema=None) -> str:
+        return self.do_complete(messages, response_schema=response_schema)
+
+    def do_stream(self, messages, *, response_schema=None):
+        yield self.do_complete(messages, response_schema=response_schema)
+
+    async def do_astream(self, messages, *, response_schema=None):
+        yield self.do_complete(messages, response_schema=response_schema)
+
+
+def test_key_is_stable():
+    key = ResponseCache.key_of(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert key == ResponseCache.key_of(
+        messages=[{"content": "hi", "role": "user"}], model="m"
+    )
+    assert len(key) == 64
+    assert key != ResponseCache.key_of(
+        model="m", messages=[{"role": "user", "content": "hi!"}]
+    )
+    assert key != ResponseCache.key_of(
+        model="n", messages=[{"role": "user", "content": "hi"}]
+    )
+
+
+def test_llm_keys_depend_on_sampling_and_schema():
+    messages = [ChatMessage(role="user", content="hi")]
+    key = _EchoLLM()._cache_key(messages, None)
+    assert _EchoLLM()._cache_key(messages, None) == key
+    assert _EchoLLM(max_tokens=10)._cache_key(messages, None) != key
+    assert _EchoLLM()._cache_key(messages, None, {"type": "object"}) != key
+
+
+def test_hit_and_miss(tmp_path, clock):
+    rc = _cache_in(tmp_path)
+    assert rc.get("k") is None
+    rc.put("k", "response")
+    assert rc.get("k") == "response"
+    assert (rc.num_hits, rc.num_misses, rc.num_writes) == (1, 1, 1)
+    # Responses survive across processes
+    assert _cache_in(tmp_path).get("k") == "response"
+
+
+def test_expired_responses_are_never_reused(tmp_path, clock):
+    rc = _cache_in(tmp_path, ttl_seconds=60)
+    rc.put("k", "response")
+    clock.now += 59
+    assert rc.get("k") == "response"
+    clock.now += 2
+    assert rc.get("k") is None
+    assert rc.stats()["entries"] == 0
+
+
+def test_least_recently_used_responses_are_evicted_by_size(tmp_path, clock):
+    rc = _cache_in(tmp_path, max_bytes=30)
+    for key in ["a", "b", "c"]:
+        rc.put(key, key * 10)
+        clock.now += 1
+    assert rc.get("a") == "a" * 10
+    clock.now += 1
+    # Adding one more exceeds the size, evicting "b" which is accessed least recently
+    rc.put("d", "d" * 10)
+    assert rc.get("b") is None
+    assert [rc.get(key) for key in ["a", "c", "d"]] == ["a" * 10, "c" * 10, "d" * 10]
+    assert rc.num_evictions == 1
+    assert rc.stats()["bytes"] <= 30
+
+
+def test_read_only_mode_does_not_write(tmp_path, monkeypatch):
+    rc = _cache_in(tmp_path)
+    monkeypatch.setattr(base, "get_response_cache", lambda: rc)
+    messages = [ChatMessage(role="user", content="hi")]
+
+    llm = _EchoLLM(cache_mode=CACHE_MODE_READ_ONLY)
+    assert llm.complete(messages) == "echo: hi"
+    assert llm.complete(messages) == "echo: hi"
+    assert llm.num_calls == 2
+    assert rc.num_writes == 0
+
+    # Responses saved by others are reused though
+    writer = _EchoLLM(cache_mode=CACHE_MODE_READ_WRITE)
+    writer.complete(messages)
+    assert rc.num_writes == 1
+    assert llm.complete(messages) == "echo: hi"
+    assert llm.num_calls == 2
+
+
+def test_sampled_responses_are_not_cached(tmp_path, monkeypatch):
+    rc = _cache_in(tmp_path)
+    monkeypatch.setattr(base, "get_response_cache", lambda: rc)
+    llm = _EchoLLM(cache_mode=CACHE_MODE_READ_WRITE, temperature=0.7)
+    llm.complete([ChatMessage(role="user", content="hi")])
+    assert rc.num_writes == 0 and rc.num_misses == 0
+
+
+def test_creating_a_cached_llm_requires_a_cache_directory(monkeypatch):
+    monkeypatch.setattr(cache, "_CACHE", None)
+    monkeypatch.setattr(CoraConfig, "get", classmethod(lambda cls, name: None))
+    with pytest.raises(ValueError, match="CACHE_DIRECTORY_PATH"):
+        LLMFactory.create(
+            LLMConfig(provider="ollama", llm_name="m", cache_mode=CACHE_MODE_READ_WRITE)
+        )
+
+
+def test_cli_rejects_a_cache_without_directory(monkeypatch):
+    monkeypatch.setattr(CoraConfig, "get", classmethod(lambda cls, name: None))
+    args = Namespace(
+        model="openai:gpt-4o",
+        verbose=False,
+        model_temperature=0,
+        model_top_k=50,
+        model_top_p=0.95,
+        model_max_tokens=1024,
+        llm_cache=CACHE_MODE_READ_ONLY,
+        llm_stream_json=False,
+        llm_stop_at_decisions=False,
+        llm_constrain_json=False,
+    )
+    with pytest.raises(ArgumentError, match="CACHE_DIRECTORY_PATH"):
+        parse_llms(args)
+    args.llm_cache = CACHE_MODE_OFF
+    assert parse_llms(args).cache_mode == CACHE_MODE_OFF
@@ -0,0 +1,150 @@
+"""
+Calls to EasyDeploy against a local endpoint: single requests are POSTed as they are, and
+concurrent ones (without schemas) are POSTed as an array answered in the same order.
+"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import httpx
+import pytest
+
+from cora.config import CoraConfig
+from cora.llms import easydeploy_
+from cora.llms.easydeploy_ import call_easydeploy, acall_easydeploy
+
+
+def _completion_of(request: dict) -> dict:
+    return {
+        "choices": [
+            {
+                "message": {
+                    "role": "assistant",
+                    "content": request["messages"][-1]["content"],
+                }
+            }
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+    }
+
+
+class _Endpoint:
+    """Echo the last message of each request, failing requests (or arrays) as asked"""
+
+    def __init__(self):
+        self.accept_arrays = True
+        self.drop_completions = 0
+
+    def __call__(self, path: str, body) -> Tuple[int, Dict[str, str], bytes]:
+        headers = {"Content-Type": "application/json"}
+        requests = body if isinstance(body, list) else [body]
+        if (isinstance(body, list) and not self.accept_arrays) or any(
+            "fail-me" in r["messages"][-1]["content"] for r in requests
+        ):
+            return 400, headers, b'{"error": "bad request"}'
+        if isinstance(body, dict):
+            return 200, headers, json.dumps(_completion_of(body)).encode()
+        completions = [_completion_of(r) for r in body]
+        return 200, headers, json.dumps(completions[self.drop_completions :]).encode()
+
+
+@pytest.fixture
+def endpoint(local_server, monkeypatch):
+    handler = _Endpoint()
+    server = local_server(handler)
+    server.handler_ = handler
+    monkeypatch.setitem(CoraConfig._additional_envs_, "EASYDEPLOY_ENDPOINT", server.url)
+    # Clients and batchers of their own, so that no connections are reused across servers
+    monkeypatch.setattr(easydeploy_, "_client", None)
+    monkeypatch.setattr(easydeploy_, "_batcher", None)
+    monkeypatch.setattr(CoraConfig, "EASYDEPLOY_BATCH_WAIT_SECONDS", 0.05)
+    yield server
+    easydeploy_.reset_client()
+
+
+def _call(content: str, response_schema=None) -> str:
+    return call_easydeploy(
+        "test-model",
+        [{"role": "user", "content": content}],
+        temperature=0,
+        top_p=1,
+        max_tokens=16,
+        response_schema=response_schema,
+    )
+
+
+def _call_concurrently(contents: List[str]) -> list:
+    with ThreadPoolExecutor(len(contents)) as pool:
+        futures = [pool.submit(_call, c) for c in contents]
+        return [f.exception() or f.result() for f in futures]
+
+
+def test_single_post(endpoint):
+    assert _call("hello") == "hello"
+    ((path, body),) = endpoint.requests
+    assert isinstance(body, dict)
+    assert body["model"] == "test-model"
+    assert body["messages"] == [{"role": "user", "content": "hello"}]
+
+
+def test_single_async_post(endpoint):
+    response = asyncio.run(
+        acall_easydeploy(
+            "test-model",
+            [{"role": "user", "content": "hello"}],
+            temperature=0,
+            top_p=1,
+            max_tokens=16,
+        )
+    )
+    assert response == "hello"
+    assert isinstance(endpoint.requests[0][1], dict)
+
+
+def test_batched_post_keeps_order(endpoint, monkeypatch):
+    monkeypatch.setattr(CoraConfig, "EASYDEPLOY_MAX_BATCH_SIZE", 8)
+    contents = [f"call {i}" for i in range(6)]
+    assert _call_concurrently(contents) == contents
+    bodies = [body for _, body in endpoint.requests]
+    assert all(isinstance(b, list) for b in bodies)
+    assert sum(len(b) for b in bodies) == len(contents)
+    assert len(bodies) < len(contents)
+
+
+def test_batch_of_wrong_length_raises(endpoint, monkeypatch):
+    monkeypatch.setattr(CoraConfig, "EASYDEPLOY_MAX_BATCH_SIZE", 8)
+    endpoint.handler_.drop_completions = 1
+    results = _call_concurrently(["call 0", "call 1", "call 2"])
+    assert all(isinstance(r, ValueError) for r in results)
+    assert all("completions in the batch" in str(r) for r in results)
+
+
+def test_requests_with_schemas_are_not_batched(endpoint, monkeypatch):
+    monkeypatch.setattr(CoraConfig, "EASYDEPLOY_MAX_BATCH_SIZE", 8)
+    schema = {"type": "object", "properties": {"score": {"type": "integer"}}}
+    assert _call("hello", response_schema=schema) == "hello"
+    ((_, body),) = endpoint.requests
+    assert isinstance(body, dict)
+    assert body["response_format"]["json_schema"]["schema"] == schema
+
+
+def test_failed_batch_is_retried_one_by_one(endpoint, monkeypatch):
+    monkeypatch.setattr(CoraConfig, "EASYDEPLOY_MAX_BATCH_SIZE", 8)
+    contents = ["call 0", "call 1 fail-me", "call 2"]
+    results = _call_concurrently(contents)
+    # Only the caller of the bad request fails
+    assert results[0] == "call 0" and results[2] == "call 2"
+    assert isinstance(results[1], httpx.HTTPStatusError)
+    assert results[1].response.status_code == 400
+    bodies = [body for _, body in endpoint.requests]
+    assert any(isinstance(b, list) and len(b) > 1 for b in bodies)
+    assert any(isinstance(b, dict) and "fail-me" in json.dumps(b) for b in bodies)
+
+
+def test_endpoints_rejecting_arrays_are_called_one_by_one(endpoint, monkeypatch):
+    monkeypatch.setattr(CoraConfig, "EASYDEPLOY_MAX_BATCH_SIZE", 8)
+    endpoint.handler_.accept_arrays = False
+    contents = [f"call {i}" for i in range(4)]
+    assert _call_concurrently(contents) == contents
@@ -0,0 +1,194 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from cora.llms import limiter
+from cora.llms.limiter import RateLimiter, TokenBucket, classify_error
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(limiter.time, "sleep", clock.sleep)
+    # Full jitter always waits the longest, such that delays are deterministic
+    monkeypatch.setattr(limiter.random, "uniform", lambda low, high: high)
+    return clock
+
+
+class _Response:
+    def __init__(self, status_code: int, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = _Response(status_code, headers)
+
+
+def _failing(errors: List[Exception], result="ok"):
+    calls = []
+
+    def fn():
+        calls.append(len(calls))
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+def test_classify_error():
+    assert classify_error(_StatusError(429)) == (True, 0.0)
+    assert classify_error(_StatusError(503)) == (True, 0.0)
+    assert classify_error(_StatusError(500)) == (False, 0.0)
+    assert classify_error(_StatusError(429, {"retry-after": "2.5"})) == (True, 2.5)
+    assert classify_error(_StatusError(400)) is None
+    assert classify_error(ValueError("no status")) is None
+
+
+def test_retry_with_exponential_backoff(clock):
+    rl = RateLimiter(max_retries=4, base_delay=1.0, max_delay=5.0)
+    fn = _failing([_StatusError(500)] * 4)
+    assert rl.call(fn) == "ok"
+    assert len(fn.calls) == 5
+    assert clock.sleeps == [1.0, 2.0, 4.0, 5.0]
+    assert rl.stats()["retries"] == 4
+    assert rl.stats()["in_flight"] == 0
+
+
+def test_raise_once_retries_are_exhausted(clock):
+    rl = RateLimiter(max_retries=2, base_delay=0.5)
+    fn = _failing([_StatusError(500)] * 3)
+    with pytest.raises(_StatusError):
+        rl.call(fn)
+    assert len(fn.calls) == 3
+    assert rl.stats()["in_flight"] == 0
+
+
+def test_never_retry_bad_requests(clock):
+    rl = RateLimiter(max_retries=3)
+    fn = _failing([_StatusError(400)])
+    with pytest.raises(_StatusError):
+        rl.call(fn)
+    assert len(fn.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_honor_retry_after(clock):
+    rl = RateLimiter(base_delay=0.1)
+    fn = _failing([_StatusError(429, {"retry-after": "7"})])
+    assert rl.call(fn) == "ok"
+    assert clock.sleeps == [7.0]
+    assert rl.stats()["rate_limited"] == 1
+
+
+def test_honor_retry_after_asynchronously(clock, monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(limiter.asyncio, "sleep", sleep)
+    rl = RateLimiter(base_delay=0.1)
+    fn = _failing([_StatusError(429, {"retry-after": "3"}), _StatusError(502)])
+
+    async def afn():
+        return fn()
+
+    assert asyncio.run(rl.acall(afn)) == "ok"
+    assert sleeps == [3.0, 0.2]
+
+
+def test_decrease_concurrency_once_per_burst(clock):
+    rl = RateLimiter(max_concurrency=16)
+    rl.concurrency = 8.0
+    # A burst of eight calls sent at the same time are all rate limited
+    for _ in range(8):
+        assert rl._try_acquire(0) == 0
+    started = clock.now
+    clock.now += 1
+    for _ in range(8):
+        rl._on_failure(_StatusError(429), started, attempt=0)
+    assert rl.concurrency == 4.0
+    assert not rl.slow_start
+    # Calls sent after the decrease decrease it again
+    assert rl._try_acquire(0) == 0
+    started = clock.now
+    clock.now += 1
+    rl._on_failure(_StatusError(429), started, attempt=0)
+    assert rl.concurrency == 1.0  # Halved from the calls in flight, never below one
+
+
+def test_increase_concurrency_when_limited_by_it(clock):
+    rl = RateLimiter(max_concurrency=6)
+    assert rl.concurrency == 4
+    for _ in range(4):
+        rl._try_acquire(0)
+    # Slow start: +1 per successful call sent at the full concurrency
+    rl._on_success()
+    assert rl.concurrency == 5
+    assert rl._try_acquire(0) == 0
+    assert rl._try_acquire(0) == 0
+    rl._on_success()
+    rl._on_success()
+    assert rl.concurrency == 6  # Bounded by max_concurrency
+    assert rl._try_acquire(0) == 0
+    # Calls not limited by the concurrency do not grow it
+    rl.concurrency, rl.num_in_flight = 6.0, 1
+    rl._on_success()
+    assert rl.concurrency == 6.0
+
+
+def test_wait_for_a_free_slot(clock):
+    rl = RateLimiter(max_concurrency=1)
+    assert rl._try_acquire(0) == 0
+    assert rl._try_acquire(0) == limiter._SLOT_POLLING_SECONDS
+    rl._on_success()
+    assert rl._try_acquire(0) == 0
+
+
+def test_token_bucket_debt(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time() == 0
+    # Taking more than the capacity is allowed, but only the capacity is taken
+    bucket.take(1000)
+    assert bucket.wait_time() == 0
+    bucket.take(30)
+    assert bucket.wait_time() == pytest.approx(30)
+    clock.now += 10
+    assert bucket.wait_time() == pytest.approx(20)
+    clock.now += 20
+    assert bucket.wait_time() == 0
+    # The bucket never refills beyond its capacity
+    clock.now += 3600
+    bucket.wait_time()
+    assert bucket.level == 60
+
+
+def test_wait_for_tokens_per_minute(clock):
+    rl = RateLimiter(tokens_per_minute=600)
+    assert rl._try_acquire(600) == 0
+    rl._on_success()
+    assert rl._try_acquire(300) == 0
+    rl._on_success()
+    # The bucket is in debt by 300 tokens, refilled in 30 seconds
+    assert rl.call(lambda: "ok", num_tokens=10) == "ok"
+    assert clock.sleeps == [pytest.approx(30)]
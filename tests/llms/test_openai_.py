@@ -0,0 +1,210 @@
+"""
+Async queries of the OpenAI backend against a local OpenAI-compatible server: concurrent
+aquery()/arun() calls get their own responses, retry rate-limited calls, and chat in
+conversations of their own.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import openai
+import pytest
+
+from cora.agents.base import AgentBase
+from cora.config import CoraConfig
+from cora.llms import base, openai_
+from cora.llms.limiter import RateLimiter
+from cora.llms.openai_ import OpenAI
+from cora.utils.aio import LoopLocal
+
+_JSON_SCHEMA = '{"echo": "the query"}'
+
+
+class _CompatibleServer:
+    """Reply the last message as JSON, being slow, rate limited, or malformed as asked"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.rate_limited = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, path: str, body: dict) -> Tuple[int, Dict[str, str], bytes]:
+        assert path == "/v1/chat/completions"
+        time.sleep(self.latency)
+        query = body["messages"][-1]["content"]
+        if "rate-limit-me" in query:
+            with self._lock:
+                if query not in self.rate_limited:
+                    self.rate_limited.add(query)
+                    error = {"error": {"message": "Slow down", "type": "rate_limit"}}
+                    return 429, {"Retry-After": "0"}, json.dumps(error).encode()
+        if "malform-me" in query and len(body["messages"]) == 1:
+            content = '{"echo": '
+        else:
+            first_query = body["messages"][0]["content"].split("## ")[0]
+            content = json.dumps(
+                {"echo": first_query, "num_messages": len(body["messages"])}
+            )
+        if body.get("stream"):
+            return 200, {"Content-Type": "text/event-stream"}, _sse_of(content)
+        return (
+            200,
+            {"Content-Type": "application/json"},
+            json.dumps(
+                {
+                    "id": "chatcmpl-test",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 10,
+                        "completion_tokens": 5,
+                        "total_tokens": 15,
+                    },
+                }
+            ).encode(),
+        )
+
+
+def _sse_of(content: str) -> bytes:
+    def chunk(choices, usage=None):
+        return {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "test",
+            "choices": choices,
+            "usage": usage,
+        }
+
+    events = [
+        chunk([{"index": 0, "delta": {"content": content[i : i + 4]}}])
+        for i in range(0, len(content), 4)
+    ]
+    events.append(
+        chunk([], {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})
+    )
+    data = [json.dumps(e) for e in events] + ["[DONE]"]
+    return "".join(f"data: {d}\n\n" for d in data).encode()
+
+
+class _EchoAgent(AgentBase):
+    def __init__(self, llm, response_schema: Optional[dict] = None):
+        super().__init__(llm, _JSON_SCHEMA, response_schema=response_schema)
+
+    def _check_response_format(
+        self, response: dict, *args, **kwargs
+    ) -> Tuple[bool, Optional[str]]:
+        if "echo" not in response:
+            return False, "'echo' is missing in the JSON object"
+        return True, None
+
+
+@pytest.fixture
+def server(local_server, monkeypatch):
+    handler = _CompatibleServer()
+    server = local_server(handler)
+    base_url = f"{server.url}/v1"
+    monkeypatch.setattr(
+        openai_, "_client", openai.OpenAI(base_url=base_url, max_retries=0)
+    )
+    monkeypatch.setattr(
+        openai_,
+        "_async_client",
+        LoopLocal(lambda: openai.AsyncOpenAI(base_url=base_url, max_retries=0)),
+    )
+    # A limiter of its own, retrying quickly
+    limiter = RateLimiter(max_concurrency=8, base_delay=0.01)
+    monkeypatch.setattr(base, "get_rate_limiter", lambda *_: limiter)
+    server.limiter = limiter
+    return server
+
+
+def test_concurrent_aqueries(server):
+    llm = OpenAI("test-model")
+
+    async def query(i: int) -> str:
+        conv = llm.new_conversation()
+        conv.append_user_message(f"query {i}")
+        return await llm.aquery(conv)
+
+    async def main():
+        return await asyncio.gather(*[query(i) for i in range(12)])
+
+    responses = asyncio.run(main())
+    assert [json.loads(r)["echo"] for r in responses] == [
+        f"query {i}" for i in range(12)
+    ]
+    assert server.max_in_flight > 1
+
+
+def test_rate_limited_aqueries_are_retried(server):
+    llm = OpenAI("test-model")
+
+    async def query(text: str) -> str:
+        conv = llm.new_conversation()
+        conv.append_user_message(text)
+        return await llm.aquery(conv)
+
+    async def main():
+        return await asyncio.gather(
+            query("rate-limit-me 1"), query("query 2"), query("rate-limit-me 3")
+        )
+
+    responses = asyncio.run(main())
+    assert [json.loads(r)["echo"] for r in responses] == [
+        "rate-limit-me 1",
+        "query 2",
+        "rate-limit-me 3",
+    ]
+    assert len(server.requests) == 5
+    assert server.limiter.stats()["rate_limited"] == 2
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["complete", "stream"])
+def test_concurrent_aruns_chat_separately(server, monkeypatch, stream: bool):
+    monkeypatch.setattr(CoraConfig, "LLM_STREAM_JSON_RESPONSES", stream)
+    agent = _EchoAgent(OpenAI("test-model"))
+    queries = [
+        "task 0",
+        "task 1 malform-me",
+        "task 2 rate-limit-me",
+        "task 3",
+        "task 4 malform-me",
+    ]
+
+    async def main():
+        return await asyncio.gather(*[agent.arun(q) for q in queries])
+
+    results = asyncio.run(main())
+    # A malformed response is repaired in its own conversation, not in others'
+    assert [r["echo"] for r in results] == queries
+    assert [r["num_messages"] for r in results] == [1, 3, 1, 1, 3]
+    assert all(b.get("stream", False) == stream for _, b in server.requests)
+
+
+def test_sync_and_async_runs_agree(server):
+    agent = _EchoAgent(OpenAI("test-model"))
+    assert agent.run("task") == asyncio.run(agent.arun("task"))
+
+
+def test_constrain_responses_only_when_turned_on(server, monkeypatch):
+    schema = {"type": "object", "properties": {"echo": {"type": "string"}}}
+    agent = _EchoAgent(OpenAI("test-model"), response_schema=schema)
+    monkeypatch.delenv("LLM_CONSTRAIN_JSON_RESPONSES", raising=False)
+    assert agent.run("task")["echo"] == "task"
+    assert "response_format" not in server.requests[-1][1]
+    monkeypatch.setenv("LLM_CONSTRAIN_JSON_RESPONSES", "1")
+    assert agent.run("task")["echo"] == "task"
+    response_format = server.requests[-1][1]["response_format"]
+    assert response_format["type"] == "json_schema"
@@ -0,0 +1,118 @@
+from typing import List, Optional
+
+import pyjson5 as json5
+import pytest
+
+from cora.config import CoraConfig
+from cora.llms.stream import JSONStop, JSONStreamScanner
+
+
+def _scan(
+    response: str, decision_fields: Optional[List[str]] = None, chunk_size: int = 1
+) -> JSONStreamScanner:
+    scanner = JSONStop(decision_fields=decision_fields).scanner()
+    for i in range(0, len(response), chunk_size):
+        if scanner.feed(response[i : i + chunk_size]):
+            break
+    return scanner
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        ('{"a": 1} and more', '{"a": 1}'),
+        ('Sure, here it is: {"a": 1}\nDone.', 'Sure, here it is: {"a": 1}'),
+        ('{"a": "}{", "b": "]"} {"c": 3}', '{"a": "}{", "b": "]"}'),
+        ('{"a": "say \\"}\\" \\\\"} x', '{"a": "say \\"}\\" \\\\"}'),
+        ("{'a': '}'} x", "{'a': '}'}"),
+        (
+            '{// the answer }\n"a": 1 /* is } */} x',
+            '{// the answer }\n"a": 1 /* is } */}',
+        ),
+        (
+            '{"a": {"b": [1, {"c": "}"}]}, "d": [[]]} x',
+            '{"a": {"b": [1, {"c": "}"}]}, "d": [[]]}',
+        ),
+        ("{a: 1, $b_2: [3]} x", "{a: 1, $b_2: [3]}"),
+    ],
+    ids=[
+        "trailing",
+        "preceding",
+        "braces-in-strings",
+        "escapes",
+        "single-quotes",
+        "comments",
+        "nested",
+        "unquoted-keys",
+    ],
+)
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_stop_once_the_object_closes(response: str, expected: str, chunk_size: int):
+    scanner = _scan(response, chunk_size=chunk_size)
+    assert scanner.done and not scanner.stopped_at_decision
+    assert scanner.text == expected
+
+
+def test_wait_for_the_object_to_close():
+    scanner = JSONStreamScanner()
+    assert not scanner.feed('I think {"a": "}",')
+    assert not scanner.feed(' "b": {"c": 1}')
+    assert scanner.text == 'I think {"a": "}", "b": {"c": 1}'
+    assert scanner.feed("} ignored")
+    assert scanner.feed("more is ignored")
+    assert scanner.text == 'I think {"a": "}", "b": {"c": 1}}'
+
+
+@pytest.mark.parametrize(
+    "response, fields, expected",
+    [
+        ('{"score": 3, "reason": "long"}', ["score"], '{"score": 3}'),
+        ("{score: 3, reason: 'long'}", ["score"], "{score: 3}"),
+        (
+            '{"score": [1, {"x": ","}], "reason": "long"}',
+            ["score"],
+            '{"score": [1, {"x": ","}]}',
+        ),
+        (
+            '{"is_relevant": true, // yes,\n "score": 2, "reason": "long"}',
+            ["is_relevant", "score"],
+            '{"is_relevant": true, // yes,\n "score": 2}',
+        ),
+        (
+            '{"score, reason": 1, "score": 2, "reason": "long"}',
+            ["score"],
+            '{"score, reason": 1, "score": 2}',
+        ),
+    ],
+    ids=["quoted-keys", "unquoted-keys", "nested-value", "comments", "key-with-comma"],
+)
+@pytest.mark.parametrize("chunk_size", [1, 4, 1000])
+def test_stop_right_after_decision_fields(
+    response: str, fields: List[str], expected: str, chunk_size: int
+):
+    scanner = _scan(response, fields, chunk_size=chunk_size)
+    assert scanner.done and scanner.stopped_at_decision
+    assert scanner.text == expected
+    assert "reason" not in json5.loads(scanner.text)
+
+
+def test_do_not_stop_before_all_decision_fields_are_given():
+    response = '{"reason": "long", "score": 3} x'
+    scanner = _scan(response, ["score"])
+    assert scanner.done and not scanner.stopped_at_decision
+    assert scanner.text == '{"reason": "long", "score": 3}'
+    # Fields of nested objects are not top-level decisions
+    scanner = _scan('{"a": {"score": 1, "b": 2}, "reason": "c"}', ["score"])
+    assert not scanner.stopped_at_decision
+
+
+def test_streaming_is_off_unless_turned_on(monkeypatch):
+    monkeypatch.delenv("LLM_STREAM_JSON_RESPONSES", raising=False)
+    assert not CoraConfig.llm_stream_json_responses()
+    monkeypatch.setenv("LLM_STREAM_JSON_RESPONSES", "1")
+    assert CoraConfig.llm_stream_json_responses()
+    monkeypatch.setenv("LLM_STREAM_JSON_RESPONSES", "0")
+    monkeypatch.setattr(
+        CoraConfig, "LLM_STREAM_JSON_RESPONSES", True
+    )  # --llm-stream-json
+    assert CoraConfig.llm_stream_json_responses()
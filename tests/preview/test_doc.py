@@ -0,0 +1,37 @@
+from cora.preview.doc import PreviewDoc
+
+_PYTHON_FILE = """\
+import os
+
+
+class Finder:
+    def find(self, path):
+        return os.listdir(path)
+
+
+def main():
+    Finder().find(".")
+"""
+
+# Paragraphs of at most 3 lines are previewed in full, each line with its line number
+_TEXT_FILE = "".join(f"line {i}\n" if i % 3 else "\n" for i in range(10))
+
+
+def test_render_python_preview_without_line_numbers():
+    doc = PreviewDoc.of("finder.py", _PYTHON_FILE)
+    assert "class Finder:" in doc.preview
+    # Hidden lines cannot be located, so the full preview is kept rather than nothing
+    assert doc.render([]) == doc.preview
+    assert doc.render([(3, 6)]) == doc.preview
+
+
+def test_render_text_preview_with_hidden_lines():
+    doc = PreviewDoc.of("lines.txt", _TEXT_FILE)
+    assert doc.render([]) == doc.preview
+    rendered = doc.render([(2, 5), (7, 8)])
+    for i in [1, 5, 8]:
+        assert f"{i} | line {i}" in rendered
+    for i in [2, 4, 7]:
+        assert f"line {i}" not in rendered
+    assert "(lines 2-4 are hidden in preview)" in rendered
+    assert "(lines 7-7 are hidden in preview)" in rendered
@@ -0,0 +1,95 @@
+from cora.preview import FilePreview
+from cora.preview.store import PreviewStore
+
+_C_FILE = """\
+int add(int a, int b) {
+    return a + b;
+}
+"""
+
+
+class _CountingPreviewer:
+    def __init__(self, file_content: str, setting: int = 0):
+        self.file_content = file_content
+        self.setting = setting
+        self.num_previews = 0
+        self.num_budgeted_previews = 0
+
+    def cache_key(self) -> str:
+        return f"Counting(setting={self.setting})"
+
+    def get_preview(self) -> str:
+        self.num_previews += 1
+        return self.file_content
+
+    def get_preview_within(self, token_budget: int) -> str:
+        self.num_budgeted_previews += 1
+        return self.file_content[: token_budget * 3]
+
+
+def test_memory_hit():
+    store = PreviewStore()
+    previewer = _CountingPreviewer("x" * 30)
+    assert store.get_or_preview(previewer) == "x" * 30
+    assert store.get_or_preview(previewer) == "x" * 30
+    assert previewer.num_previews == 1
+
+
+def test_disk_hit(tmp_path):
+    content = "a preview surviving across processes\n" * 3
+    store = PreviewStore(cache_dir=tmp_path)
+    assert store.get_or_preview(_CountingPreviewer(content)) == content
+    # A fresh store (as of another process) loads the preview from disk
+    previewer = _CountingPreviewer(content)
+    assert PreviewStore(cache_dir=tmp_path).get_or_preview(previewer) == content
+    assert previewer.num_previews == 0
+
+
+def test_key_changes_with_settings_and_content():
+    key = PreviewStore.key_of(_CountingPreviewer("x"))
+    assert PreviewStore.key_of(_CountingPreviewer("x", setting=1)) != key
+    assert PreviewStore.key_of(_CountingPreviewer("y")) != key
+    assert PreviewStore.key_of(_CountingPreviewer("x")) == key
+
+
+def test_key_changes_with_file_type():
+    c_previewer = FilePreview.previewer_of("add.c", _C_FILE)
+    cpp_previewer = FilePreview.previewer_of("add.cpp", _C_FILE)
+    assert type(c_previewer) is type(cpp_previewer)
+    assert PreviewStore.key_of(c_previewer) != PreviewStore.key_of(cpp_previewer)
+
+
+def test_budgeted_key_is_separate_from_full_key():
+    store = PreviewStore()
+    previewer = _CountingPreviewer("x" * 300)
+    previews = store.get_or_preview_all(previewer, token_budget=10)
+    assert len(previews) == 2
+    (full_key, full_preview), (budgeted_key, budgeted_preview) = previews
+    assert full_key == PreviewStore.key_of(previewer)
+    assert budgeted_key == PreviewStore.key_of(previewer, 10)
+    assert full_key != budgeted_key
+    assert full_preview == "x" * 300 and budgeted_preview == "x" * 30
+    # Both previews are reused afterwards, whether budgeted or not
+    assert store.get_or_preview(previewer) == "x" * 300
+    assert store.get_or_preview(previewer, token_budget=10) == "x" * 30
+    assert previewer.num_previews == 1
+    assert previewer.num_budgeted_previews == 1
+
+
+def test_previews_within_budget_are_not_shrunk():
+    store = PreviewStore()
+    previewer = _CountingPreviewer("x" * 30)
+    previews = store.get_or_preview_all(previewer, token_budget=100)
+    assert [key for key, _ in previews] == [PreviewStore.key_of(previewer)]
+    assert previewer.num_budgeted_previews == 0
+
+
+def test_least_recently_used_previews_are_evicted():
+    store = PreviewStore(max_entries=2)
+    previewers = [_CountingPreviewer(c) for c in "abc"]
+    for previewer in previewers:
+        store.get_or_preview(previewer)
+    store.get_or_preview(previewers[0])
+    assert previewers[0].num_previews == 2
+    store.get_or_preview(previewers[2])
+    assert previewers[2].num_previews == 1
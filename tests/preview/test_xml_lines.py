@@ -0,0 +1,126 @@
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+import pytest
+
+from cora.preview.internal.xml_lines import (
+    XMLNode,
+    parse_xml_lines,
+    _parse_by_expat,
+    _to_xml_node,
+)
+from cora.preview.internal.xml_parser import SlowXMLParser
+
+_POM = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0"
+         xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+         xsi:schemaLocation="http://maven.apache.org/POM/4.0.0 http://maven.apache.org/xsd/maven-4.0.0.xsd">
+  <modelVersion>4.0.0</modelVersion>
+  <!-- Coordinates of
+       the artifact -->
+  <groupId>com.example</groupId>
+  <artifactId>demo</artifactId>
+  <dependencies>
+    <dependency><groupId>junit</groupId><artifactId>junit</artifactId>
+      <scope>test</scope>
+    </dependency>
+  </dependencies>
+</project>
+"""
+
+_ANDROID_MANIFEST = """\
+<manifest xmlns:android="http://schemas.android.com/apk/res/android" package="com.example">
+    <application
+        android:label="Demo"
+        android:icon="@mipmap/ic_launcher">
+        <activity android:name=".Main"><intent-filter>
+            <action android:name="android.intent.action.MAIN" />
+        </intent-filter></activity>
+    </application>
+</manifest>
+"""
+
+_CDATA_AND_COMMENTS = """\
+<root>
+  <script><![CDATA[
+    if (a < b && c > d) { <notatag/> }
+  ]]></script>
+  <!-- <commented><out/></commented> -->
+  <?pi some instruction?>
+  <text>a &amp; b &lt; c &#x263A;</text>
+  <empty/><empty/>
+  <multi
+    attr="1"
+  ></multi>
+</root>
+"""
+
+_INTERNAL_ENTITIES = """\
+<?xml version="1.0"?>
+<!DOCTYPE note [
+  <!ENTITY writer "Donald Duck.">
+  <!ENTITY copyright "Copyright: W3Schools.">
+]>
+<note>
+  <to>Tove</to>
+  <footer>&writer;&#xA9;&copyright;</footer>
+</note>
+"""
+
+_ONE_LINE = '<a x="1"><b><c/></b><d>text</d></a>'
+
+
+def _lines_of(node: XMLNode) -> list:
+    return [node.start_line, node.end_line, [_lines_of(c) for c in node.children]]
+
+
+def _parse_by_slow_parser(content: str) -> XMLNode:
+    return _to_xml_node(ElementTree.fromstring(content, parser=SlowXMLParser()))
+
+
+@pytest.mark.parametrize(
+    "content",
+    [_POM, _ANDROID_MANIFEST, _CDATA_AND_COMMENTS, _INTERNAL_ENTITIES, _ONE_LINE],
+    ids=["pom", "android-manifest", "cdata-and-comments", "entities", "one-line"],
+)
+def test_expat_as_slow_parser(content: str):
+    assert _lines_of(_parse_by_expat(content)) == _lines_of(
+        _parse_by_slow_parser(content)
+    )
+
+
+def test_element_and_child_on_the_same_line():
+    root = _parse_by_expat(_ANDROID_MANIFEST)
+    activity = root.children[0].children[0]
+    intent_filter = activity.children[0]
+    assert (activity.start_line, activity.end_line) == (5, 7)
+    assert (intent_filter.start_line, intent_filter.end_line) == (5, 7)
+
+
+def test_entities_of_an_external_doctype_fall_back():
+    content = """\
+<?xml version="1.0"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN"
+  "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+<html>
+  <p>&nbsp;</p>
+</html>
+"""
+    with pytest.raises(expat.error):
+        _parse_by_expat(content)
+    # SlowXMLParser rejects the undefined entity in the very same way as before
+    with pytest.raises(ElementTree.ParseError) as expected:
+        _parse_by_slow_parser(content)
+    with pytest.raises(ElementTree.ParseError) as actual:
+        parse_xml_lines(content)
+    assert str(actual.value) == str(expected.value)
+
+
+def test_malformed_documents_fail_as_slow_parser():
+    content = "<root>\n  <a></b>\n</root>\n"
+    with pytest.raises(ElementTree.ParseError) as expected:
+        _parse_by_slow_parser(content)
+    with pytest.raises(ElementTree.ParseError) as actual:
+        parse_xml_lines(content)
+    assert str(actual.value) == str(expected.value)
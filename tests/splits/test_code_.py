@@ -0,0 +1,79 @@
+"""
+Differential test of ASTSpl's constant-time merging of ranges against the former
+implementation, which stripped whitespace from the whole accumulated slice per range.
+"""
+
+import re
+from pathlib import Path
+
+import pytest
+from tree_sitter import Range
+
+from cora.base.paths import SnippetPath
+from cora.splits.code_ import ASTSpl
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+
+_SOURCE_FILES = sorted((_REPO_ROOT / "cora").rglob("*.py"))
+
+
+class _FormerASTSpl(ASTSpl):
+    def _do_split(self):
+        ranges = self._split_ast()
+        if len(ranges) == 0:
+            return []
+        elif len(ranges) == 1:
+            return [SnippetPath(self.file, 0, ranges[0].end_point[0] + 1)]
+
+        merged_ranges = []
+        cur_ran = Range((0, 0), (0, 0), 0, 0)
+        for ran in ranges:
+            cur_ran = Range(
+                cur_ran.start_point, ran.end_point, cur_ran.start_byte, ran.end_byte
+            )
+            cur_cont = self.content[cur_ran.start_byte : cur_ran.end_byte]
+            if len(re.sub(r"\s", "", cur_cont)) > self._min_size and "\n" in cur_cont:
+                merged_ranges.append(cur_ran)
+                cur_ran = Range(
+                    ran.end_point, ran.end_point, ran.end_byte, ran.end_byte
+                )
+        if cur_ran.end_byte - cur_ran.start_byte > 0:
+            merged_ranges.append(cur_ran)
+
+        snippets = [
+            SnippetPath(self.file, spl.start_point[0], spl.end_point[0])
+            for spl in merged_ranges
+        ]
+        snippets[-1] = SnippetPath(
+            self.file, snippets[-1].start_line, snippets[-1].end_line + 1
+        )
+        return snippets
+
+
+def _lines(snippets):
+    return [(s.start_line, s.end_line) for s in snippets]
+
+
+def _assert_same_split(file: Path, snippet_size: int, min_size: int):
+    expected = _FormerASTSpl(file, snippet_size, min_size).split()
+    actual = ASTSpl(file, snippet_size, min_size).split()
+    assert _lines(actual) == _lines(expected)
+
+
+@pytest.mark.parametrize("snippet_size, min_size", [(1500, 100), (200, 20), (60, 5)])
+@pytest.mark.parametrize(
+    "file", _SOURCE_FILES, ids=lambda f: str(f.relative_to(_REPO_ROOT))
+)
+def test_split_as_former_on_sources(file: Path, snippet_size: int, min_size: int):
+    _assert_same_split(file, snippet_size, min_size)
+
+
+def test_split_as_former_on_tricky_whitespace(tmp_path: Path):
+    # Unicode spaces, CRLF line endings, and non-ASCII names shift chars against bytes
+    body = "".join(
+        f"def f_{i}_ñé(x):\r\n　 return x\t+ {i}  # ü \r\n\r\n" for i in range(200)
+    )
+    file = tmp_path / "tricky.py"
+    file.write_bytes(body.encode("utf-8"))
+    for snippet_size, min_size in [(1500, 100), (120, 10), (40, 3)]:
+        _assert_same_split(file, snippet_size, min_size)
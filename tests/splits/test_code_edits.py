@@ -0,0 +1,120 @@
+"""
+Seeded random test of ASTSpl on incrementally reparsed files: splitting a file edited by a
+unified diff from its cached version must equal splitting the patched file from scratch.
+"""
+
+import difflib
+import random
+import re
+from functools import cached_property
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from cora.splits.code_ import ASTSpl
+from cora.splits.parsed import ParsedFile, edit_by_patch
+
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+
+_SOURCE_FILES = [
+    _REPO_ROOT / "cora" / "base" / "ftree.py",
+    _REPO_ROOT / "cora" / "splits" / "edits.py",
+    _REPO_ROOT / "cora" / "llms" / "limiter.py",
+]
+
+_PATTERN_NAME = re.compile(r"\b[a-z_][a-z0-9_]*\b")
+
+
+def _blocks_of(lines: List[str]) -> List[List[str]]:
+    # Top-level statements together with their indented bodies
+    blocks: List[List[str]] = []
+    for line in lines:
+        if not blocks or (line[:1].strip() and not line.startswith(")")):
+            blocks.append([])
+        blocks[-1].append(line)
+    return blocks
+
+
+def _rename(rng: random.Random, line: str) -> str:
+    names = list(_PATTERN_NAME.finditer(line))
+    if not names:
+        return line
+    name = rng.choice(names)
+    new_name = rng.choice(["x", "y_" * rng.randint(1, 8), name.group() * 2])
+    return line[: name.start()] + new_name + line[name.end() :]
+
+
+def _mutate(rng: random.Random, content: str) -> str:
+    blocks = _blocks_of(content.splitlines(keepends=True))
+    for _ in range(rng.randint(1, 6)):
+        choice = rng.random()
+        i = rng.randrange(len(blocks))
+        if choice < 0.2 and len(blocks) > 2:
+            del blocks[i]
+        elif choice < 0.4:
+            blocks.insert(rng.randrange(len(blocks) + 1), list(blocks[i]))
+        elif choice < 0.5:
+            blocks.insert(i, ["\n"] * rng.randint(1, 3))
+        else:
+            block = list(blocks[i])
+            j = rng.randrange(len(block))
+            block[j] = _rename(rng, block[j])
+            blocks[i] = block
+    return "".join(line for block in blocks for line in block)
+
+
+def _patch_of(rng: random.Random, old: str, new: str, name: str) -> str:
+    return "".join(
+        difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            fromfile=f"a/{name}",
+            tofile=f"b/{name}",
+            n=rng.randint(0, 3),
+        )
+    )
+
+
+class _FreshASTSpl(ASTSpl):
+    # Parse the file from scratch, bypassing (and not populating) the cache
+    @cached_property
+    def parsed(self) -> ParsedFile:
+        return ParsedFile.parse(self._lang, self.file.read_text(encoding="utf-8"))
+
+
+def _lines(snippets):
+    return [(s.start_line, s.end_line) for s in snippets]
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize(
+    "source", _SOURCE_FILES, ids=lambda f: str(f.relative_to(_REPO_ROOT))
+)
+def test_split_after_random_patches(tmp_path: Path, source: Path, seed: int):
+    rng = random.Random(seed)
+    sizes = [(1500, 100), (200, 20), (60, 5)]
+    content = source.read_text(encoding="utf-8")
+    old_file = tmp_path / "r0" / source.name
+    old_file.parent.mkdir()
+    old_file.write_text(content, encoding="utf-8")
+    # Splitting the original file memoizes its ranges for the edited ones to inherit
+    for size in sizes:
+        ASTSpl(old_file, *size).split()
+
+    # Edits are chained such that each edited file inherits ranges of the former one
+    for rnd in range(1, 5):
+        new_content = _mutate(rng, content)
+        edit_by_patch(
+            old_file.parent, _patch_of(rng, content, new_content, source.name)
+        )
+        assert ParsedFile.of("python", new_content).origin is not None
+
+        new_file = tmp_path / f"r{rnd}" / source.name
+        new_file.parent.mkdir()
+        new_file.write_text(new_content, encoding="utf-8")
+        for size in sizes:
+            actual = ASTSpl(new_file, *size).split()
+            expected = _FreshASTSpl(new_file, *size).split()
+            assert _lines(actual) == _lines(expected), f"round {rnd}, size {size}"
+        content, old_file = new_content, new_file
@@ -0,0 +1,65 @@
+"""
+Tests of the cache of parsed files: its path index must not outlive evicted entries, and
+patches that do not apply must leave the cache untouched.
+"""
+
+from cora.splits.parsed import ParsedFile, ParsedFileCache, edit_by_patch
+
+
+def _write(tmp_path, name: str, content: str):
+    file = tmp_path / name
+    file.write_text(content, encoding="utf-8")
+    return file
+
+
+def test_evicting_an_entry_drops_its_files(tmp_path):
+    files = [_write(tmp_path, f"m{i}.py", f"x = {i}\n" * 20) for i in range(8)]
+    size = ParsedFile.parse("python", files[0].read_text()).approx_size
+    cache = ParsedFileCache(max_bytes=size * 3)
+    for file in files:
+        cache.get_or_parse_file("python", file)
+    assert len(cache._entries) == 3
+    assert len(cache._files) == 3
+    assert set(cache._files_of) == set(cache._entries)
+    for file in files[:-3]:
+        assert cache.get_file("python", file) is None
+    for file in files[-3:]:
+        assert cache.get_file("python", file) is not None
+
+
+def test_rewritten_files_are_reindexed(tmp_path):
+    file = _write(tmp_path, "m.py", "x = 1\n")
+    cache = ParsedFileCache(max_bytes=1 << 20)
+    cache.get_or_parse_file("python", file)
+    _write(tmp_path, "m.py", "x = 2\ny = 3\n")
+    parsed = cache.get_or_parse_file("python", file)
+    assert parsed.content == "x = 2\ny = 3\n"
+    assert len(cache._files) == 1
+    assert sum(len(files) for files in cache._files_of.values()) == 1
+
+
+def test_files_too_large_are_not_indexed(tmp_path):
+    file = _write(tmp_path, "m.py", "x = 1\n" * 100)
+    cache = ParsedFileCache(max_bytes=16)
+    cache.get_or_parse_file("python", file)
+    assert not cache._files
+    assert not cache._files_of
+
+
+def test_patches_that_do_not_apply_are_skipped(tmp_path):
+    file = _write(tmp_path, "m.py", "a = 1\nb = 2\n")
+    parsed = ParsedFile.of_file("python", file)
+    patch = (
+        "--- a/m.py\n"
+        "+++ b/m.py\n"
+        "@@ -1,2 +1,2 @@\n"
+        " a = 9\n"
+        "-b = 2\n"
+        "+b = 3\n"
+        "--- a/new.py\n"
+        "+++ b/new.py\n"
+        "@@ -0,0 +1 @@\n"
+        "+c = 1\n"
+    )
+    edit_by_patch(tmp_path, patch)
+    assert ParsedFile.cached_of_file("python", file) is parsed